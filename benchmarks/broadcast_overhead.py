@@ -0,0 +1,182 @@
+"""
+Benchmark of the per-event overhead of fanning out telemetry.
+
+Measures the time to publish one event to a number of consumers with
+
+- ``listen``: :class:`Broadcast` with synchronous listeners (the watchdog and
+  the ``/api/drone/status`` handler),
+- ``subscribe``: :class:`Broadcast` with async iterator subscribers that are
+  drained by one task each (the time includes the consumers),
+- ``rx``: an RxPY ``Subject`` with ``subscribe(on_next=...)``, how telemetry
+  was delivered before, if RxPY is installed.
+
+Usage::
+
+    python -m benchmarks.broadcast_overhead --consumers 1,10,100 --events 20000
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from src.skywrangler_web_server.broadcast import Broadcast, Overflow
+
+
+def bench_listen(consumers: int, events: int) -> float:
+    """
+    Gets the time per event in microseconds with synchronous listeners.
+    """
+    broadcast: Broadcast[int] = Broadcast()
+    received = [0]
+
+    def listener(_: int) -> None:
+        received[0] += 1
+
+    for _ in range(consumers):
+        broadcast.listen(listener)
+
+    start = time.perf_counter()
+
+    for n in range(events):
+        broadcast.publish(n)
+
+    elapsed = time.perf_counter() - start
+    assert received[0] == consumers * events
+
+    return elapsed / events * 1e6
+
+
+async def _bench_subscribe(consumers: int, events: int, batch: int) -> float:
+    broadcast: Broadcast[int] = Broadcast()
+    subscriptions = [
+        broadcast.subscribe(batch, Overflow.DROP_NEWEST) for _ in range(consumers)
+    ]
+    received = [0]
+
+    async def consume(subscription) -> None:
+        async for _ in subscription:
+            received[0] += 1
+
+    tasks = [asyncio.create_task(consume(s)) for s in subscriptions]
+    await asyncio.sleep(0)
+
+    start = time.perf_counter()
+
+    for n in range(events):
+        broadcast.publish(n)
+
+        # like a telemetry stream, let the consumers run between samples
+        if n % batch == batch - 1:
+            await asyncio.sleep(0)
+
+    for s in subscriptions:
+        s.close()
+
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - start
+    assert received[0] == consumers * events
+
+    return elapsed / events * 1e6
+
+
+def bench_subscribe(consumers: int, events: int, batch: int = 16) -> float:
+    """
+    Gets the time per event in microseconds with async iterator subscribers,
+    including the time to deliver the events to the consumers.
+    """
+    return asyncio.run(_bench_subscribe(consumers, events, batch))
+
+
+def bench_rx(consumers: int, events: int) -> Optional[float]:
+    """
+    Gets the time per event in microseconds with an RxPY subject.
+
+    Returns:
+        The time or ``None`` if RxPY is not installed.
+    """
+    try:
+        from rx.subject import Subject
+    except ImportError:
+        return None
+
+    subject = Subject()
+    received = [0]
+
+    def on_next(_: int) -> None:
+        received[0] += 1
+
+    for _ in range(consumers):
+        subject.subscribe(on_next=on_next)
+
+    start = time.perf_counter()
+
+    for n in range(events):
+        subject.on_next(n)
+
+    elapsed = time.perf_counter() - start
+    assert received[0] == consumers * events
+
+    return elapsed / events * 1e6
+
+
+BENCHMARKS: Dict[str, Callable[[int, int], Optional[float]]] = {
+    "listen": bench_listen,
+    "subscribe": bench_subscribe,
+    "rx": bench_rx,
+}
+
+
+def main(consumer_counts: List[int], events: int) -> List[Dict[str, Any]]:
+    results = []
+
+    for consumers in consumer_counts:
+        result: Dict[str, Any] = {"consumers": consumers}
+
+        for name, bench in BENCHMARKS.items():
+            result[name] = bench(consumers, events)
+
+        results.append(result)
+        print(
+            f"{consumers:5d} consumers:",
+            ", ".join(
+                (
+                    f"{name} {result[name]:8.2f} µs/event"
+                    if result[name] is not None
+                    else f"{name} (not installed)"
+                )
+                for name in BENCHMARKS
+            ),
+            flush=True,
+        )
+
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmarks the per-event overhead of telemetry fan-out."
+    )
+    parser.add_argument(
+        "--consumers",
+        type=lambda s: [int(n) for n in s.split(",")],
+        default=[1, 10, 100],
+        metavar="<n,...>",
+        help="consumer counts to test (default: 1,10,100)",
+    )
+    parser.add_argument(
+        "--events",
+        type=int,
+        default=20000,
+        metavar="<n>",
+        help="events per test (default: %(default)s)",
+    )
+    parser.add_argument("--output", help="JSON file for the results")
+    args = parser.parse_args()
+
+    results = main(args.consumers, args.events)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=4)
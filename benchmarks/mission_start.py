@@ -0,0 +1,203 @@
+"""
+Benchmark of the time from ``POST /api/drone/fly_mission`` to the vehicle
+starting the mission.
+
+The request goes through the aiohttp test client to the real API handler and
+:class:`Drone`, which talks to an in-process simulated vehicle that adds a
+configurable latency to each MAVSDK call. Each run is broken down into the
+stages recorded in the mission trace.
+
+Usage::
+
+    python -m benchmarks.mission_start --runs 50 --rpc-latency 0.02
+
+Two scenarios are measured: ``cold`` flies a different mission each run (the
+mission is compiled and uploaded), ``warm`` flies the same mission again (the
+mission is already on the vehicle).
+"""
+
+import argparse
+import asyncio
+import json
+import time
+import weakref
+from collections import defaultdict
+from typing import Any, Dict, List, NamedTuple, Sequence
+
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+
+from src.skywrangler_web_server.api import routes
+from src.skywrangler_web_server.drone import Drone
+from src.skywrangler_web_server.sim import SimConfig, SimulatedSystem
+
+MISSION: Dict[str, Any] = {
+    "origin": {
+        "latitude": 35.932121645130756,
+        "longitude": -97.2631249266781,
+        "elevation": 304.0,
+    },
+    "transect": {"azimuth": -85.0, "length": 100.0},
+    "parameters": {"speed": 5, "distance": 30, "angle": 60},
+    "returnPoint": {"latitude": 35.934456813161006, "longitude": -97.2646272318608},
+}
+
+
+class Run(NamedTuple):
+    """
+    The timing of one mission start.
+    """
+
+    total: float
+    """The time from sending the request to the vehicle starting the mission
+    in milliseconds."""
+    stages: Dict[str, float]
+    """The duration of each stage of the mission trace in milliseconds."""
+    rpc_calls: int
+    """The number of calls to the vehicle."""
+
+
+def percentile(values: Sequence[float], p: float) -> float:
+    """
+    Gets a percentile of some values (nearest rank).
+    """
+    ordered = sorted(values)
+    rank = max(1, round(p / 100 * len(ordered)))
+
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def _mission(n: int, cold: bool) -> Dict[str, Any]:
+    if not cold:
+        return MISSION
+
+    # a new distance each run, so nothing is cached
+    parameters = dict(MISSION["parameters"], distance=20 + n * 0.01)
+
+    return dict(MISSION, parameters=parameters)
+
+
+async def benchmark(runs: int, rpc_latency: float, cold: bool) -> List[Run]:
+    """
+    Starts a mission several times.
+
+    Args:
+        runs: The number of mission starts.
+        rpc_latency: The latency of each call to the vehicle in seconds.
+        cold: If ``True``, a different mission is flown each time.
+
+    Returns:
+        The timing of each run.
+    """
+    system = SimulatedSystem(SimConfig(rpc_latency=rpc_latency))
+    app = web.Application()
+    app["tasks"] = weakref.WeakSet()
+    app["drone"] = drone = Drone(system=system)
+    app.add_routes(routes)
+
+    results = []
+
+    async with TestClient(TestServer(app)) as client:
+        try:
+            # like the first mission after the server starts, the vehicle
+            # parameters are downloaded in the background
+            while (
+                not drone.is_connected
+                or drone._home is None
+                or not drone.vehicle_config.is_loaded
+            ):
+                await asyncio.sleep(0.01)
+
+            for n in range(runs):
+                system.reset()
+                calls = system.rpc_calls
+                start = time.perf_counter_ns()
+
+                response = await client.post(
+                    "/api/drone/fly_mission", json=_mission(n, cold)
+                )
+
+                if response.status != 200:
+                    raise RuntimeError(f"fly_mission failed: {response.reason}")
+
+                assert system.mission_started_ns is not None
+                trace = list(drone.traces)[-1].to_dict()
+                stages: Dict[str, float] = defaultdict(float)
+
+                for span in trace["spans"]:
+                    stages[span["name"]] += span["durationMs"]
+
+                results.append(
+                    Run(
+                        (system.mission_started_ns - start) / 1e6,
+                        dict(stages),
+                        system.rpc_calls - calls,
+                    )
+                )
+        finally:
+            await drone.cancel_all_tasks()
+            system.close()
+
+    return results
+
+
+def summary(runs: Sequence[Run]) -> Dict[str, Any]:
+    """
+    Gets the p50 and p99 of the total time and of each stage.
+    """
+    stages = sorted({name for r in runs for name in r.stages})
+
+    return {
+        "total": {
+            p: percentile([r.total for r in runs], int(p[1:])) for p in ("p50", "p99")
+        },
+        # the first run also writes the vehicle parameters
+        "rpcCalls": percentile([r.rpc_calls for r in runs], 50),
+        "stages": {
+            name: {
+                p: percentile([r.stages.get(name, 0.0) for r in runs], int(p[1:]))
+                for p in ("p50", "p99")
+            }
+            for name in stages
+        },
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks mission start latency.")
+    parser.add_argument(
+        "--runs",
+        type=int,
+        default=50,
+        metavar="<n>",
+        help="mission starts per scenario (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--rpc-latency",
+        type=float,
+        default=0.02,
+        metavar="<seconds>",
+        help="latency of each call to the vehicle (default: %(default)s)",
+    )
+    parser.add_argument("--output", help="JSON file for the results")
+    args = parser.parse_args()
+
+    results = {}
+
+    for scenario in ("cold", "warm"):
+        runs = asyncio.run(
+            benchmark(args.runs, args.rpc_latency, cold=scenario == "cold")
+        )
+        results[scenario] = s = summary(runs)
+
+        print(
+            f"{scenario}: p50 {s['total']['p50']:.1f} ms, p99 {s['total']['p99']:.1f} ms,",
+            f"{s['rpcCalls']} vehicle calls",
+        )
+
+        for name, stage in s["stages"].items():
+            print(f"  {name:36} p50 {stage['p50']:8.2f} ms p99 {stage['p99']:8.2f} ms")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=4)
@@ -0,0 +1,472 @@
+"""
+Load test for the server-sent event (SSE) endpoints.
+
+Starts the web server with the simulated drone backend, then connects more
+and more clients to ``/api/status`` and ``/api/drone/status`` (like a browser
+tab of the web client does) and reports for each client count:
+
+- the delivery latency of telemetry events (percentiles over all clients),
+- the RSS and CPU usage of the server process,
+- the event loop lag of the server (the response time of
+  ``/api/health/live``, which does no work).
+
+Some of the clients can be deliberately slow readers to see how they affect
+the other clients and the memory usage of the server.
+
+Usage::
+
+    python benchmarks/sse_fanout.py --clients 1,10,100,200,400 --rate 100
+
+The simulated vehicle sends a status text with the time with each position
+sample (``--sim-clock``), so ``--rate`` is the per-client event rate. The
+server must run on the same machine as the load test, so that the clocks
+match.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import pathlib
+import socket
+import subprocess
+import sys
+import time
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+import aiohttp
+
+# the server package, when it is not installed
+SRC_PATH = pathlib.Path(__file__).resolve().parent.parent / "src"
+
+# how often the event loop lag is probed
+PROBE_INTERVAL = 0.1  # seconds
+
+
+class ProcessSample(NamedTuple):
+    """
+    Resource usage of a process at some point in time.
+    """
+
+    time: float
+    """The monotonic time of the sample in seconds."""
+    cpu: float
+    """The total user and system CPU time in seconds."""
+    rss: int
+    """The resident set size in bytes."""
+
+
+def process_sample(pid: int) -> Optional[ProcessSample]:
+    """
+    Gets the resource usage of a process from ``/proc`` (Linux only).
+
+    Returns:
+        The sample or ``None`` if it is not available.
+    """
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            # the command name may contain spaces, but not ")"
+            fields = f.read().rsplit(")", 1)[1].split()
+
+        with open(f"/proc/{pid}/statm") as f:
+            pages = int(f.read().split()[1])
+    except OSError:
+        return None
+
+    # utime and stime are fields 14 and 15 of the stat file
+    ticks = int(fields[11]) + int(fields[12])
+
+    return ProcessSample(
+        time.monotonic(),
+        ticks / os.sysconf("SC_CLK_TCK"),
+        pages * os.sysconf("SC_PAGE_SIZE"),
+    )
+
+
+def percentile(values: Sequence[float], p: float) -> float:
+    """
+    Gets a percentile of some values (nearest rank).
+
+    Args:
+        values: The values, in any order.
+        p: The percentile from 0 to 100.
+
+    Returns:
+        The value or NaN if there are no values.
+    """
+    if not values:
+        return float("nan")
+
+    ordered = sorted(values)
+    rank = max(1, round(p / 100 * len(ordered)))
+
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def parse_events(lines: Iterator[str]) -> Iterator[Dict[str, str]]:
+    """
+    Parses server-sent events.
+
+    Args:
+        lines: The lines of the event stream without line endings.
+
+    Yields:
+        The ``event`` and ``data`` fields of each event.
+    """
+    event: Dict[str, str] = {}
+
+    for line in lines:
+        if not line:
+            if event:
+                yield event
+
+            event = {}
+            continue
+
+        name, _, value = line.partition(":")
+
+        if name:
+            event[name] = value[1:] if value.startswith(" ") else value
+
+
+def clock_latency(event: Dict[str, str], now: float) -> Optional[float]:
+    """
+    Gets the delivery latency of a status text from the simulated clock.
+
+    Args:
+        event: A parsed event.
+        now: The wall clock time the event was received.
+
+    Returns:
+        The latency in seconds or ``None`` if this is not a clock event.
+    """
+    if event.get("event") != "statusText":
+        return None
+
+    text = json.loads(event.get("data", "{}")).get("text", "")
+
+    if not text.startswith("clock "):
+        return None
+
+    return now - float(text[6:])
+
+
+class Client:
+    """
+    An SSE client, e.g. a browser tab.
+
+    Args:
+        session: The HTTP session.
+        url: The URL of the event stream.
+        read_delay: Time to wait after each line to simulate a slow reader.
+    """
+
+    def __init__(
+        self, session: aiohttp.ClientSession, url: str, read_delay: float = 0.0
+    ) -> None:
+        self._session = session
+        self._url = url
+        self._read_delay = read_delay
+        self.latencies: List[float] = []
+        self.events = 0
+        self.recording = False
+        self.error: Optional[str] = None
+
+    async def run(self) -> None:
+        try:
+            async with self._session.get(self._url) as response:
+                response.raise_for_status()
+                await self._read(response.content)
+        except asyncio.CancelledError:
+            raise
+        except Exception as ex:
+            self.error = repr(ex)
+
+    async def _read(self, stream: aiohttp.StreamReader) -> None:
+        lines: List[str] = []
+
+        async for raw in stream:
+            lines.append(raw.decode().rstrip("\r\n"))
+
+            if not lines[-1]:
+                now = time.time()
+
+                for event in parse_events(iter(lines)):
+                    self.events += 1
+                    latency = clock_latency(event, now)
+
+                    if latency is not None and self.recording:
+                        self.latencies.append(latency)
+
+                lines.clear()
+
+            if self._read_delay:
+                await asyncio.sleep(self._read_delay)
+
+
+async def probe_loop_lag(
+    session: aiohttp.ClientSession, url: str, results: List[float]
+) -> None:
+    """
+    Measures the response time of ``/api/health/live`` until cancelled.
+    """
+    while True:
+        start = time.perf_counter()
+
+        async with session.get(url) as response:
+            await response.read()
+
+        results.append(time.perf_counter() - start)
+        await asyncio.sleep(PROBE_INTERVAL)
+
+
+async def run_step(
+    base_url: str,
+    pid: Optional[int],
+    clients: int,
+    slow_fraction: float,
+    slow_delay: float,
+    warmup: float,
+    duration: float,
+) -> Dict[str, Any]:
+    """
+    Runs the load test for one client count.
+
+    Returns:
+        The results for this step.
+    """
+    connector = aiohttp.TCPConnector(limit=0)
+    timeout = aiohttp.ClientTimeout(total=None)
+
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        slow = round(clients * slow_fraction)
+        drone_clients = [
+            Client(
+                session, base_url + "/api/drone/status", slow_delay if i < slow else 0
+            )
+            for i in range(clients)
+        ]
+        status_clients = [
+            Client(session, base_url + "/api/status") for _ in range(clients)
+        ]
+        tasks = [asyncio.create_task(c.run()) for c in drone_clients + status_clients]
+
+        await asyncio.sleep(warmup)
+
+        for c in drone_clients:
+            c.recording = True
+
+        lag: List[float] = []
+        probe = asyncio.create_task(
+            probe_loop_lag(session, base_url + "/api/health/live", lag)
+        )
+        before = process_sample(pid) if pid else None
+
+        await asyncio.sleep(duration)
+
+        after = process_sample(pid) if pid else None
+        probe.cancel()
+
+        for t in tasks + [probe]:
+            t.cancel()
+
+        await asyncio.gather(*tasks, probe, return_exceptions=True)
+
+    fast_latencies = [x for c in drone_clients[slow:] for x in c.latencies]
+    slow_latencies = [x for c in drone_clients[:slow] for x in c.latencies]
+
+    result: Dict[str, Any] = {
+        "clients": clients,
+        "slowClients": slow,
+        "errors": sum(c.error is not None for c in drone_clients + status_clients),
+        "events": sum(c.events for c in drone_clients),
+        "latency": {
+            f"p{p}": percentile(fast_latencies, p) * 1000 for p in (50, 90, 99)
+        },
+        "slowLatency": {
+            f"p{p}": percentile(slow_latencies, p) * 1000 for p in (50, 99)
+        },
+        "loopLag": {f"p{p}": percentile(lag, p) * 1000 for p in (50, 99, 100)},
+    }
+
+    if before and after:
+        result["rss"] = after.rss / 2**20
+        result["cpu"] = 100 * (after.cpu - before.cpu) / (after.time - before.time)
+
+    return result
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("localhost", 0))
+        return sock.getsockname()[1]
+
+
+@contextlib.contextmanager
+def start_server(rate: float) -> Iterator[Tuple[subprocess.Popen, str]]:
+    """
+    Starts the web server with the simulated drone backend.
+
+    Yields:
+        The server process and its base URL.
+    """
+    port = _free_port()
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(
+        filter(None, [str(SRC_PATH), env.get("PYTHONPATH")])
+    )
+    server = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "skywrangler_web_server",
+            "--port",
+            str(port),
+            "--drone-backend",
+            "sim",
+            "--sim-rate",
+            str(rate),
+            "--sim-clock",
+            "--log-level",
+            "error",
+        ],
+        env=env,
+        # disconnecting clients are logged as errors
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        yield server, f"http://localhost:{port}"
+    finally:
+        server.terminate()
+        server.wait()
+
+
+async def wait_ready(base_url: str, timeout: float = 30.0) -> None:
+    """
+    Waits until the server responds and the drone is connected.
+    """
+    deadline = time.monotonic() + timeout
+
+    async with aiohttp.ClientSession() as session:
+        while True:
+            with contextlib.suppress(aiohttp.ClientError):
+                async with session.get(base_url + "/api/health/ready") as response:
+                    status = await response.json()
+
+                    if status["subsystems"]["drone"]["ready"]:
+                        return
+
+            if time.monotonic() > deadline:
+                raise TimeoutError("server did not start")
+
+            await asyncio.sleep(0.2)
+
+
+def print_result(result: Dict[str, Any]) -> None:
+    latency = result["latency"]
+    lag = result["loopLag"]
+    resources = (
+        f"{result['rss']:7.1f} MiB {result['cpu']:5.1f}% CPU"
+        if "rss" in result
+        else "(no process stats)"
+    )
+    print(
+        f"{result['clients']:5d} clients:",
+        f"latency p50 {latency['p50']:7.1f} p90 {latency['p90']:7.1f}",
+        f"p99 {latency['p99']:7.1f} ms,",
+        f"slow p99 {result['slowLatency']['p99']:7.1f} ms,",
+        f"loop lag p99 {lag['p99']:6.1f} max {lag['p100']:6.1f} ms,",
+        resources + ",",
+        f"{result['errors']} errors",
+        flush=True,
+    )
+
+
+async def main(args: argparse.Namespace) -> List[Dict[str, Any]]:
+    with contextlib.ExitStack() as stack:
+        if args.url:
+            base_url = args.url.rstrip("/")
+            pid = args.pid
+        else:
+            server, base_url = stack.enter_context(start_server(args.rate))
+            pid = server.pid
+
+        await wait_ready(base_url)
+        results = []
+
+        for clients in args.clients:
+            result = await run_step(
+                base_url,
+                pid,
+                clients,
+                args.slow_fraction,
+                args.slow_delay,
+                args.warmup,
+                args.duration,
+            )
+            print_result(result)
+            results.append(result)
+
+        return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load tests the SSE endpoints.")
+    parser.add_argument(
+        "--clients",
+        type=lambda s: [int(n) for n in s.split(",")],
+        default=[1, 10, 50, 100, 200, 400],
+        metavar="<n,...>",
+        help="client counts to test (default: 1,10,50,100,200,400)",
+    )
+    parser.add_argument(
+        "--rate",
+        type=float,
+        default=100.0,
+        metavar="<Hz>",
+        help="simulated telemetry rate (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--slow-fraction",
+        type=float,
+        default=0.1,
+        metavar="<fraction>",
+        help="fraction of slow readers (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--slow-delay",
+        type=float,
+        default=0.05,
+        metavar="<seconds>",
+        help="delay after each line read by slow readers (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--warmup",
+        type=float,
+        default=2.0,
+        metavar="<seconds>",
+        help="time to connect before measuring (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--duration",
+        type=float,
+        default=10.0,
+        metavar="<seconds>",
+        help="measuring time per client count (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--url",
+        help="test a running server (started with --drone-backend sim --sim-clock)",
+    )
+    parser.add_argument(
+        "--pid", type=int, help="process ID of the server given by --url for stats"
+    )
+    parser.add_argument("--output", help="JSON file for the results")
+    args = parser.parse_args()
+
+    results = asyncio.run(main(args))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=4)
@@ -1,8 +1,11 @@
+import argparse
 import json
 from typing import TypedDict
 from qgc_mission import QgcJSONEncoder
-from sw_mission import create_mission
+from src.skywrangler_web_server.terrain import TerrainModel
+from sw_mission import compile_multi_pass_mission, create_multi_pass_mission
 from sw_mission.points import Coordinate2D, Parameters, Point, Transect
+from sw_mission.simulate import simulate_plan
 
 
 class MissionData(TypedDict):
@@ -14,34 +17,92 @@ class MissionData(TypedDict):
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--dem",
+        metavar="<directory>",
+        help="directory of SRTM .hgt tiles for elevations and terrain clearance",
+    )
+    parser.add_argument(
+        "--passes",
+        type=int,
+        default=1,
+        metavar="<n>",
+        help="number of transect passes per flight (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--loiter-time",
+        type=float,
+        default=0,
+        metavar="<seconds>",
+        help="time to hover at safe altitude before each additional pass",
+    )
+    parser.add_argument(
+        "--compiled",
+        action="store_true",
+        help="also write the compiled missions that the web server can fly as is",
+    )
+    args = parser.parse_args()
+
+    terrain = TerrainModel(args.dem) if args.dem else None
+
     with open("mission-data.json", "r") as f:
         mission_data = json.load(f)
 
-    for speed in mission_data["variables"]["speed"]:
-        for angle in mission_data["variables"]["angle"]:
-            for distance in mission_data["variables"]["distance"]:
-
-                plan = create_mission(
-                    launch=Point(
-                        latitude=mission_data["home"]["latitude"],
-                        longitude=mission_data["home"]["longitude"],
-                        altitude=mission_data["home"]["altitude"],
-                    ),
-                    origin=Point(
-                        latitude=mission_data["origin"]["latitude"],
-                        longitude=mission_data["origin"]["longitude"],
-                        altitude=mission_data["origin"]["altitude"],
-                    ),
-                    transect=Transect(
-                        azimuth=mission_data["transect"]["azimuth"],
-                        length=mission_data["transect"]["length"],
-                    ),
-                    parameters=Parameters(speed=speed, angle=angle, distance=distance),
-                    return_point=Coordinate2D(
-                        latitude=mission_data["away"]["latitude"],
-                        longitude=mission_data["away"]["longitude"],
-                    ),
-                )
-
-                with open(f"skywrangler_s{speed}_a{angle}_d{distance}.plan", "w") as f:
-                    json.dump(plan, f, cls=QgcJSONEncoder, indent=4)
+    grid = [
+        Parameters(speed=speed, angle=angle, distance=distance)
+        for speed in mission_data["variables"]["speed"]
+        for angle in mission_data["variables"]["angle"]
+        for distance in mission_data["variables"]["distance"]
+    ]
+
+    for i in range(0, len(grid), args.passes):
+        passes = grid[i : i + args.passes]
+
+        mission_args = dict(
+            launch=Point(
+                latitude=mission_data["home"]["latitude"],
+                longitude=mission_data["home"]["longitude"],
+                altitude=mission_data["home"]["altitude"],
+            ),
+            origin=Point(
+                latitude=mission_data["origin"]["latitude"],
+                longitude=mission_data["origin"]["longitude"],
+                altitude=mission_data["origin"]["altitude"],
+            ),
+            transect=Transect(
+                azimuth=mission_data["transect"]["azimuth"],
+                length=mission_data["transect"]["length"],
+            ),
+            passes=passes,
+            return_point=Coordinate2D(
+                latitude=mission_data["away"]["latitude"],
+                longitude=mission_data["away"]["longitude"],
+            ),
+            loiter_time=args.loiter_time,
+            terrain=terrain,
+        )
+        plan = create_multi_pass_mission(**mission_args)
+
+        file_name = (
+            "skywrangler_"
+            + "+".join(f"s{p.speed}_a{p.angle}_d{p.distance}" for p in passes)
+            + ".plan"
+        )
+
+        with open(file_name, "w") as f:
+            json.dump(plan, f, cls=QgcJSONEncoder, indent=4)
+
+        if args.compiled:
+            # cached, so the geometry is not computed again
+            mission = compile_multi_pass_mission(**mission_args)
+
+            with open(file_name.replace(".plan", ".mission.json"), "w") as f:
+                json.dump(mission.to_json(), f, indent=4)
+
+        sim = simulate_plan(plan)
+        print(
+            f"{file_name}: {sim.duration:.0f} s total,",
+            f"{sim.transect_time:.1f} s on transect,",
+            "/".join(f"{a:.1f}" for a in sim.approach_angles) + "° approach",
+        )
@@ -101,7 +101,7 @@ class PolygonGeoFence:
 @dataclass
 class GeoFence:
     circles: list[CircleGeoFence] = field(default_factory=list)
-    polygons: list[CircleGeoFence] = field(default_factory=list)
+    polygons: list[PolygonGeoFence] = field(default_factory=list)
 
 
 @dataclass
@@ -65,6 +65,10 @@ class Command(IntEnum):
     Additionally, if the Heading Required parameter is non-zero the aircraft
     will not leave the loiter until heading toward the next waypoint."""
 
+    DO_CHANGE_SPEED = 178
+    """Change speed and/or throttle set points. The value persists until it is
+    overridden or there is a mode change."""
+
 
 # https://mavlink.io/en/messages/common.html#MAV_FRAME
 class Frame(IntEnum):
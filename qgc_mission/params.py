@@ -58,3 +58,23 @@ class NavTakeoffParams(NamedTuple):
     latitude: float = 0
     longitude: float = 0
     altitude: float = 0
+
+
+# https://mavlink.io/en/messages/common.html#MAV_CMD_DO_CHANGE_SPEED
+class DoChangeSpeedParams(NamedTuple):
+    """
+    Parameters for the DO_CHANGE_SPEED command.
+    """
+
+    speed_type: float = 1
+    """Speed type of value set in param2 (0 = airspeed, 1 = ground speed)."""
+    speed: float = -1
+    """Speed (-1 indicates no change, -2 indicates return to default vehicle
+    speed) (meters per second)"""
+    throttle: float = -1
+    """Throttle (-1 indicates no change, -2 indicates return to default vehicle
+    throttle value) (percent)"""
+    param4: float = 0
+    param5: float = 0
+    param6: float = 0
+    param7: float = 0
@@ -0,0 +1,6 @@
+#!/bin/sh
+
+# loads the runs from mission-data.json into the server sequencer
+
+curl http://localhost:8080/api/sequencer/sweep -H "Content-Type: application/json" \
+    -d @"${1:-mission-data.json}"
@@ -0,0 +1,198 @@
+"""
+Downloads map tiles around the mission area into an MBTiles file so that the
+web client has a map when the field laptop has no internet connection.
+
+Usage::
+
+    python seed_tiles.py --url 'https://example.com/{z}/{x}/{y}.png' tiles.mbtiles
+
+Check the usage policy of the tile provider before downloading, many public
+tile servers do not allow bulk downloads.
+"""
+
+import argparse
+import json
+import math
+import sqlite3
+import time
+import urllib.request
+from typing import Iterable, Iterator, Tuple
+
+# distance around the mission points to include
+DEFAULT_MARGIN = 1000.0
+
+# ~1 m/pixel at this latitude is plenty for flying a transect
+DEFAULT_MIN_ZOOM = 12
+DEFAULT_MAX_ZOOM = 18
+
+EARTH_RADIUS = 6378137.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS metadata (name TEXT, value TEXT);
+CREATE UNIQUE INDEX IF NOT EXISTS name ON metadata (name);
+CREATE TABLE IF NOT EXISTS tiles (
+    zoom_level INTEGER,
+    tile_column INTEGER,
+    tile_row INTEGER,
+    tile_data BLOB
+);
+CREATE UNIQUE INDEX IF NOT EXISTS tile_index ON tiles (
+    zoom_level, tile_column, tile_row
+);
+"""
+
+
+def tile_xy(latitude: float, longitude: float, zoom: int) -> Tuple[int, int]:
+    """
+    Gets the XYZ tile containing a point.
+    """
+    n = 1 << zoom
+    lat = math.radians(latitude)
+    x = int((longitude + 180.0) / 360.0 * n)
+    y = int((1.0 - math.asinh(math.tan(lat)) / math.pi) / 2.0 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+
+def bounds(
+    points: Iterable[Tuple[float, float]], margin: float
+) -> Tuple[float, float, float, float]:
+    """
+    Gets the bounding box of points plus a margin.
+
+    Args:
+        points: (latitude, longitude) pairs.
+        margin: The margin in meters.
+
+    Returns:
+        (west, south, east, north) in degrees.
+    """
+    lats, lons = zip(*points)
+    dlat = math.degrees(margin / EARTH_RADIUS)
+    dlon = dlat / math.cos(math.radians(max(abs(min(lats)), abs(max(lats)))))
+    return min(lons) - dlon, min(lats) - dlat, max(lons) + dlon, max(lats) + dlat
+
+
+def tiles_in_bounds(
+    bbox: Tuple[float, float, float, float], min_zoom: int, max_zoom: int
+) -> Iterator[Tuple[int, int, int]]:
+    """
+    Gets all XYZ tiles that cover a bounding box.
+
+    Args:
+        bbox: (west, south, east, north) in degrees.
+        min_zoom: The lowest zoom level.
+        max_zoom: The highest zoom level.
+
+    Yields:
+        (z, x, y) tuples.
+    """
+    west, south, east, north = bbox
+
+    for z in range(min_zoom, max_zoom + 1):
+        x0, y0 = tile_xy(north, west, z)
+        x1, y1 = tile_xy(south, east, z)
+
+        for x in range(x0, x1 + 1):
+            for y in range(y0, y1 + 1):
+                yield z, x, y
+
+
+def mission_points(mission_data: dict) -> list[Tuple[float, float]]:
+    """
+    Gets the points of ``mission-data.json`` that the map needs to show.
+    """
+    return [
+        (mission_data[k]["latitude"], mission_data[k]["longitude"])
+        for k in ("home", "origin", "away")
+        if k in mission_data
+    ]
+
+
+def seed(
+    db: sqlite3.Connection,
+    url: str,
+    tiles: Iterable[Tuple[int, int, int]],
+    delay: float,
+) -> None:
+    """
+    Downloads tiles that are not already in the database.
+
+    Args:
+        db: The MBTiles database.
+        url: URL template with ``{z}``, ``{x}`` and ``{y}`` placeholders.
+        tiles: The XYZ tiles to download.
+        delay: Time to wait between requests in seconds.
+    """
+    for z, x, y in tiles:
+        # MBTiles uses the TMS scheme where 0 is south
+        row = (1 << z) - 1 - y
+
+        if db.execute(
+            "SELECT 1 FROM tiles "
+            "WHERE zoom_level = ? AND tile_column = ? AND tile_row = ?",
+            (z, x, row),
+        ).fetchone():
+            continue
+
+        request = urllib.request.Request(
+            url.format(z=z, x=x, y=y),
+            headers={"User-Agent": "skywrangler-seed-tiles"},
+        )
+
+        with urllib.request.urlopen(request) as response:
+            data = response.read()
+
+        db.execute(
+            "INSERT OR REPLACE INTO tiles VALUES (?, ?, ?, ?)", (z, x, row, data)
+        )
+        # commit as we go so an interrupted download can be resumed
+        db.commit()
+        print(f"{z}/{x}/{y}")
+
+        time.sleep(delay)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("output", help="MBTiles file to create or update")
+    parser.add_argument(
+        "--url",
+        required=True,
+        help="tile URL template, e.g. https://example.com/{z}/{x}/{y}.png",
+    )
+    parser.add_argument("--format", default="png", help="tile format (png, jpg)")
+    parser.add_argument("--mission-data", default="mission-data.json")
+    parser.add_argument("--margin", type=float, default=DEFAULT_MARGIN)
+    parser.add_argument("--min-zoom", type=int, default=DEFAULT_MIN_ZOOM)
+    parser.add_argument("--max-zoom", type=int, default=DEFAULT_MAX_ZOOM)
+    parser.add_argument("--delay", type=float, default=0.1)
+    args = parser.parse_args()
+
+    with open(args.mission_data, "r") as f:
+        mission_data = json.load(f)
+
+    bbox = bounds(mission_points(mission_data), args.margin)
+
+    db = sqlite3.connect(args.output)
+    db.executescript(SCHEMA)
+    db.executemany(
+        "INSERT OR REPLACE INTO metadata VALUES (?, ?)",
+        [
+            ("name", "skywrangler"),
+            ("format", args.format),
+            ("bounds", ",".join(str(v) for v in bbox)),
+            ("minzoom", str(args.min_zoom)),
+            ("maxzoom", str(args.max_zoom)),
+        ],
+    )
+    db.commit()
+
+    try:
+        seed(
+            db,
+            args.url,
+            tiles_in_bounds(bbox, args.min_zoom, args.max_zoom),
+            args.delay,
+        )
+    finally:
+        db.close()
@@ -15,9 +15,14 @@ setuptools.setup(
         "dbus-next",
         "mavsdk",
         "pyproj",
-        "rx",
         "sdnotify",
     ],
+    extras_require={
+        # optional brotli compression of the web client
+        "brotli": ["brotli"],
+        # optional terrain model
+        "terrain": ["numpy"],
+    },
     entry_points={
         "console_scripts": [
             "skywrangler-web-server = skywrangler_web_server.__main__:main"
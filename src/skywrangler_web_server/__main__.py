@@ -1,9 +1,13 @@
 import argparse
+import importlib
 import logging
+import os
 import pathlib
+import time
 
 from . import __version__
-from .server import serve
+
+logger = logging.getLogger(__name__)
 
 LOG_LEVEL_MAP = {
     "debug": logging.DEBUG,
@@ -12,6 +16,30 @@ LOG_LEVEL_MAP = {
     "error": logging.ERROR,
 }
 
+# Modules that are imported when the server starts, in import order. The time
+# for each one only includes dependencies that were not already imported.
+STARTUP_MODULES = [
+    "aiohttp",
+    "aiohttp_sse",
+    "sdnotify",
+    "mavsdk",
+    "skywrangler_web_server.server",
+]
+
+
+def profile_imports() -> None:
+    """
+    Imports :data:`STARTUP_MODULES` and logs the time taken by each one.
+    """
+    for name in STARTUP_MODULES:
+        start = time.perf_counter()
+        importlib.import_module(name)
+        logger.info(
+            "startup profile: %-32s %8.1f ms",
+            f"import {name}",
+            (time.perf_counter() - start) * 1000,
+        )
+
 
 def main():
     parser = argparse.ArgumentParser()
@@ -22,6 +50,13 @@ def main():
         "--port", metavar="<port>", type=int, help="TCP port for server (default: 8080)"
     )
 
+    parser.add_argument(
+        "--unix-socket",
+        metavar="<path>",
+        type=pathlib.Path,
+        help="listen on a Unix domain socket instead of a TCP port",
+    )
+
     parser.add_argument(
         "--web-client-path",
         metavar="<directory>",
@@ -29,6 +64,71 @@ def main():
         help="path to the web client directory",
     )
 
+    parser.add_argument(
+        "--state-dir",
+        metavar="<directory>",
+        type=pathlib.Path,
+        # set by systemd when StateDirectory= is used
+        default=os.environ.get("STATE_DIRECTORY"),
+        help="directory for saving state between restarts (default: $STATE_DIRECTORY)",
+    )
+
+    parser.add_argument(
+        "--tiles",
+        metavar="<file>",
+        type=pathlib.Path,
+        help="MBTiles file with offline map tiles (see seed_tiles.py)",
+    )
+
+    parser.add_argument(
+        "--dem-path",
+        metavar="<directory>",
+        type=pathlib.Path,
+        help="directory of SRTM .hgt files for terrain elevation (requires numpy)",
+    )
+
+    parser.add_argument(
+        "--drone-backend",
+        choices=["mavsdk", "sim"],
+        default="mavsdk",
+        help="connect to mavsdk_server or fly a simulated vehicle (default: %(default)s)",
+    )
+
+    parser.add_argument(
+        "--sim-rate",
+        metavar="<Hz>",
+        type=float,
+        default=10.0,
+        help="simulated position telemetry rate (default: %(default)s)",
+    )
+
+    parser.add_argument(
+        "--sim-speedup",
+        metavar="<factor>",
+        type=float,
+        default=1.0,
+        help="simulated seconds per real second (default: %(default)s)",
+    )
+
+    parser.add_argument(
+        "--sim-replay",
+        metavar="<file>",
+        type=pathlib.Path,
+        help="replay recorded telemetry instead of simulating it (see sim.py)",
+    )
+
+    parser.add_argument(
+        "--sim-clock",
+        action="store_true",
+        help="send the time in simulated status texts for measuring latency",
+    )
+
+    parser.add_argument(
+        "--profile-startup",
+        action="store_true",
+        help="log the time taken by imports and init of each subsystem",
+    )
+
     parser.add_argument(
         "--log-level",
         choices=LOG_LEVEL_MAP.keys(),
@@ -42,7 +142,35 @@ def main():
         datefmt="%Y-%m-%d %H:%M:%S",
         level=LOG_LEVEL_MAP[args.log_level],
     )
-    serve(args.port, args.web_client_path)
+
+    if args.profile_startup:
+        profile_imports()
+
+    # imported here so that --help and --version don't have to wait for it
+    from .server import serve
+
+    sim = None
+
+    if args.drone_backend == "sim":
+        from .sim import SimConfig
+
+        sim = SimConfig(
+            rate=args.sim_rate,
+            speedup=args.sim_speedup,
+            replay=args.sim_replay,
+            clock=args.sim_clock,
+        )
+
+    serve(
+        args.port,
+        args.web_client_path,
+        args.state_dir,
+        args.unix_socket,
+        args.profile_startup,
+        args.tiles,
+        args.dem_path,
+        sim,
+    )
 
 
 if __name__ == "__main__":
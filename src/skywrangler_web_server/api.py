@@ -2,16 +2,18 @@ import asyncio
 import json
 import logging
 from http import HTTPStatus
-from typing import List, TypedDict
+from typing import Any, Dict, List, TypedDict
 import weakref
 from importlib.metadata import version
 
 from aiohttp import web
 from aiohttp_sse import EventSourceResponse, sse_response
-import rx.core.typing as rx_typing
 
-from .drone import Drone, for_each
+from .broadcast import Listener, Overflow, Subscription
+from .drone import Drone, HomeUnknownError, MissingElevationError
+from .plan import PlanStore
 from .rpi import RPi
+from .sequencer import Sequencer
 
 logger = logging.getLogger(__name__)
 routes = web.RouteTableDef()
@@ -50,6 +52,10 @@ async def handle_status(request: web.Request) -> web.Response:
 async def handle_shutdown(request: web.Request) -> web.Response:
     try:
         rpi: RPi = request.app["rpi"]
+
+        if not _task_status(request.app["rpi_init"])["ready"]:
+            raise RuntimeError("RPi is not ready")
+
         await rpi.shutdown()
         return web.Response()
     except Exception as ex:
@@ -57,6 +63,54 @@ async def handle_shutdown(request: web.Request) -> web.Response:
         return web.Response(status=HTTPStatus.INTERNAL_SERVER_ERROR, reason=str(ex))
 
 
+@routes.get("/api/health/live")
+async def handle_health_live(request: web.Request) -> web.Response:
+    """
+    Liveness check - if we can respond, the event loop is running.
+    """
+    return web.json_response({"live": True})
+
+
+def _task_status(task: asyncio.Task) -> Dict[str, Any]:
+    if not task.done():
+        return {"ready": False}
+
+    if task.cancelled():
+        return {"ready": False, "error": "cancelled"}
+
+    if task.exception():
+        return {"ready": False, "error": str(task.exception())}
+
+    return {"ready": True}
+
+
+@routes.get("/api/health/ready")
+async def handle_health_ready(request: web.Request) -> web.Response:
+    """
+    Readiness check that reports the status of each subsystem.
+
+    The drone is reported but not required since the server is still useful
+    without an autopilot connection.
+    """
+    try:
+        drone: Drone = request.app["drone"]
+        subsystems = {
+            # if we can respond, the server is listening
+            "server": {"ready": True},
+            "rpi": _task_status(request.app["rpi_init"]),
+            "drone": {"ready": drone.is_connected},
+        }
+        ready = subsystems["server"]["ready"] and subsystems["rpi"]["ready"]
+
+        return web.json_response(
+            {"ready": ready, "subsystems": subsystems},
+            status=HTTPStatus.OK if ready else HTTPStatus.SERVICE_UNAVAILABLE,
+        )
+    except Exception as ex:
+        logger.exception("/api/health/ready")
+        return web.Response(status=HTTPStatus.INTERNAL_SERVER_ERROR, reason=str(ex))
+
+
 @routes.get("/api/version")
 async def handle_version(request: web.Request) -> web.Response:
     try:
@@ -70,6 +124,10 @@ async def handle_version(request: web.Request) -> web.Response:
         return web.Response(status=HTTPStatus.INTERNAL_SERVER_ERROR, reason=str(ex))
 
 
+# maximum number of events queued for each /api/drone/status client
+DRONE_STATUS_QUEUE_SIZE = 256
+
+
 class DroneStatusEvent(TypedDict):
     data: str
     event: str
@@ -80,36 +138,37 @@ async def handle_drone_status(request: web.Request) -> web.Response:
     try:
         tasks: weakref.WeakSet[asyncio.Future] = request.app["tasks"]
         drone: Drone = request.app["drone"]
-        queue = asyncio.Queue[DroneStatusEvent]()
+        # a client that doesn't keep up skips the oldest events instead of
+        # the queue growing without bound
+        queue: Subscription[DroneStatusEvent] = Subscription(
+            DRONE_STATUS_QUEUE_SIZE, Overflow.DROP_OLDEST
+        )
 
         response: EventSourceResponse
         async with sse_response(request) as response:
 
-            subscriptions: List[rx_typing.Disposable] = []
+            listeners: List[Listener] = []
 
             try:
-                subscriptions.append(
-                    for_each(
-                        drone.connection_state,
-                        lambda state: queue.put_nowait(
+                listeners.append(
+                    drone.connection_state.listen(
+                        lambda state: queue.put(
                             DroneStatusEvent(
                                 data=json.dumps(state.is_connected), event="isConnected"
                             )
                         ),
                     )
                 )
-                subscriptions.append(
-                    for_each(
-                        drone.health_all_ok,
-                        lambda ok: queue.put_nowait(
+                listeners.append(
+                    drone.health_all_ok.listen(
+                        lambda ok: queue.put(
                             DroneStatusEvent(data=json.dumps(ok), event="isHealthAllOk")
                         ),
                     )
                 )
-                subscriptions.append(
-                    for_each(
-                        drone.health,
-                        lambda health: queue.put_nowait(
+                listeners.append(
+                    drone.health.listen(
+                        lambda health: queue.put(
                             DroneStatusEvent(
                                 data=json.dumps(
                                     {
@@ -127,20 +186,18 @@ async def handle_drone_status(request: web.Request) -> web.Response:
                         ),
                     )
                 )
-                subscriptions.append(
-                    for_each(
-                        drone.in_air,
-                        lambda is_in_air: queue.put_nowait(
+                listeners.append(
+                    drone.in_air.listen(
+                        lambda is_in_air: queue.put(
                             DroneStatusEvent(
                                 data=json.dumps(is_in_air), event="isInAir"
                             )
                         ),
                     )
                 )
-                subscriptions.append(
-                    for_each(
-                        drone.status_text,
-                        lambda status: queue.put_nowait(
+                listeners.append(
+                    drone.status_text.listen(
+                        lambda status: queue.put(
                             DroneStatusEvent(
                                 data=json.dumps(
                                     {"text": status.text, "type": status.type.name}
@@ -148,14 +205,15 @@ async def handle_drone_status(request: web.Request) -> web.Response:
                                 event="statusText",
                             )
                         ),
+                        # old messages are not interesting
+                        replay=False,
                     )
                 )
 
                 # have to wrap this in a task to allow cancellation for proper
                 # server shutdown
                 async def process_queue():
-                    while True:
-                        event = await queue.get()
+                    async for event in queue:
                         await response.send(**event)
 
                 task = asyncio.create_task(process_queue())
@@ -163,8 +221,8 @@ async def handle_drone_status(request: web.Request) -> web.Response:
                 await task
 
             finally:
-                for s in subscriptions:
-                    s.dispose()
+                for listener in listeners:
+                    listener.close()
 
     except Exception as ex:
         logger.exception("/api/drone/status")
@@ -185,6 +243,205 @@ async def handle_drone_fly_mission(request: web.Request) -> web.Response:
         return web.Response(status=HTTPStatus.INTERNAL_SERVER_ERROR, reason=str(ex))
 
 
+@routes.post("/api/drone/prepare_mission")
+async def handle_drone_prepare_mission(request: web.Request) -> web.Response:
+    try:
+        mission_parameters = await request.json()
+        logger.info("requested mission preparation with: %s", mission_parameters)
+        drone: Drone = request.app["drone"]
+        await drone.prepare_mission(mission_parameters)
+        return web.Response()
+    except Exception as ex:
+        logger.exception("/api/drone/prepare_mission")
+        return web.Response(status=HTTPStatus.INTERNAL_SERVER_ERROR, reason=str(ex))
+
+
+@routes.post("/api/mission/preview")
+async def handle_mission_preview(request: web.Request) -> web.Response:
+    """
+    Gets the planned path of a mission as GeoJSON.
+
+    The body is the same as ``/api/drone/fly_mission`` with an optional
+    ``home`` position (defaults to the home position of the vehicle).
+    """
+    try:
+        body = await request.json()
+        drone: Drone = request.app["drone"]
+
+        try:
+            (preview,) = await drone.preview_missions([body], body.get("home"))
+        except (KeyError, ValueError, MissingElevationError) as ex:
+            return web.Response(status=HTTPStatus.BAD_REQUEST, reason=repr(ex))
+        except HomeUnknownError as ex:
+            return web.Response(status=HTTPStatus.CONFLICT, reason=str(ex))
+
+        return web.Response(text=preview, content_type="application/json")
+    except Exception as ex:
+        logger.exception("/api/mission/preview")
+        return web.Response(status=HTTPStatus.INTERNAL_SERVER_ERROR, reason=str(ex))
+
+
+@routes.post("/api/mission/preview/batch")
+async def handle_mission_preview_batch(request: web.Request) -> web.Response:
+    """
+    Gets the planned paths of several missions, e.g. while the operator
+    scrubs through the experiment parameters.
+
+    The body has a list of ``missions`` and an optional ``home`` position.
+    """
+    try:
+        body = await request.json()
+        drone: Drone = request.app["drone"]
+
+        try:
+            previews = await drone.preview_missions(body["missions"], body.get("home"))
+        except (KeyError, ValueError, MissingElevationError) as ex:
+            return web.Response(status=HTTPStatus.BAD_REQUEST, reason=repr(ex))
+        except HomeUnknownError as ex:
+            return web.Response(status=HTTPStatus.CONFLICT, reason=str(ex))
+
+        # previews are cached as JSON text, so they are not encoded again
+        return web.Response(
+            text="[" + ",".join(previews) + "]", content_type="application/json"
+        )
+    except Exception as ex:
+        logger.exception("/api/mission/preview/batch")
+        return web.Response(status=HTTPStatus.INTERNAL_SERVER_ERROR, reason=str(ex))
+
+
+@routes.get("/api/mission/plan")
+async def handle_mission_plan(request: web.Request) -> web.Response:
+    """
+    Downloads a mission as a QGroundControl ``.plan`` file, e.g. to check it
+    in QGC before flying.
+
+    The ``mission`` query parameter is the JSON body of
+    ``/api/drone/fly_mission``. The optional ``home`` query parameter is a
+    JSON home position (defaults to the home position of the vehicle).
+    """
+    try:
+        drone: Drone = request.app["drone"]
+
+        try:
+            mission = json.loads(request.query["mission"])
+            home = (
+                json.loads(request.query["home"]) if "home" in request.query else None
+            )
+            plan = await drone.mission_plan_file(mission, home)
+        except (KeyError, ValueError, MissingElevationError) as ex:
+            return web.Response(status=HTTPStatus.BAD_REQUEST, reason=repr(ex))
+        except HomeUnknownError as ex:
+            return web.Response(status=HTTPStatus.CONFLICT, reason=str(ex))
+
+        headers = {
+            "ETag": plan.etag,
+            # clients must check the ETag since the home position can change
+            "Cache-Control": "no-cache",
+        }
+
+        if_none_match = request.headers.get("If-None-Match", "")
+
+        if plan.etag in (t.strip() for t in if_none_match.split(",")):
+            return web.Response(status=HTTPStatus.NOT_MODIFIED, headers=headers)
+
+        headers["Content-Disposition"] = 'attachment; filename="skywrangler.plan"'
+
+        # the plan is cached as encoded bytes, so it is sent as is
+        return web.Response(
+            body=plan.body, content_type="application/json", headers=headers
+        )
+    except Exception as ex:
+        logger.exception("/api/mission/plan")
+        return web.Response(status=HTTPStatus.INTERNAL_SERVER_ERROR, reason=str(ex))
+
+
+@routes.get("/api/plans")
+async def handle_plans(request: web.Request) -> web.Response:
+    """
+    Gets the IDs of the stored ``.plan`` files.
+    """
+    try:
+        plans: PlanStore = request.app["plans"]
+        return web.json_response(plans.ids())
+    except Exception as ex:
+        logger.exception("/api/plans")
+        return web.Response(status=HTTPStatus.INTERNAL_SERVER_ERROR, reason=str(ex))
+
+
+@routes.put("/api/plans/{plan_id}")
+async def handle_plan_put(request: web.Request) -> web.Response:
+    """
+    Stores a ``.plan`` file so that it can be flown later by ID.
+    """
+    try:
+        plans: PlanStore = request.app["plans"]
+
+        try:
+            # invalid JSON is a ValueError too
+            plan = await request.json()
+            mission = plans.add(request.match_info["plan_id"], plan)
+        except ValueError as ex:
+            return web.Response(status=HTTPStatus.BAD_REQUEST, reason=str(ex))
+
+        return web.json_response(mission.to_json())
+    except Exception as ex:
+        logger.exception("/api/plans/{plan_id}")
+        return web.Response(status=HTTPStatus.INTERNAL_SERVER_ERROR, reason=str(ex))
+
+
+@routes.post("/api/drone/prepare_plan/{plan_id}")
+async def handle_drone_prepare_plan(request: web.Request) -> web.Response:
+    """
+    Uploads a stored ``.plan`` file to the vehicle, see ``prepare_mission``.
+    """
+    try:
+        plans: PlanStore = request.app["plans"]
+
+        try:
+            mission = plans.get(request.match_info["plan_id"])
+        except KeyError:
+            return web.Response(status=HTTPStatus.NOT_FOUND)
+
+        drone: Drone = request.app["drone"]
+        await drone.prepare_mission(mission)
+        return web.Response()
+    except Exception as ex:
+        logger.exception("/api/drone/prepare_plan/{plan_id}")
+        return web.Response(status=HTTPStatus.INTERNAL_SERVER_ERROR, reason=str(ex))
+
+
+@routes.post("/api/drone/fly_plan/{plan_id}")
+async def handle_drone_fly_plan(request: web.Request) -> web.Response:
+    """
+    Flies a stored ``.plan`` file.
+    """
+    try:
+        plans: PlanStore = request.app["plans"]
+
+        try:
+            mission = plans.get(request.match_info["plan_id"])
+        except KeyError:
+            return web.Response(status=HTTPStatus.NOT_FOUND)
+
+        drone: Drone = request.app["drone"]
+        await drone.fly_mission(mission)
+        return web.Response()
+    except Exception as ex:
+        logger.exception("/api/drone/fly_plan/{plan_id}")
+        return web.Response(status=HTTPStatus.INTERNAL_SERVER_ERROR, reason=str(ex))
+
+
+@routes.post("/api/drone/launch_mission")
+async def handle_drone_launch_mission(request: web.Request) -> web.Response:
+    try:
+        drone: Drone = request.app["drone"]
+        await drone.launch_mission()
+        return web.Response()
+    except Exception as ex:
+        logger.exception("/api/drone/launch_mission")
+        return web.Response(status=HTTPStatus.INTERNAL_SERVER_ERROR, reason=str(ex))
+
+
 @routes.post("/api/drone/return")
 async def handle_drone_return(request: web.Request) -> web.Response:
     try:
@@ -194,3 +451,93 @@ async def handle_drone_return(request: web.Request) -> web.Response:
     except Exception as ex:
         logger.exception("/api/drone/return")
         return web.Response(status=HTTPStatus.INTERNAL_SERVER_ERROR, reason=str(ex))
+
+
+@routes.get("/api/drone/traces")
+async def handle_drone_traces(request: web.Request) -> web.Response:
+    try:
+        drone: Drone = request.app["drone"]
+        return web.json_response([t.to_dict() for t in drone.traces])
+    except Exception as ex:
+        logger.exception("/api/drone/traces")
+        return web.Response(status=HTTPStatus.INTERNAL_SERVER_ERROR, reason=str(ex))
+
+
+@routes.get("/api/drone/traces/{trace_id:\\d+}")
+async def handle_drone_trace(request: web.Request) -> web.Response:
+    """
+    Gets a single mission trace in the Chrome trace event format.
+    """
+    try:
+        drone: Drone = request.app["drone"]
+        trace = drone.traces.get(int(request.match_info["trace_id"]))
+
+        if trace is None:
+            return web.Response(status=HTTPStatus.NOT_FOUND)
+
+        return web.json_response(trace.to_chrome_trace())
+    except Exception as ex:
+        logger.exception("/api/drone/traces/{trace_id}")
+        return web.Response(status=HTTPStatus.INTERNAL_SERVER_ERROR, reason=str(ex))
+
+
+@routes.get("/api/drone/watchdog")
+async def handle_drone_watchdog(request: web.Request) -> web.Response:
+    """
+    Gets the state of the watchdog of the current (or last) mission.
+    """
+    try:
+        drone: Drone = request.app["drone"]
+
+        if drone.watchdog is None:
+            return web.json_response(None)
+
+        return web.json_response(drone.watchdog.status())
+    except Exception as ex:
+        logger.exception("/api/drone/watchdog")
+        return web.Response(status=HTTPStatus.INTERNAL_SERVER_ERROR, reason=str(ex))
+
+
+@routes.get("/api/sequencer")
+async def handle_sequencer(request: web.Request) -> web.Response:
+    try:
+        sequencer: Sequencer = request.app["sequencer"]
+        return web.json_response(sequencer.status())
+    except Exception as ex:
+        logger.exception("/api/sequencer")
+        return web.Response(status=HTTPStatus.INTERNAL_SERVER_ERROR, reason=str(ex))
+
+
+@routes.post("/api/sequencer/sweep")
+async def handle_sequencer_sweep(request: web.Request) -> web.Response:
+    try:
+        sweep = await request.json()
+        logger.info("requested sweep: %s", sweep)
+        sequencer: Sequencer = request.app["sequencer"]
+        sequencer.load_sweep(sweep)
+        return web.json_response(sequencer.status())
+    except Exception as ex:
+        logger.exception("/api/sequencer/sweep")
+        return web.Response(status=HTTPStatus.INTERNAL_SERVER_ERROR, reason=str(ex))
+
+
+@routes.post("/api/sequencer/start")
+async def handle_sequencer_start(request: web.Request) -> web.Response:
+    try:
+        sequencer: Sequencer = request.app["sequencer"]
+        sequencer.start()
+        return web.Response()
+    except Exception as ex:
+        logger.exception("/api/sequencer/start")
+        return web.Response(status=HTTPStatus.INTERNAL_SERVER_ERROR, reason=str(ex))
+
+
+@routes.post("/api/sequencer/pause")
+async def handle_sequencer_pause(request: web.Request) -> web.Response:
+    try:
+        sequencer: Sequencer = request.app["sequencer"]
+        sequencer.pause()
+        return web.Response()
+    except Exception as ex:
+        logger.exception("/api/sequencer/pause")
+        return web.Response(status=HTTPStatus.INTERNAL_SERVER_ERROR, reason=str(ex))
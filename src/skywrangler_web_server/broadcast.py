@@ -0,0 +1,524 @@
+"""
+Broadcast channels for fanning out telemetry to any number of consumers.
+
+A :class:`Broadcast` keeps the latest value and delivers each new value to
+
+- listeners, which are called synchronously by :meth:`Broadcast.publish`,
+  e.g. the watchdog that has to check every position sample right away,
+- subscriptions, which are async iterators with a bounded queue and a
+  policy for consumers that can't keep up, e.g. web clients,
+- waiters of :meth:`Broadcast.wait_for`.
+
+Publishing costs a function call per listener and a queue append per
+subscription, there are no operator chains in between.
+
+A :class:`Stream` is a broadcast fed by an async generator, e.g. a MAVSDK
+telemetry stream, that only runs while the broadcast has consumers. Consumers
+can request an update rate, the source is set to the highest requested rate.
+"""
+
+import asyncio
+import collections
+import enum
+import logging
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Deque,
+    Dict,
+    Generic,
+    List,
+    Optional,
+    Tuple,
+    TypeVar,
+)
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+_NO_VALUE: Any = object()
+
+# the longest time to wait before reopening a stream that ended or failed
+MAX_RETRY_DELAY = 30.0  # seconds
+
+
+class Overflow(enum.Enum):
+    """
+    What a subscription does when its queue is full.
+    """
+
+    DROP_OLDEST = enum.auto()
+    """Drops the oldest queued value, so the consumer always gets the latest
+    values. With ``maxsize=1`` the consumer only sees the current value."""
+    DROP_NEWEST = enum.auto()
+    """Drops the new value, so the consumer gets the oldest values."""
+    CLOSE = enum.auto()
+    """Ends the subscription with :class:`SubscriptionOverflow`, e.g. to
+    disconnect a client that has stopped reading."""
+
+
+class SubscriptionOverflow(Exception):
+    """
+    Raised by a subscription with :attr:`Overflow.CLOSE` when the consumer
+    did not keep up.
+    """
+
+
+class Subscription(Generic[T]):
+    """
+    A bounded queue of values that is consumed with ``async for``.
+
+    Subscriptions are usually created by :meth:`Broadcast.subscribe`, but
+    they can also be created directly and fed with :meth:`put`, e.g. to
+    merge several broadcasts into one stream.
+
+    Args:
+        maxsize: The maximum number of queued values.
+        overflow: What to do when the queue is full.
+    """
+
+    def __init__(
+        self, maxsize: int = 64, overflow: Overflow = Overflow.DROP_OLDEST
+    ) -> None:
+        if maxsize < 1:
+            raise ValueError("maxsize must be at least 1")
+
+        self._queue: Deque[T] = collections.deque()
+        self._maxsize = maxsize
+        self._overflow = overflow
+        self._waiter: Optional[asyncio.Future] = None
+        self._closed = False
+        self._overflowed = False
+        self._on_close: Optional[Callable[[], None]] = None
+        self.dropped = 0
+        """The number of values that were dropped because the queue was full."""
+
+    def put(self, value: T) -> None:
+        """
+        Queues a value (never blocks).
+        """
+        if self._closed:
+            return
+
+        if len(self._queue) >= self._maxsize:
+            self.dropped += 1
+
+            if self._overflow is Overflow.DROP_NEWEST:
+                return
+
+            if self._overflow is Overflow.CLOSE:
+                self._overflowed = True
+                self.close()
+                return
+
+            self._queue.popleft()
+
+        self._queue.append(value)
+        self._wake()
+
+    def close(self) -> None:
+        """
+        Ends the subscription. Queued values are still delivered.
+        """
+        if self._closed:
+            return
+
+        self._closed = True
+        self._wake()
+
+        if self._on_close:
+            self._on_close()
+
+    def _wake(self) -> None:
+        if self._waiter is not None and not self._waiter.done():
+            self._waiter.set_result(None)
+
+    def __aiter__(self) -> "Subscription[T]":
+        return self
+
+    async def __anext__(self) -> T:
+        while not self._queue:
+            if self._overflowed:
+                raise SubscriptionOverflow(f"{self.dropped} values dropped")
+
+            if self._closed:
+                raise StopAsyncIteration
+
+            self._waiter = asyncio.get_running_loop().create_future()
+
+            try:
+                await self._waiter
+            finally:
+                self._waiter = None
+
+        return self._queue.popleft()
+
+    def __enter__(self) -> "Subscription[T]":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+
+class Listener:
+    """
+    A registered listener, see :meth:`Broadcast.listen`.
+    """
+
+    def __init__(self, close: Callable[[], None]) -> None:
+        self._close: Optional[Callable[[], None]] = close
+
+    def close(self) -> None:
+        """
+        Stops calling the listener.
+        """
+        if self._close:
+            self._close()
+            self._close = None
+
+
+class Broadcast(Generic[T]):
+    """
+    A value that changes over time with any number of consumers.
+
+    Args:
+        value: An optional initial value.
+    """
+
+    def __init__(self, value: T = _NO_VALUE) -> None:
+        self._value = value
+        self._listeners: List[Callable[[T], None]] = []
+        self._subscriptions: List[Subscription[T]] = []
+        self._waiters: List[Tuple[Callable[[T], bool], asyncio.Future]] = []
+        # the requested rate of each consumer
+        self._demand: Dict[object, float] = {}
+
+    @property
+    def has_value(self) -> bool:
+        """
+        Indicates if a value has been published yet.
+        """
+        return self._value is not _NO_VALUE
+
+    @property
+    def value(self) -> T:
+        """
+        The latest value.
+
+        Raises:
+            LookupError: if no value has been published yet.
+        """
+        if self._value is _NO_VALUE:
+            raise LookupError("no value yet")
+
+        return self._value
+
+    def publish(self, value: T) -> None:
+        """
+        Sets the latest value and delivers it to all consumers.
+
+        Listeners are called before this returns. An exception raised by a
+        listener is logged and does not affect the other consumers.
+        """
+        self._value = value
+
+        # copied since listeners may add or remove listeners
+        for listener in tuple(self._listeners):
+            try:
+                listener(value)
+            except Exception:
+                logger.exception("broadcast listener failed")
+
+        # copied since subscriptions with Overflow.CLOSE remove themselves
+        for subscription in tuple(self._subscriptions):
+            subscription.put(value)
+
+        if self._waiters:
+            waiting = []
+
+            for predicate, future in self._waiters:
+                if future.done():
+                    continue
+
+                try:
+                    if predicate(value):
+                        future.set_result(value)
+                        continue
+                except Exception as ex:
+                    future.set_exception(ex)
+                    continue
+
+                waiting.append((predicate, future))
+
+            self._waiters = waiting
+
+    def _add_demand(self, rate: Optional[float]) -> object:
+        key = object()
+        self._demand[key] = rate or 0.0
+        self._demand_changed()
+
+        return key
+
+    def _remove_demand(self, key: object) -> None:
+        if self._demand.pop(key, None) is not None:
+            self._demand_changed()
+
+    def _demand_changed(self) -> None:
+        """
+        Called when a consumer is added or removed.
+        """
+
+    def listen(
+        self,
+        listener: Callable[[T], None],
+        replay: bool = True,
+        rate: Optional[float] = None,
+    ) -> Listener:
+        """
+        Calls a function with the latest value (if there is one) and then
+        with each new value.
+
+        Args:
+            listener: The function. It is called synchronously from
+                :meth:`publish`, so it must not block.
+            replay: If ``False``, the function is only called with new values.
+            rate: The update rate the listener needs in Hz, if any.
+
+        Returns:
+            A handle for removing the listener.
+        """
+        self._listeners.append(listener)
+        key = self._add_demand(rate)
+
+        if replay and self._value is not _NO_VALUE:
+            listener(self._value)
+
+        def close() -> None:
+            self._listeners.remove(listener)
+            self._remove_demand(key)
+
+        return Listener(close)
+
+    def subscribe(
+        self,
+        maxsize: int = 64,
+        overflow: Overflow = Overflow.DROP_OLDEST,
+        rate: Optional[float] = None,
+    ) -> Subscription[T]:
+        """
+        Subscribes to the latest value (if there is one) and the new values.
+
+        Use ``with`` or call :meth:`Subscription.close` to unsubscribe.
+
+        Args:
+            maxsize: The maximum number of queued values.
+            overflow: What to do when the consumer does not keep up.
+            rate: The update rate the consumer needs in Hz, if any.
+
+        Returns:
+            The subscription.
+        """
+        subscription: Subscription[T] = Subscription(maxsize, overflow)
+        self._subscriptions.append(subscription)
+        key = self._add_demand(rate)
+
+        def close() -> None:
+            self._subscriptions.remove(subscription)
+            self._remove_demand(key)
+
+        subscription._on_close = close
+
+        if self._value is not _NO_VALUE:
+            subscription.put(self._value)
+
+        return subscription
+
+    async def wait_for(
+        self,
+        predicate: Callable[[T], bool] = lambda _: True,
+        rate: Optional[float] = None,
+    ) -> T:
+        """
+        Waits for a value.
+
+        Args:
+            predicate: Optional condition for the value.
+            rate: The update rate needed while waiting in Hz, if any.
+
+        Returns:
+            The latest value if it matches, otherwise the next value that
+            matches.
+        """
+        if self._value is not _NO_VALUE and predicate(self._value):
+            return self._value
+
+        future = asyncio.get_running_loop().create_future()
+        waiter = (predicate, future)
+        self._waiters.append(waiter)
+        key = self._add_demand(rate)
+
+        try:
+            return await future
+        finally:
+            if not future.done():
+                future.cancel()
+
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+
+            self._remove_demand(key)
+
+    @property
+    def consumers(self) -> int:
+        """
+        The number of listeners, subscriptions and waiters.
+        """
+        return len(self._demand)
+
+    @property
+    def rate(self) -> float:
+        """
+        The highest update rate requested by a consumer in Hz or 0 if no
+        consumer requested a rate.
+        """
+        return max(self._demand.values(), default=0.0)
+
+
+class Stream(Broadcast[T]):
+    """
+    A broadcast of an async generator that only runs while there are
+    consumers.
+
+    When the first consumer is added, the generator is started. When the
+    last consumer is removed, the generator is stopped after a delay (so
+    that e.g. reloading the web client does not restart it) and the latest
+    value is forgotten, since it would be stale by the time the next consumer
+    is added.
+
+    If the generator ends or fails while there are consumers, e.g. because
+    ``mavsdk_server`` restarted, it is started again after a delay that
+    doubles with each attempt that doesn't get a value.
+
+    Args:
+        generator: Gets the values, e.g. a MAVSDK telemetry stream.
+        set_rate: Optional function to set the update rate of the source in
+            Hz, e.g. a MAVSDK ``telemetry.set_rate_*`` method. It is called
+            with the highest rate requested by a consumer or 0 (the default
+            rate of the source) if there is none.
+        close_delay: The time to keep the generator running after the last
+            consumer is removed in seconds.
+        retry_delay: The time to wait before the first attempt to restart the
+            generator in seconds.
+    """
+
+    def __init__(
+        self,
+        generator: Callable[[], AsyncIterator[T]],
+        set_rate: Optional[Callable[[float], Awaitable[None]]] = None,
+        close_delay: float = 2.0,
+        retry_delay: float = 0.5,
+    ) -> None:
+        super().__init__()
+        self.name = getattr(generator, "__name__", repr(generator))
+        self._generator = generator
+        self._set_rate = set_rate
+        self._close_delay = close_delay
+        self._retry_delay = retry_delay
+        self._task: Optional[asyncio.Task] = None
+        self._close_handle: Optional[asyncio.TimerHandle] = None
+        self._rate_task: Optional[asyncio.Task] = None
+        self.source_rate = 0.0
+        """The update rate that the source was last set to in Hz."""
+
+    @property
+    def is_open(self) -> bool:
+        """
+        Indicates if the generator is running.
+        """
+        return self._task is not None
+
+    def _demand_changed(self) -> None:
+        if self._demand:
+            if self._close_handle:
+                self._close_handle.cancel()
+                self._close_handle = None
+
+            if self._task is None:
+                logger.debug("opening %s stream", self.name)
+                self._task = asyncio.create_task(self._run())
+                self._task.add_done_callback(self._on_task_done)
+        elif self._task and self._close_handle is None:
+            self._close_handle = asyncio.get_running_loop().call_later(
+                self._close_delay, self._close
+            )
+
+        if self._set_rate and self._rate_task is None and self.rate != self.source_rate:
+            self._rate_task = asyncio.create_task(self._update_rate())
+
+    async def _run(self) -> None:
+        delay = self._retry_delay
+
+        while True:
+            try:
+                async for value in self._generator():
+                    delay = self._retry_delay
+                    self.publish(value)
+
+                logger.warning("%s stream ended", self.name)
+            except Exception:
+                logger.exception("%s stream failed", self.name)
+
+            # only runs while there are consumers, see _close()
+            logger.info("reopening %s stream in %s s", self.name, delay)
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, MAX_RETRY_DELAY)
+
+    def _close(self) -> None:
+        self._close_handle = None
+
+        if self._task and not self._demand:
+            logger.debug("closing %s stream", self.name)
+            self._task.cancel()
+            self._task = None
+            self._value = _NO_VALUE
+
+    def _on_task_done(self, task: asyncio.Task) -> None:
+        if task is self._task:
+            self._task = None
+
+        if not task.cancelled() and task.exception():
+            logger.error("%s stream failed", self.name, exc_info=task.exception())
+
+    async def _update_rate(self) -> None:
+        assert self._set_rate is not None
+
+        try:
+            # consumers may come and go while the rate is being set
+            while self.rate != self.source_rate:
+                rate = self.rate
+                logger.debug("setting %s rate to %s Hz", self.name, rate)
+                await self._set_rate(rate)
+                self.source_rate = rate
+        except Exception:
+            logger.exception("setting %s rate failed", self.name)
+        finally:
+            self._rate_task = None
+
+    async def close(self) -> None:
+        """
+        Stops the generator, regardless of the consumers.
+        """
+        if self._close_handle:
+            self._close_handle.cancel()
+            self._close_handle = None
+
+        tasks = [t for t in (self._task, self._rate_task) if t]
+
+        for t in tasks:
+            t.cancel()
+
+        self._task = None
+        await asyncio.gather(*tasks, return_exceptions=True)
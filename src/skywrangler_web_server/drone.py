@@ -1,76 +1,461 @@
 import asyncio
+import contextlib
+import hashlib
 import logging
-from typing import AsyncGenerator, Callable, List, Optional, TypeVar, cast
+import math
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    AsyncGenerator,
+    Awaitable,
+    Callable,
+    Coroutine,
+    Dict,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    TypeVar,
+    Union,
+)
 
-import rx.core.typing as rx_typing
-import rx.operators as op
 from mavsdk import System
 from mavsdk.core import ConnectionState
 from mavsdk.mission import MissionItem, MissionPlan, MissionProgress
+from mavsdk.param import Param
 from mavsdk.telemetry import Battery, GpsInfo, Health, LandedState, Position, StatusText
-from rx.core import Observable
-from rx.subject import BehaviorSubject, Subject
 
-from .geo import diagonal_point, dist_ang_to_horiz_vert, origin_alt_to_takeoff_alt
-from .mission import Origin, Parameters, Transect, transect_points, Coordinate2D
+from .broadcast import Stream
+from .fence import buffered_fence
+from .ir import SAFE_ALTITUDE, CompiledMission, MissionWaypoint, compile_mission
+from .mission import MissionRequest, parse_mission_request
+from .plan import PlanFile, _number, plan_file, plan_mission
+from .preview import Home, mission_preview, normalize_home
+from .trace import Trace, Tracer
+from .watchdog import MissionGeometry, Waypoint, Watchdog
+
+# numpy is only needed when the server is given a terrain model
+if TYPE_CHECKING:
+    from .terrain import TerrainModel
 
 # causes spurious errors
 del System.__del__
 
 logger = logging.getLogger(__name__)
 
-SAFE_ALTITUDE = 100  # meters
-SPEED = 10  # meters per second
 NO_VALUE = float("nan")
+# prepared missions are discarded if home altitude changes by more than this
+HOME_ALTITUDE_TOLERANCE = 0.5  # meters
+# minimum height above the terrain model on every leg of a mission, more than
+# the 10-16 m error of SRTM elevations
+MIN_TERRAIN_CLEARANCE = 20.0  # meters
+# how long the vehicle may take to take off after the mission was started
+TAKEOFF_TIMEOUT = 60.0  # seconds
+
+# Vehicle parameters that need to have these values before flying a mission.
+VEHICLE_PROFILE: Dict[str, float] = {
+    # same as action.set_return_to_launch_altitude()
+    "RTL_RETURN_ALT": SAFE_ALTITUDE,
+    # same as action.set_takeoff_altitude()
+    "MIS_TAKEOFF_ALT": SAFE_ALTITUDE,
+    "MPC_Z_VEL_MAX_DN": 4.0,
+    "MPC_Z_VEL_MAX_UP": 4.0,
+    "MPC_Z_V_AUTO_DN": 4.0,
+    "MPC_Z_V_AUTO_UP": 4.0,
+}
 
 
 T = TypeVar("T")
 
 
-async def monitor_generator(
-    observer: rx_typing.Observer[T], generator: Callable[[], AsyncGenerator[T, None]]
-):
-    async for value in generator():
-        observer.on_next(value)
+class HomeUnknownError(RuntimeError):
+    """
+    Raised when the home position is needed before the vehicle reported it.
+    """
 
 
-async def wait_one(
-    observable: rx_typing.Observable[T],
-    *ops: Callable[[rx_typing.Observable[T]], rx_typing.Observable[T]],
-) -> T:
-    future = asyncio.get_running_loop().create_future()
+class MissingElevationError(RuntimeError):
+    """
+    Raised when a mission has no origin elevation and there is no terrain
+    model to look it up.
+    """
 
-    def set_result(value):
-        if future.get_loop().is_closed():
-            return
 
-        future.set_result(value)
+def _log_task_error(task: asyncio.Task) -> None:
+    if not task.cancelled() and task.exception():
+        logger.error(
+            "background task %s failed", task.get_name(), exc_info=task.exception()
+        )
+
+
+def _fingerprint_value(value: float, scale: float) -> Optional[int]:
+    if math.isnan(value):
+        return None
+
+    return round(value * scale)
+
+
+def mission_fingerprint(items: Sequence[MissionItem]) -> str:
+    """
+    Computes a fingerprint of mission items.
+
+    Values are quantized to the precision that survives a round trip through
+    the vehicle (e.g. MAVLink uses degrees * 1e7 and 32-bit floats), so the
+    fingerprint of a downloaded mission matches the one that was uploaded.
 
-    subscription = (
-        cast(Observable, observable)
-        .pipe(*ops, op.first())
-        .subscribe(on_next=set_result)
+    Args:
+        items: The mission items.
+
+    Returns:
+        A hex digest identifying the mission.
+    """
+    h = hashlib.sha256()
+
+    for item in items:
+        h.update(
+            repr(
+                (
+                    _fingerprint_value(item.latitude_deg, 1e7),
+                    _fingerprint_value(item.longitude_deg, 1e7),
+                    _fingerprint_value(item.relative_altitude_m, 1e2),
+                    _fingerprint_value(item.speed_m_s, 1e2),
+                    _fingerprint_value(item.loiter_time_s, 1e2),
+                    item.is_fly_through,
+                )
+            ).encode()
+        )
+
+    return h.hexdigest()
+
+
+def mission_items(mission: CompiledMission, home_altitude: float) -> List[MissionItem]:
+    """
+    Converts a compiled mission to MAVSDK mission items.
+
+    Point A (takeoff) and the return to launch are not mission items, they
+    are flown by the vehicle using ``MIS_TAKEOFF_ALT`` and ``RTL_RETURN_ALT``.
+
+    Args:
+        mission: The compiled mission.
+        home_altitude: The AMSL altitude of the home position of the vehicle
+            in meters.
+
+    Returns:
+        The mission items.
+    """
+    items = []
+    speed = mission.speed
+
+    for w in mission.waypoints:
+        # the vehicle default may be different, so always set the speed
+        if w.speed is not None:
+            speed = w.speed
+
+        items.append(_mission_item(w, speed, home_altitude))
+
+    return items
+
+
+def _mission_item(
+    w: MissionWaypoint, speed: float, home_altitude: float
+) -> MissionItem:
+    return MissionItem(
+        latitude_deg=w.latitude,
+        longitude_deg=w.longitude,
+        relative_altitude_m=w.altitude - home_altitude,
+        speed_m_s=speed,
+        # the vehicle only stops at waypoints that are not flown through
+        is_fly_through=not w.hold,
+        gimbal_pitch_deg=NO_VALUE,
+        gimbal_yaw_deg=NO_VALUE,
+        camera_action=MissionItem.CameraAction.NONE,
+        loiter_time_s=w.hold or NO_VALUE,
+        camera_photo_interval_s=NO_VALUE,
+        acceptance_radius_m=NO_VALUE,
+        yaw_deg=NO_VALUE,
+        camera_photo_distance_m=NO_VALUE,
     )
-    try:
-        return await future
-    finally:
-        subscription.dispose()
 
 
-def for_each(
-    observable: rx_typing.Observable[T], func: Callable[[T], None]
-) -> rx_typing.Disposable:
-    return cast(Observable, observable).subscribe(on_next=func)
+def compute_mission_items(
+    request: MissionRequest, home_altitude: float
+) -> List[MissionItem]:
+    """
+    Computes the mission items for a mission.
+
+    The compiled mission is cached, so computing the same mission again is
+    cheap.
+
+    Args:
+        request: The mission parameters.
+        home_altitude: The AMSL altitude of the home (takeoff) position in meters.
+
+    Returns:
+        The mission items.
+    """
+    return mission_items(compile_mission(request, home_altitude), home_altitude)
+
+
+def parse_mission(
+    mission_parameters: Union[Dict[str, Any], CompiledMission],
+) -> Union[MissionRequest, CompiledMission]:
+    """
+    Parses the JSON body of a mission request, which is either the mission
+    parameters, a mission compiled by the planner or a QGC ``.plan`` file.
+    Missions that are already compiled are returned as is.
+
+    Raises:
+        KeyError: if a required value is missing.
+        ValueError: if a ``.plan`` file is not valid.
+    """
+    if isinstance(mission_parameters, CompiledMission):
+        return mission_parameters
+
+    if mission_parameters.get("fileType") == "Plan":
+        return plan_mission(mission_parameters)
+
+    if "waypoints" in mission_parameters:
+        return CompiledMission.from_json(mission_parameters)
+
+    return parse_mission_request(mission_parameters)
+
+
+class VehicleConfig:
+    """
+    Vehicle configuration backed by a cache of the vehicle float parameters.
+
+    The full parameter set is downloaded once, then only parameters that
+    differ from the requested profile are written to the vehicle.
+
+    Args:
+        param: The MAVSDK param plugin.
+    """
+
+    def __init__(self, param: Param) -> None:
+        self._param = param
+        self._cache: Optional[Dict[str, float]] = None
+        self._lock = asyncio.Lock()
+        self._generation = 0
+
+    @property
+    def generation(self) -> int:
+        """
+        Counter that changes whenever the vehicle parameters may have changed.
+        """
+        return self._generation
+
+    @property
+    def is_loaded(self) -> bool:
+        """
+        Indicates if the parameter cache is populated.
+        """
+        return self._cache is not None
+
+    def invalidate(self) -> None:
+        """
+        Drops the parameter cache, e.g. when the vehicle connection is lost.
+        """
+        self._cache = None
+        self._generation += 1
+
+    async def load(self) -> None:
+        """
+        Downloads all float parameters from the vehicle into the cache.
+        """
+        async with self._lock:
+            await self._load()
+
+    async def _load(self) -> None:
+        all_params = await self._param.get_all_params()
+        self._cache = {p.name: p.value for p in all_params.float_params}
+        logger.debug("cached %d vehicle parameters", len(self._cache))
+
+    def diff(self, profile: Dict[str, float]) -> Dict[str, float]:
+        """
+        Gets the parameters in ``profile`` that differ from the cached values.
+
+        Parameters that are not in the cache are always considered different.
+
+        Args:
+            profile: The target parameter values.
+
+        Returns:
+            The subset of ``profile`` that needs to be written to the vehicle.
+        """
+        cache = self._cache or {}
+
+        return {
+            name: value
+            for name, value in profile.items()
+            if name not in cache
+            # parameters are stored as 32-bit floats on the vehicle
+            or not math.isclose(cache[name], value, rel_tol=1e-6)
+        }
+
+    async def apply(
+        self, profile: Dict[str, float], trace: Optional[Trace] = None
+    ) -> Dict[str, float]:
+        """
+        Writes changed parameters to the vehicle concurrently, then reads them
+        back to verify them.
+
+        Args:
+            profile: The target parameter values.
+            trace: Optional trace for recording the stages.
+
+        Returns:
+            The parameters that were changed.
+
+        Raises:
+            RuntimeError: if the vehicle did not accept the new values.
+        """
+        async with self._lock:
+            if self._cache is None:
+                with trace.span("load_params") if trace else contextlib.nullcontext():
+                    await self._load()
+
+            assert self._cache is not None
+
+            changed = self.diff(profile)
+
+            if not changed:
+                return changed
+
+            logger.info("setting vehicle parameters: %r", changed)
+
+            try:
+                with trace.span("set_params") if trace else contextlib.nullcontext():
+                    await asyncio.gather(
+                        *(
+                            self._param.set_param_float(name, value)
+                            for name, value in changed.items()
+                        )
+                    )
+
+                with trace.span("verify_params") if trace else contextlib.nullcontext():
+                    actual = await asyncio.gather(
+                        *(self._param.get_param_float(name) for name in changed)
+                    )
+            except BaseException:
+                # we don't know which parameters were written
+                self.invalidate()
+                raise
+
+            self._cache.update(zip(changed, actual))
+            self._generation += 1
+
+            mismatched = self.diff(changed)
+
+            if mismatched:
+                raise RuntimeError(f"vehicle rejected parameters: {mismatched!r}")
+
+            return changed
+
+
+def check_terrain_clearance(
+    terrain: "TerrainModel", home: Position, items: Sequence[MissionItem]
+) -> None:
+    """
+    Checks that no leg of a mission from point A (above home) to the last
+    mission item goes below :data:`MIN_TERRAIN_CLEARANCE`.
+
+    Legs down to the transect are flown low on purpose, so they only need
+    to clear the terrain by their planned height above the lowest point of
+    the mission, if that is less.
+
+    Args:
+        terrain: The terrain model.
+        home: The home position.
+        items: The mission items from :func:`compute_mission_items`.
+
+    Raises:
+        RuntimeError: if a leg is too close to the terrain.
+    """
+    latitudes = [home.latitude_deg] + [i.latitude_deg for i in items]
+    longitudes = [home.longitude_deg] + [i.longitude_deg for i in items]
+    altitudes = [home.absolute_altitude_m + SAFE_ALTITUDE] + [
+        home.absolute_altitude_m + i.relative_altitude_m for i in items
+    ]
+
+    clearance = terrain.leg_clearance(latitudes, longitudes, altitudes)
+    lowest = min(altitudes)
+
+    for i, c in enumerate(clearance):
+        floor = min(altitudes[i], altitudes[i + 1]) - lowest
+
+        if c < min(MIN_TERRAIN_CLEARANCE, floor):
+            raise RuntimeError(
+                f"leg {chr(ord('A') + i)}-{chr(ord('B') + i)} has "
+                f"{c:.1f} m terrain clearance"
+            )
+
+
+def mission_path(home: Position, items: Sequence[MissionItem]) -> List[Waypoint]:
+    """
+    Gets the planned path of a mission from point A (above home) through the
+    mission items and back to home.
+
+    Args:
+        home: The home position.
+        items: The mission items from :func:`compute_mission_items`.
+
+    Returns:
+        The path.
+    """
+    above_home = Waypoint(home.latitude_deg, home.longitude_deg, SAFE_ALTITUDE)
+
+    return (
+        [above_home]
+        + [
+            Waypoint(i.latitude_deg, i.longitude_deg, i.relative_altitude_m)
+            for i in items
+        ]
+        # return to launch is flown at the same altitude as point A
+        + [above_home]
+    )
+
+
+class PreparedMission(NamedTuple):
+    """
+    A mission that has been uploaded to the vehicle and is ready to launch.
+    """
+
+    mission: CompiledMission
+    """The compiled mission."""
+    home_altitude: float
+    """The home altitude used to compute the mission items."""
+    fingerprint: str
+    """The fingerprint of the uploaded mission items."""
+    config_generation: int
+    """The vehicle configuration generation when the mission was prepared."""
 
 
 class Drone:
     system: System
     _mission_task: Optional[asyncio.Task]
 
-    def __init__(self):
-        self.system = System(mavsdk_server_address="localhost")
+    def __init__(
+        self,
+        terrain: Optional["TerrainModel"] = None,
+        system: Optional[System] = None,
+    ):
+        # the system can be replaced, e.g. with a simulated vehicle (see sim.py)
+        self.system = system or System(mavsdk_server_address="localhost")
+        self.terrain = terrain
         self._mission_task = None
-        self._subcription_tasks: List[asyncio.Task] = []
+        # telemetry streams, see _init_after_connect()
+        self.streams: List[Stream] = []
+        self.traces = Tracer()
+        # fingerprint of the mission we last uploaded to the vehicle
+        self._mission_fingerprint: Optional[str] = None
+        # False if the vehicle may have lost the mission since it was uploaded
+        self._mission_verified = False
+        # the most recent home position
+        self._home: Optional[Position] = None
+        self._prepared: Optional[PreparedMission] = None
+        self._is_connected = False
+        # watches the position while a mission is flying
+        self.watchdog: Optional[Watchdog] = None
 
         # This will block forever if there is no autopilot detected, so we run
         # it in a background task so the server doesn't fail to start when
@@ -83,293 +468,517 @@ class Drone:
     def _init_after_connect(self, _: asyncio.Task):
         logger.info("drone connected")
 
-        self.connection_state: rx_typing.Observable[ConnectionState] = BehaviorSubject(
-            False
-        )
-        self._subcription_tasks.append(
-            asyncio.create_task(
-                monitor_generator(
-                    self.connection_state, self.system.core.connection_state
-                )
-            )
-        )
+        self.vehicle_config = VehicleConfig(self.system.param)
 
-        self.mission_progress: rx_typing.Observable[MissionProgress] = BehaviorSubject(
-            False
-        )
-        self._subcription_tasks.append(
-            asyncio.create_task(
-                monitor_generator(
-                    self.mission_progress, self.system.mission.mission_progress
-                )
-            )
+        # Telemetry streams are only open while something is listening, e.g.
+        # the watchdog or a web client. The drone always listens to the
+        # connection state, mission progress and home position.
+        telemetry = self.system.telemetry
+
+        self.connection_state: Stream[ConnectionState] = self._stream(
+            self.system.core.connection_state
         )
+        self.connection_state.listen(self._on_connection_state)
 
-        self.position: rx_typing.Observable[Position] = Subject()
-        self._subcription_tasks.append(
-            asyncio.create_task(
-                monitor_generator(self.position, self.system.telemetry.position)
-            )
+        # download parameters in the background so they are ready for the
+        # first mission
+        asyncio.create_task(self.vehicle_config.load()).add_done_callback(
+            _log_task_error
         )
 
-        self.home: rx_typing.Observable[Position] = Subject()
-        self._subcription_tasks.append(
-            asyncio.create_task(
-                monitor_generator(self.home, self.system.telemetry.home)
-            )
+        self.mission_progress: Stream[MissionProgress] = self._stream(
+            self.system.mission.mission_progress
         )
+        self.mission_progress.listen(self._on_mission_progress)
 
-        self.in_air: rx_typing.Observable[bool] = Subject()
-        self._subcription_tasks.append(
-            asyncio.create_task(
-                monitor_generator(self.in_air, self.system.telemetry.in_air)
-            )
+        self.position: Stream[Position] = self._stream(
+            telemetry.position, telemetry.set_rate_position
         )
 
-        self.landed_state: rx_typing.Observable[LandedState] = Subject()
-        self._subcription_tasks.append(
-            asyncio.create_task(
-                monitor_generator(self.landed_state, self.system.telemetry.landed_state)
-            )
+        self.home: Stream[Position] = self._stream(
+            telemetry.home, telemetry.set_rate_home
         )
+        self.home.listen(self._on_home)
 
-        self.armed: rx_typing.Observable[bool] = Subject()
-        self._subcription_tasks.append(
-            asyncio.create_task(
-                monitor_generator(self.armed, self.system.telemetry.armed)
-            )
+        self.in_air: Stream[bool] = self._stream(
+            telemetry.in_air, telemetry.set_rate_in_air
+        )
+        self.landed_state: Stream[LandedState] = self._stream(
+            telemetry.landed_state, telemetry.set_rate_landed_state
+        )
+        self.armed: Stream[bool] = self._stream(telemetry.armed)
+        self.gps_info: Stream[GpsInfo] = self._stream(
+            telemetry.gps_info, telemetry.set_rate_gps_info
         )
+        self.battery: Stream[Battery] = self._stream(
+            telemetry.battery, telemetry.set_rate_battery
+        )
+        self.health: Stream[Health] = self._stream(telemetry.health)
+        self.status_text: Stream[StatusText] = self._stream(telemetry.status_text)
+        self.health_all_ok: Stream[bool] = self._stream(telemetry.health_all_ok)
 
-        self.gps_info: rx_typing.Observable[GpsInfo] = Subject()
-        self._subcription_tasks.append(
-            asyncio.create_task(
-                monitor_generator(self.gps_info, self.system.telemetry.gps_info)
-            )
+    def _stream(
+        self,
+        generator: Callable[[], AsyncGenerator[T, None]],
+        set_rate: Optional[Callable[[float], Awaitable[None]]] = None,
+    ) -> Stream[T]:
+        stream = Stream(generator, set_rate)
+        self.streams.append(stream)
+
+        return stream
+
+    def _on_connection_state(self, state: ConnectionState) -> None:
+        self._is_connected = state.is_connected
+
+        if not self._is_connected:
+            self.vehicle_config.invalidate()
+            self._mission_verified = False
+
+    @property
+    def is_connected(self) -> bool:
+        """
+        Indicates if the drone is currently connected.
+        """
+        return self._is_connected
+
+    async def _upload_mission(self, mission_plan: MissionPlan, trace: Trace) -> None:
+        """
+        Uploads a mission unless the vehicle already has the same mission.
+        """
+        fingerprint = mission_fingerprint(mission_plan.mission_items)
+
+        if fingerprint == self._mission_fingerprint and not self._mission_verified:
+            with trace.span("download_mission"):
+                on_vehicle = await self.system.mission.download_mission()
+
+            if mission_fingerprint(on_vehicle.mission_items) == fingerprint:
+                self._mission_verified = True
+            else:
+                self._mission_fingerprint = None
+
+        if fingerprint == self._mission_fingerprint:
+            logger.info("mission already on vehicle, skipping upload")
+
+            # the vehicle may still point at the last item of the previous run
+            with trace.span("set_current_mission_item"):
+                await self.system.mission.set_current_mission_item(0)
+
+            return
+
+        # if the upload fails, we don't know what is on the vehicle
+        self._mission_fingerprint = None
+
+        logger.info("Uploading mission...")
+        with trace.span("upload_mission"):
+            await self.system.mission.upload_mission(mission_plan)
+
+        self._mission_fingerprint = fingerprint
+        self._mission_verified = True
+
+    def _on_mission_progress(self, progress: MissionProgress) -> None:
+        if self.watchdog and progress.total and progress.current >= progress.total:
+            logger.info("mission complete, stopping watchdog")
+            self.watchdog.stop()
+
+    def _start_watchdog(self, prepared: PreparedMission) -> None:
+        assert self._home is not None
+
+        if self.watchdog:
+            self.watchdog.stop()
+
+        items = mission_items(prepared.mission, prepared.home_altitude)
+        path = mission_path(self._home, items)
+        fences = list(prepared.mission.fences)
+
+        # like the planner, keep computed missions inside their footprint
+        if not any(f.inclusion for f in fences):
+            fences.append(buffered_fence([(w.latitude, w.longitude) for w in path]))
+
+        geometry = MissionGeometry(
+            (self._home.latitude_deg, self._home.longitude_deg), path, fences
         )
 
-        self.battery: rx_typing.Observable[Battery] = Subject()
-        self._subcription_tasks.append(
-            asyncio.create_task(
-                monitor_generator(self.battery, self.system.telemetry.battery)
-            )
+        self.watchdog = Watchdog(geometry, self._on_watchdog_violation)
+        self.watchdog.start(self.position)
+
+    def _on_watchdog_violation(self, reason: str) -> None:
+        # called synchronously from the position broadcast, so the command is
+        # sent on the next iteration of the event loop
+        trace = self.traces.start("watchdog")
+        asyncio.create_task(self._watchdog_return(trace)).add_done_callback(
+            _log_task_error
         )
 
-        self.health: rx_typing.Observable[Health] = Subject()
-        self._subcription_tasks.append(
-            asyncio.create_task(
-                monitor_generator(self.health, self.system.telemetry.health)
+    async def _watchdog_return(self, trace: Trace) -> None:
+        with trace.span("return_to_launch"):
+            await self.return_to_launch()
+
+    def _on_home(self, home: Position) -> None:
+        self._home = home
+
+        if (
+            self._prepared
+            and abs(home.absolute_altitude_m - self._prepared.home_altitude)
+            > HOME_ALTITUDE_TOLERANCE
+        ):
+            logger.warning("home altitude changed, discarding prepared mission")
+            self._prepared = None
+
+    def _prepared_mission_error(self, prepared: PreparedMission) -> Optional[str]:
+        """
+        Checks if a prepared mission is still valid.
+
+        Returns:
+            The reason the mission is no longer valid or ``None`` if it is valid.
+        """
+        if self._home is None or (
+            abs(self._home.absolute_altitude_m - prepared.home_altitude)
+            > HOME_ALTITUDE_TOLERANCE
+        ):
+            return "home position changed"
+
+        if self.vehicle_config.generation != prepared.config_generation:
+            return "vehicle parameters changed"
+
+        if (
+            self._mission_fingerprint != prepared.fingerprint
+            or not self._mission_verified
+        ):
+            return "mission on vehicle changed"
+
+        return None
+
+    def _with_origin_elevation(self, request: MissionRequest) -> MissionRequest:
+        """
+        Fills in the origin elevation from the terrain model if the request
+        does not have one (blocking).
+
+        Raises:
+            MissingElevationError: if the elevation is missing and there is no
+                terrain model.
+        """
+        if not math.isnan(request.origin.elevation):
+            return request
+
+        if self.terrain is None:
+            raise MissingElevationError(
+                "origin elevation is required without a terrain model"
             )
+
+        elevation = self.terrain.elevation(
+            request.origin.latitude, request.origin.longitude
         )
 
-        self.status_text: rx_typing.Observable[StatusText] = Subject()
-        self._subcription_tasks.append(
-            asyncio.create_task(
-                monitor_generator(self.status_text, self.system.telemetry.status_text)
-            )
+        return request._replace(
+            origin=request.origin._replace(elevation=float(elevation))
         )
 
-        self.health_all_ok: rx_typing.Observable[bool] = Subject()
-        self._subcription_tasks.append(
-            asyncio.create_task(
-                monitor_generator(
-                    self.health_all_ok, self.system.telemetry.health_all_ok
+    async def _prepare_mission(
+        self, request: Union[MissionRequest, CompiledMission], trace: Trace
+    ) -> PreparedMission:
+        # TODO: connection check?
+        # TODO: health check?
+        logger.info("preparing mission with %r", request)
+
+        if self._home is None:
+            with trace.span("wait_home"):
+                self._home = await self.home.wait_for()
+
+        home_altitude = self._home.absolute_altitude_m
+        loop = asyncio.get_running_loop()
+
+        if isinstance(request, CompiledMission):
+            # compiled by the planner, fly it as is
+            mission = request
+        else:
+            if math.isnan(request.origin.elevation):
+                with trace.span("origin_elevation"):
+                    request = await loop.run_in_executor(
+                        None, self._with_origin_elevation, request
+                    )
+
+            with trace.span("compile_mission"):
+                # geometry is CPU bound, so keep it off of the event loop
+                mission = await loop.run_in_executor(
+                    None, compile_mission, request, home_altitude
+                )
+
+        with trace.span("mission_items"):
+            items = mission_items(mission, home_altitude)
+
+        if self.terrain is not None:
+            with trace.span("terrain_clearance"):
+                await loop.run_in_executor(
+                    None, check_terrain_clearance, self.terrain, self._home, items
                 )
-            )
+
+        with trace.span("configure_vehicle"):
+            await self.vehicle_config.apply(VEHICLE_PROFILE, trace)
+
+        mission_plan = MissionPlan(items)
+        with trace.span("set_return_to_launch_after_mission"):
+            await self.system.mission.set_return_to_launch_after_mission(True)
+        await self._upload_mission(mission_plan, trace)
+
+        return PreparedMission(
+            mission,
+            home_altitude,
+            mission_fingerprint(items),
+            self.vehicle_config.generation,
         )
 
+    async def _launch_mission(self, prepared: PreparedMission, trace: Trace) -> None:
+        error = self._prepared_mission_error(prepared)
+
+        if error:
+            raise RuntimeError(f"prepared mission is no longer valid: {error}")
+
+        logger.info("arming...")
+        with trace.span("arm"):
+            await self.system.action.arm()
+        logger.info("Starting mission...")
+        with trace.span("start_mission"):
+            await self.system.mission.start_mission()
+
+        self._start_watchdog(prepared)
+
     async def _fly_mission(
-        self,
-        origin: Origin,
-        transect: Transect,
-        parameters: Parameters,
-        return_point: Coordinate2D,
+        self, request: Union[MissionRequest, CompiledMission], trace: Trace
     ) -> None:
-        # TODO: connection check?
-        # TODO: health check?
-        logger.info(
-            "starting mission with %r %r %r %r",
-            origin,
-            transect,
-            parameters,
-            return_point,
-        )
+        prepared = await self._prepare_mission(request, trace)
+        await self._launch_mission(prepared, trace)
 
-        horizontal, vertical = dist_ang_to_horiz_vert(
-            parameters.distance, parameters.angle
-        )
-        (c, d) = transect_points(origin, transect, parameters)
-        home_position = await wait_one(self.home)
+    async def _run_mission_task(self, coro: Coroutine[Any, Any, T]) -> T:
+        if self._mission_task:
+            coro.close()
+            raise RuntimeError("mission already in progress")
 
-        # mission items need altitudes relative to takeoff altitude
-        relative_vertical = origin_alt_to_takeoff_alt(
-            vertical, origin.elevation, home_position.absolute_altitude_m
-        )
-        (lat_b, lon_b) = diagonal_point(
-            c.latitude,
-            c.longitude,
-            SAFE_ALTITUDE - relative_vertical,
-            transect.azimuth - 90,
+        self._mission_task = asyncio.create_task(coro)
+
+        try:
+            return await self._mission_task
+        finally:
+            self._mission_task = None
+
+    async def prepare_mission(self, mission_parameters) -> None:
+        """
+        Computes the mission, configures the vehicle and uploads the mission
+        so that :meth:`launch_mission` only has to arm and start.
+        """
+        request = parse_mission(mission_parameters)
+        trace = self.traces.start("prepare_mission")
+
+        self._prepared = None
+        self._prepared = await self._run_mission_task(
+            self._prepare_mission(request, trace)
         )
-        (lat_e, lon_e) = diagonal_point(
-            d.latitude,
-            d.longitude,
-            SAFE_ALTITUDE - relative_vertical,
-            transect.azimuth + 90,
+
+    async def launch_mission(self) -> None:
+        """
+        Arms the vehicle and starts the mission from :meth:`prepare_mission`.
+
+        Raises:
+            RuntimeError: if there is no prepared mission or it is no longer
+                valid because the home position, the vehicle parameters or the
+                mission on the vehicle changed.
+        """
+        prepared = self._prepared
+
+        if prepared is None:
+            raise RuntimeError("no mission prepared")
+
+        trace = self.traces.start("launch_mission")
+
+        # a prepared mission can only be flown once
+        self._prepared = None
+        await self._run_mission_task(self._launch_mission(prepared, trace))
+
+    async def precompute_mission(self, mission_parameters) -> None:
+        """
+        Computes the mission items for a mission ahead of time (without
+        touching the vehicle) so that preparing it later is faster.
+
+        Does nothing if the home position is not known yet.
+        """
+        request = parse_mission(mission_parameters)
+
+        if self._home is None or isinstance(request, CompiledMission):
+            return
+
+        loop = asyncio.get_running_loop()
+        request = await loop.run_in_executor(None, self._with_origin_elevation, request)
+        await loop.run_in_executor(
+            None, compile_mission, request, self._home.absolute_altitude_m
         )
-        (lat_f, lon_f) = return_point.latitude, return_point.longitude
-
-        logger.info("relative verticle %r", relative_vertical)
-
-        mission_items = []
-
-        # Point A is not a mission item, it is going to safe altitude above home
-
-        # Flies to line colinear of the tranesct
-        # Point B
-        mission_items.append(
-            MissionItem(
-                latitude_deg=lat_b,
-                longitude_deg=lon_b,
-                relative_altitude_m=SAFE_ALTITUDE,
-                speed_m_s=SPEED,
-                is_fly_through=True,
-                gimbal_pitch_deg=NO_VALUE,
-                gimbal_yaw_deg=NO_VALUE,
-                camera_action=MissionItem.CameraAction.NONE,
-                loiter_time_s=NO_VALUE,
-                camera_photo_interval_s=NO_VALUE,
-                acceptance_radius_m=NO_VALUE,
-                yaw_deg=NO_VALUE,
-                camera_photo_distance_m=NO_VALUE,
+
+    def _home_key(self, home: Optional[Dict[str, float]]) -> Home:
+        if home is not None:
+            if not isinstance(home, dict):
+                raise ValueError("home is not an object")
+
+            return normalize_home(
+                *(
+                    _number(home.get(key), f"home {key}")
+                    for key in ("latitude", "longitude", "altitude")
+                )
             )
+
+        if self._home is None:
+            raise HomeUnknownError("home position is not known yet")
+
+        return normalize_home(
+            self._home.latitude_deg,
+            self._home.longitude_deg,
+            self._home.absolute_altitude_m,
         )
-        # flies at an angle of 60 degrees towards the start of the transect
-        # Point C
-        mission_items.append(
-            MissionItem(
-                latitude_deg=c.latitude,
-                longitude_deg=c.longitude,
-                relative_altitude_m=relative_vertical,
-                speed_m_s=parameters.speed,
-                is_fly_through=True,
-                gimbal_pitch_deg=NO_VALUE,
-                gimbal_yaw_deg=NO_VALUE,
-                camera_action=MissionItem.CameraAction.NONE,
-                loiter_time_s=NO_VALUE,
-                camera_photo_interval_s=NO_VALUE,
-                acceptance_radius_m=NO_VALUE,
-                yaw_deg=NO_VALUE,
-                camera_photo_distance_m=NO_VALUE,
-            )
+
+    async def preview_missions(
+        self,
+        missions: Sequence[Dict[str, Any]],
+        home: Optional[Dict[str, float]] = None,
+    ) -> List[str]:
+        """
+        Computes the planned paths of missions without touching the vehicle.
+
+        Args:
+            missions: The missions in the same format as :meth:`fly_mission`.
+            home: The ``latitude``, ``longitude`` and ``altitude`` (AMSL) of
+                the home position or ``None`` to use the current home
+                position of the vehicle.
+
+        Returns:
+            The GeoJSON text of each preview, see :func:`.preview.mission_geojson`.
+
+        Raises:
+            HomeUnknownError: if no home position is given and it is not known
+                yet.
+            MissingElevationError: if a mission has no origin elevation and
+                there is no terrain model.
+        """
+        home_key = self._home_key(home)
+        parsed = [parse_mission(m) for m in missions]
+
+        # geometry (and terrain lookups) are CPU bound, so keep them off of
+        # the event loop
+        return await asyncio.get_running_loop().run_in_executor(
+            None, self._preview_missions, parsed, home_key
         )
-        # Flies at requested speed and requested altitude to the end of the transect
-        # Point D
-        mission_items.append(
-            MissionItem(
-                latitude_deg=d.latitude,
-                longitude_deg=d.longitude,
-                relative_altitude_m=relative_vertical,
-                speed_m_s=SPEED,
-                is_fly_through=True,
-                gimbal_pitch_deg=NO_VALUE,
-                gimbal_yaw_deg=NO_VALUE,
-                camera_action=MissionItem.CameraAction.NONE,
-                loiter_time_s=NO_VALUE,
-                camera_photo_interval_s=NO_VALUE,
-                acceptance_radius_m=NO_VALUE,
-                yaw_deg=NO_VALUE,
-                camera_photo_distance_m=NO_VALUE,
+
+    def _preview_missions(
+        self, missions: List[Union[MissionRequest, CompiledMission]], home: Home
+    ) -> List[str]:
+        return [
+            mission_preview(
+                (
+                    self._with_origin_elevation(m)
+                    if isinstance(m, MissionRequest)
+                    else m
+                ),
+                home,
             )
-        )
-        # ascends at 60 degrees towards the safe altitude towards the return point
-        # Point E
-        mission_items.append(
-            MissionItem(
-                latitude_deg=lat_e,
-                longitude_deg=lon_e,
-                relative_altitude_m=SAFE_ALTITUDE,
-                speed_m_s=SPEED,
-                is_fly_through=True,
-                gimbal_pitch_deg=NO_VALUE,
-                gimbal_yaw_deg=NO_VALUE,
-                camera_action=MissionItem.CameraAction.NONE,
-                loiter_time_s=NO_VALUE,
-                camera_photo_interval_s=NO_VALUE,
-                acceptance_radius_m=NO_VALUE,
-                yaw_deg=NO_VALUE,
-                camera_photo_distance_m=NO_VALUE,
+            for m in missions
+        ]
+
+    async def mission_plan_file(
+        self,
+        mission_parameters: Dict[str, Any],
+        home: Optional[Dict[str, float]] = None,
+    ) -> PlanFile:
+        """
+        Gets the QGC plan of a mission without touching the vehicle.
+
+        Args:
+            mission_parameters: The mission in the same format as
+                :meth:`fly_mission`.
+            home: The home position, see :meth:`preview_missions`.
+
+        Returns:
+            The encoded plan.
+
+        Raises:
+            HomeUnknownError: if no home position is given and it is not known
+                yet.
+            MissingElevationError: if a mission has no origin elevation and
+                there is no terrain model.
+        """
+        latitude, longitude, altitude = self._home_key(home)
+        mission = parse_mission(mission_parameters)
+        loop = asyncio.get_running_loop()
+
+        if isinstance(mission, MissionRequest):
+            mission = await loop.run_in_executor(
+                None, self._with_origin_elevation, mission
             )
-        )
-        # Flies at a safe altitude and returns to launch
-        # Point F
-        mission_items.append(
-            MissionItem(
-                latitude_deg=lat_f,
-                longitude_deg=lon_f,
-                relative_altitude_m=SAFE_ALTITUDE,
-                speed_m_s=SPEED,
-                is_fly_through=True,
-                gimbal_pitch_deg=NO_VALUE,
-                gimbal_yaw_deg=NO_VALUE,
-                camera_action=MissionItem.CameraAction.NONE,
-                loiter_time_s=NO_VALUE,
-                camera_photo_interval_s=NO_VALUE,
-                acceptance_radius_m=NO_VALUE,
-                yaw_deg=NO_VALUE,
-                camera_photo_distance_m=NO_VALUE,
+            mission = await loop.run_in_executor(
+                None, compile_mission, mission, altitude
             )
-        )
-        await self.system.action.set_return_to_launch_altitude(SAFE_ALTITUDE)
-        await self.system.action.set_takeoff_altitude(SAFE_ALTITUDE)
-
-        await self.system.param.set_param_float("MPC_Z_VEL_MAX_DN", 4.0)
-        await self.system.param.set_param_float("MPC_Z_VEL_MAX_UP", 4.0)
-        await self.system.param.set_param_float("MPC_Z_V_AUTO_DN", 4.0)
-        await self.system.param.set_param_float("MPC_Z_V_AUTO_UP", 4.0)
 
-        mission_plan = MissionPlan(mission_items)
-        await self.system.mission.set_return_to_launch_after_mission(True)
-        logger.info("Uploading mission...")
-        await self.system.mission.upload_mission(mission_plan)
-        logger.info("arming...")
-        await self.system.action.arm()
-        logger.info("Starting mission...")
-        await self.system.mission.start_mission()
+        return await loop.run_in_executor(
+            None, plan_file, mission, (latitude, longitude)
+        )
 
     async def fly_mission(self, mission_parameters) -> None:
-        if self._mission_task:
-            raise RuntimeError("mission already in progress")
+        request = parse_mission(mission_parameters)
+        trace = self.traces.start("fly_mission")
 
-        # TODO: validate parameters
-        origin = Origin(
-            mission_parameters["origin"]["latitude"],
-            mission_parameters["origin"]["longitude"],
-            mission_parameters["origin"]["elevation"],
-        )
-        transect = Transect(
-            mission_parameters["transect"]["azimuth"],
-            mission_parameters["transect"]["length"],
-        )
-        parameters = Parameters(
-            mission_parameters["parameters"]["speed"],
-            mission_parameters["parameters"]["distance"],
-            mission_parameters["parameters"]["angle"],
-        )
-        return_point = Coordinate2D(
-            mission_parameters["returnPoint"]["latitude"],
-            mission_parameters["returnPoint"]["longitude"],
-        )
+        self._prepared = None
+        await self._run_mission_task(self._fly_mission(request, trace))
 
-        self._mission_task = asyncio.create_task(
-            self._fly_mission(origin, transect, parameters, return_point)
+    async def _wait_takeoff_and_landing(self, takeoff_timeout: float) -> None:
+        try:
+            await asyncio.wait_for(
+                self.landed_state.wait_for(lambda s: s == LandedState.IN_AIR),
+                takeoff_timeout,
+            )
+        except asyncio.TimeoutError:
+            raise RuntimeError(
+                f"vehicle did not take off within {takeoff_timeout:.0f} s"
+            ) from None
+
+        await self.landed_state.wait_for(lambda s: s == LandedState.ON_GROUND)
+
+    async def wait_mission_complete(
+        self, takeoff_timeout: float = TAKEOFF_TIMEOUT
+    ) -> bool:
+        """
+        Waits for the vehicle to take off and land again.
+
+        Args:
+            takeoff_timeout: How long to wait for the vehicle to take off in
+                seconds.
+
+        Returns:
+            ``True`` if the mission was completed or ``False`` if it was
+            interrupted, e.g. by :meth:`return_to_launch`.
+
+        Raises:
+            RuntimeError: if the vehicle does not take off in time or the
+                connection to the vehicle is lost.
+        """
+        flight = asyncio.ensure_future(self._wait_takeoff_and_landing(takeoff_timeout))
+        disconnected = asyncio.ensure_future(
+            self.connection_state.wait_for(lambda s: not s.is_connected)
         )
 
         try:
-            await self._mission_task
+            await asyncio.wait(
+                (flight, disconnected), return_when=asyncio.FIRST_COMPLETED
+            )
+
+            if not flight.done():
+                raise RuntimeError("lost connection to the vehicle")
+
+            flight.result()
         finally:
-            self._mission_task = None
+            flight.cancel()
+            disconnected.cancel()
+
+        return await self.system.mission.is_mission_finished()
 
     async def return_to_launch(self) -> None:
+        if self.watchdog:
+            self.watchdog.stop()
+
         if self._mission_task:
             logger.debug("canceling mission")
             self._mission_task.cancel()
@@ -378,13 +987,13 @@ class Drone:
         await self.system.action.return_to_launch()
 
     async def cancel_all_tasks(self):
+        if self.watchdog:
+            self.watchdog.stop()
+
         if self._mission_task:
             self._mission_task.cancel()
 
-        for t in self._subcription_tasks:
-            t.cancel()
-
-        await asyncio.wait(self._subcription_tasks)
+        await asyncio.gather(*(s.close() for s in self.streams))
 
 
 async def test():
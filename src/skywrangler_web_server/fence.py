@@ -0,0 +1,151 @@
+"""
+Geofences shared by the planner and the web server.
+
+The server flies missions with the fences of uploaded plans, or with a fence
+around the mission footprint like the planner generates (see
+``sw_mission.fence``), and the watchdog returns the drone to launch when it
+leaves them. This module is also imported by the planner, so it must stay
+compatible with the oldest Python supported by the server and must not
+import numpy.
+"""
+
+import math
+from typing import List, NamedTuple, Sequence, Tuple, Union
+
+EARTH_RADIUS = 6371008.8
+
+# distance from the mission footprint to the generated fence
+DEFAULT_BUFFER = 30.0  # meters
+
+# number of segments used to approximate the buffer around each point
+BUFFER_SEGMENTS = 16
+
+
+class FencePolygon(NamedTuple):
+    """
+    A polygon geofence.
+    """
+
+    points: Tuple[Tuple[float, float], ...]
+    """The (latitude, longitude) vertices."""
+    inclusion: bool = True
+    """``True`` if the drone must stay inside, ``False`` if it must stay out."""
+
+
+class FenceCircle(NamedTuple):
+    """
+    A circular geofence.
+    """
+
+    center: Tuple[float, float]
+    """The (latitude, longitude) of the center."""
+    radius: float
+    """The radius in meters."""
+    inclusion: bool = True
+    """``True`` if the drone must stay inside, ``False`` if it must stay out."""
+
+
+Fence = Union[FencePolygon, FenceCircle]
+
+
+def fence_to_json(fence: Fence) -> dict:
+    """
+    Gets a JSON-serializable representation of a fence.
+    """
+    if isinstance(fence, FenceCircle):
+        return {
+            "center": list(fence.center),
+            "radius": fence.radius,
+            "inclusion": fence.inclusion,
+        }
+
+    return {"points": [list(p) for p in fence.points], "inclusion": fence.inclusion}
+
+
+def fence_from_json(obj: dict) -> Fence:
+    """
+    Parses the representation from :func:`fence_to_json`.
+
+    Raises:
+        KeyError: if a required value is missing.
+    """
+    if "center" in obj:
+        latitude, longitude = obj["center"]
+        return FenceCircle(
+            (latitude, longitude), obj["radius"], obj.get("inclusion", True)
+        )
+
+    return FencePolygon(
+        tuple((latitude, longitude) for latitude, longitude in obj["points"]),
+        obj.get("inclusion", True),
+    )
+
+
+def convex_hull(x: Sequence[float], y: Sequence[float]) -> List[int]:
+    """
+    Gets the convex hull of points (Andrew's monotone chain).
+
+    Returns:
+        The indices of the hull vertices in counter-clockwise order.
+    """
+    order = sorted(range(len(x)), key=lambda i: (x[i], y[i]))
+
+    def cross(o: int, a: int, b: int) -> float:
+        return (x[a] - x[o]) * (y[b] - y[o]) - (y[a] - y[o]) * (x[b] - x[o])
+
+    def half(indices: Sequence[int]) -> List[int]:
+        chain: List[int] = []
+
+        for i in indices:
+            while len(chain) >= 2 and cross(chain[-2], chain[-1], i) <= 0:
+                chain.pop()
+            chain.append(i)
+
+        return chain
+
+    lower = half(order)
+    upper = half(order[::-1])
+
+    return lower[:-1] + upper[:-1]
+
+
+def buffered_fence(
+    points: Sequence[Tuple[float, float]], buffer: float = DEFAULT_BUFFER
+) -> FencePolygon:
+    """
+    Creates an inclusion fence around the footprint of a mission.
+
+    Args:
+        points: (latitude, longitude) of every point the mission flies to.
+        buffer: The minimum distance from the points to the fence in meters.
+
+    Returns:
+        The convex hull of the points grown by ``buffer``, in clockwise order
+        like QGC writes polygons.
+    """
+    # local east/north plane around the center of the points
+    lat0 = sum(p[0] for p in points) / len(points)
+    lon0 = sum(p[1] for p in points) / len(points)
+    ky = math.radians(1) * EARTH_RADIUS
+    kx = ky * math.cos(math.radians(lat0))
+
+    # circumscribe the circle so the fence is never closer than buffer
+    radius = buffer / math.cos(math.pi / BUFFER_SEGMENTS)
+    offsets = [
+        (
+            radius * math.cos(2 * math.pi * i / BUFFER_SEGMENTS),
+            radius * math.sin(2 * math.pi * i / BUFFER_SEGMENTS),
+        )
+        for i in range(BUFFER_SEGMENTS)
+    ]
+    x: List[float] = []
+    y: List[float] = []
+
+    for latitude, longitude in points:
+        for dx, dy in offsets:
+            x.append((longitude - lon0) * kx + dx)
+            y.append((latitude - lat0) * ky + dy)
+
+    return FencePolygon(
+        tuple((lat0 + y[i] / ky, lon0 + x[i] / kx) for i in reversed(convex_hull(x, y)))
+    )
@@ -2,25 +2,21 @@
 Geo reference helper functions.
 """
 
+import functools
 from math import sin, cos, tan, pi
-from typing import Tuple
+from typing import TYPE_CHECKING, Tuple
 
-from pyproj import CRS, Transformer
-from pyproj.aoi import AreaOfInterest
-from pyproj.database import query_utm_crs_info
+# pyproj is slow to import and is only needed when a mission is planned, so
+# it is imported on first use instead of at server startup.
+if TYPE_CHECKING:
+    from pyproj import CRS, Transformer
 
 
-def _find_utm_crs(latitude: float, longitude: float) -> CRS:
-    """
-    Gets the UTM coordinate reference system for a given latitude and longitude.
+def _query_utm_crs(latitude: float, longitude: float) -> "CRS":
+    from pyproj import CRS
+    from pyproj.aoi import AreaOfInterest
+    from pyproj.database import query_utm_crs_info
 
-    Args:
-        latitude: The latitude in degrees.
-        longitude: The longitude in degrees.
-
-    Returns:
-        The UTM coordinate referene system.
-    """
     utm_crs_list = query_utm_crs_info(
         datum_name="WGS 84",
         area_of_interest=AreaOfInterest(
@@ -30,13 +26,39 @@ def _find_utm_crs(latitude: float, longitude: float) -> CRS:
             north_lat_degree=latitude,
         ),
     )
-    utm_crs = CRS.from_epsg(utm_crs_list[0].code)
-    return utm_crs
+    return CRS.from_epsg(utm_crs_list[0].code)
+
+
+@functools.lru_cache(maxsize=8)
+def _zone_utm_crs(zone: int, south: bool) -> "CRS":
+    # the database query takes ~0.1 s, so it is done once per zone using a
+    # point in the middle of the zone
+    return _query_utm_crs(-40.0 if south else 40.0, zone * 6 - 183.0)
+
+
+def _find_utm_crs(latitude: float, longitude: float) -> "CRS":
+    """
+    Gets the UTM coordinate reference system for a given latitude and longitude.
+
+    Args:
+        latitude: The latitude in degrees.
+        longitude: The longitude in degrees.
+
+    Returns:
+        The UTM coordinate referene system.
+    """
+    # Zones are regular 6° bands between 80°S and 56°N. Elsewhere (Norway and
+    # Svalbard have exceptions) and on zone boundaries (which match two
+    # zones), the database decides.
+    if -80 <= latitude < 56 and (longitude + 180) % 6 and -180 < longitude < 180:
+        return _zone_utm_crs(int((longitude + 180) // 6) + 1, latitude < 0)
+
+    return _query_utm_crs(latitude, longitude)
 
 
 def latlon_to_utm(
     latitude: float, longitude: float
-) -> Tuple[float, float, Transformer]:
+) -> Tuple[float, float, "Transformer"]:
     """
     Converts latitude and longitude to UTM reference system.
 
@@ -48,6 +70,8 @@ def latlon_to_utm(
         A tuple of the x and y coordinates in meters (UTM easting an northing)
         and the transformer used for the conversion.
     """
+    from pyproj import Transformer
+
     crs = _find_utm_crs(latitude, longitude)
 
     # transformer that converts from latlon to utm
@@ -58,7 +82,9 @@ def latlon_to_utm(
     )
 
 
-def utm_to_latlon(x: float, y: float, transformer: Transformer) -> Tuple[float, float]:
+def utm_to_latlon(
+    x: float, y: float, transformer: "Transformer"
+) -> Tuple[float, float]:
     """
     Converts easting and norting from UTM reference system to latitude and longitude.
 
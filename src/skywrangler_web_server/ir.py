@@ -0,0 +1,170 @@
+"""
+Compiled mission intermediate representation.
+
+The mission geometry is computed once here and shared by the web server,
+which flies it as MAVSDK mission items, and the planner (``sw_mission``),
+which exports it as a QGC plan. This module is also imported by the planner,
+so it must stay compatible with the oldest Python supported by the server and
+must not import MAVSDK or aiohttp.
+"""
+
+import functools
+from typing import Any, Dict, NamedTuple, Optional, Tuple
+
+from .fence import Fence, fence_from_json, fence_to_json
+from .geo import diagonal_point
+from .mission import MissionRequest, Origin, Parameters, Transect, transect_points
+
+SAFE_ALTITUDE = 100  # meters
+SPEED = 10  # meters per second
+
+
+class MissionWaypoint(NamedTuple):
+    """
+    A point the vehicle flies to.
+    """
+
+    name: str
+    """The name of the point, e.g. ``"C"``."""
+    latitude: float
+    longitude: float
+    altitude: float
+    """The altitude AMSL in meters."""
+    speed: Optional[float] = None
+    """The horizontal speed after reaching this point in meters per second or
+    ``None`` to keep the current speed."""
+    hold: float = 0.0
+    """How long to hover at this point in seconds."""
+
+
+class CompiledMission(NamedTuple):
+    """
+    A mission from takeoff to return to launch.
+
+    The vehicle takes off straight up to ``safe_altitude`` (point A), flies to
+    each waypoint in turn, then returns to launch at ``safe_altitude``.
+    """
+
+    home_altitude: float
+    """The AMSL altitude of the home (takeoff) position the mission was
+    computed for in meters."""
+    waypoints: Tuple[MissionWaypoint, ...]
+    """The waypoints after takeoff."""
+    safe_altitude: float = SAFE_ALTITUDE
+    """The takeoff and return altitude relative to home in meters."""
+    speed: float = SPEED
+    """The default horizontal speed in meters per second."""
+    fences: Tuple[Fence, ...] = ()
+    """The geofences of the mission. Without an inclusion fence, the vehicle
+    is kept inside a fence around the waypoints."""
+
+    def to_json(self) -> Dict[str, Any]:
+        """
+        Gets a JSON-serializable representation of the mission.
+        """
+        return {
+            "homeAltitude": self.home_altitude,
+            "safeAltitude": self.safe_altitude,
+            "speed": self.speed,
+            "waypoints": [w._asdict() for w in self.waypoints],
+            "fences": [fence_to_json(f) for f in self.fences],
+        }
+
+    @staticmethod
+    def from_json(obj: Dict[str, Any]) -> "CompiledMission":
+        """
+        Parses the representation from :meth:`to_json`.
+
+        Raises:
+            KeyError: if a required value is missing.
+        """
+        return CompiledMission(
+            home_altitude=obj["homeAltitude"],
+            waypoints=tuple(MissionWaypoint(**w) for w in obj["waypoints"]),
+            safe_altitude=obj.get("safeAltitude", SAFE_ALTITUDE),
+            speed=obj.get("speed", SPEED),
+            fences=tuple(fence_from_json(f) for f in obj.get("fences", ())),
+        )
+
+
+def _pass_waypoints(
+    origin: Origin,
+    transect: Transect,
+    parameters: Parameters,
+    home_altitude: float,
+    first_name: str,
+    hold: float,
+) -> Tuple[MissionWaypoint, ...]:
+    """
+    Computes the waypoints (points B to E) for one pass of the transect.
+    """
+    c, d = transect_points(origin, transect, parameters)
+    safe_altitude = home_altitude + SAFE_ALTITUDE
+
+    # the approach (B-C) and the climb after the transect (D-E) are at a
+    # fixed angle of 60 degrees
+    descent = safe_altitude - c.altitue
+    lat_b, lon_b = diagonal_point(
+        c.latitude, c.longitude, descent, transect.azimuth - 90
+    )
+    lat_e, lon_e = diagonal_point(
+        d.latitude, d.longitude, descent, transect.azimuth + 90
+    )
+
+    b, c_name, d_name, e = (chr(ord(first_name) + i) for i in range(4))
+
+    return (
+        # Flies to line colinear of the transect
+        MissionWaypoint(b, lat_b, lon_b, safe_altitude, SPEED, hold),
+        # descends towards the start of the transect
+        MissionWaypoint(c_name, c.latitude, c.longitude, c.altitue, parameters.speed),
+        # Flies at requested speed and requested altitude to the end of the
+        # transect
+        MissionWaypoint(d_name, d.latitude, d.longitude, d.altitue, SPEED),
+        # climbs back to safe altitude
+        MissionWaypoint(e, lat_e, lon_e, safe_altitude, SPEED),
+    )
+
+
+@functools.lru_cache(maxsize=32)
+def compile_mission(request: MissionRequest, home_altitude: float) -> CompiledMission:
+    """
+    Computes the waypoints of a mission.
+
+    Results are cached, so compiling the same mission again is cheap.
+
+    Args:
+        request: The mission parameters. The origin elevation must be known.
+        home_altitude: The AMSL altitude of the home (takeoff) position in meters.
+
+    Returns:
+        The compiled mission.
+    """
+    waypoints: Tuple[MissionWaypoint, ...] = ()
+
+    # Point A is going to safe altitude above home
+
+    for i, parameters in enumerate((request.parameters,) + request.passes):
+        # points B to E, the drone is at safe altitude before and after, so
+        # it can hover at point B before the next pass
+        waypoints += _pass_waypoints(
+            request.origin,
+            request.transect,
+            parameters,
+            home_altitude,
+            chr(ord("B") + len(waypoints)),
+            request.loiter_time if i else 0.0,
+        )
+
+    # Flies at a safe altitude and returns to launch
+    waypoints += (
+        MissionWaypoint(
+            chr(ord("B") + len(waypoints)),
+            request.return_point.latitude,
+            request.return_point.longitude,
+            home_altitude + SAFE_ALTITUDE,
+            SPEED,
+        ),
+    )
+
+    return CompiledMission(home_altitude, waypoints)
@@ -1,4 +1,5 @@
-from typing import NamedTuple, Tuple
+import math
+from typing import Any, Dict, NamedTuple, Tuple
 
 from .geo import dist_ang_to_horiz_vert, relative_point
 
@@ -18,6 +19,7 @@ class Origin(NamedTuple):
     latitude: float
     longitude: float
     elevation: float
+    """The elevation AMSL in meters or NaN to look it up in the terrain model."""
 
 
 class Transect(NamedTuple):
@@ -48,6 +50,66 @@ class Coordinate2D(NamedTuple):
     longitude: float
 
 
+class MissionRequest(NamedTuple):
+    """
+    The inputs for computing a mission, as requested by the web client.
+    """
+
+    origin: Origin
+    transect: Transect
+    parameters: Parameters
+    return_point: Coordinate2D
+    passes: Tuple[Parameters, ...] = ()
+    """Additional passes of the transect flown after the first one."""
+    loiter_time: float = 0.0
+    """How long to hover at safe altitude before each additional pass in
+    seconds."""
+
+
+def parse_mission_request(mission_parameters: Dict[str, Any]) -> MissionRequest:
+    """
+    Parses the JSON body of a mission request.
+
+    Instead of ``parameters``, the request can have a list of ``passes`` to
+    fly several passes of the transect in one flight, and a ``loiterTime`` to
+    hover between passes.
+
+    Args:
+        mission_parameters: The decoded JSON object.
+
+    Returns:
+        The mission request.
+
+    Raises:
+        KeyError: if a required value is missing.
+    """
+    # TODO: validate parameters
+    passes = [
+        Parameters(p["speed"], p["distance"], p["angle"])
+        for p in mission_parameters.get("passes") or [mission_parameters["parameters"]]
+    ]
+
+    return MissionRequest(
+        origin=Origin(
+            mission_parameters["origin"]["latitude"],
+            mission_parameters["origin"]["longitude"],
+            # optional when the server has a terrain model
+            mission_parameters["origin"].get("elevation", math.nan),
+        ),
+        transect=Transect(
+            mission_parameters["transect"]["azimuth"],
+            mission_parameters["transect"]["length"],
+        ),
+        parameters=passes[0],
+        return_point=Coordinate2D(
+            mission_parameters["returnPoint"]["latitude"],
+            mission_parameters["returnPoint"]["longitude"],
+        ),
+        passes=tuple(passes[1:]),
+        loiter_time=mission_parameters.get("loiterTime", 0.0),
+    )
+
+
 def transect_points(
     origin: Origin, transect: Transect, parameters: Parameters
 ) -> Tuple[Point, Point]:
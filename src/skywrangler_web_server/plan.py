@@ -0,0 +1,485 @@
+"""
+Flying QGroundControl ``.plan`` files, e.g. the ones generated by ``main.py``.
+
+Plans are converted to the compiled mission representation when they are
+uploaded, so no geometry is computed when the mission is launched. Compiled
+missions can also be exported as plans for cross-checking in QGC.
+"""
+
+import functools
+import hashlib
+import json
+import logging
+import math
+import os
+import pathlib
+import re
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from .fence import Fence, FenceCircle, FencePolygon
+from .ir import SAFE_ALTITUDE, SPEED, CompiledMission, MissionWaypoint
+
+logger = logging.getLogger(__name__)
+
+# MAVLink commands and frames that can be converted
+NAV_WAYPOINT = 16
+NAV_RETURN_TO_LAUNCH = 20
+NAV_TAKEOFF = 22
+DO_CHANGE_SPEED = 178
+FRAME_GLOBAL = 0
+FRAME_MISSION = 2
+FRAME_GLOBAL_RELATIVE_ALT = 3
+
+# other QGC enum values used in exported plans
+ALTITUDE_MODE_MIXED = 0
+ALTITUDE_MODE_LAUNCH = 1
+ALTITUDE_MODE_AMSL = 2
+FIRMWARE_PX4 = 12
+VEHICLE_QUADROTOR = 2
+
+# allowed plan IDs, also used as file names
+PLAN_ID_PATTERN = re.compile(r"[\w+-][\w.+-]*")
+
+
+def _number(value: Any, what: str) -> float:
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise ValueError(f"{what} is not a number")
+
+    if not math.isfinite(value):
+        raise ValueError(f"{what} is not finite")
+
+    return float(value)
+
+
+def _point(value: Any, what: str) -> Tuple[float, float]:
+    if not isinstance(value, list) or len(value) != 2:
+        raise ValueError(f"{what} is not a point")
+
+    latitude = _number(value[0], f"{what} latitude")
+    longitude = _number(value[1], f"{what} longitude")
+
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        raise ValueError(f"{what} is not a valid position")
+
+    return latitude, longitude
+
+
+def _inclusion(fence: Dict[str, Any], what: str) -> bool:
+    inclusion = fence.get("inclusion", True)
+
+    if not isinstance(inclusion, bool):
+        raise ValueError(f"{what}: inclusion is not a boolean")
+
+    return inclusion
+
+
+def _plan_fences(plan: Dict[str, Any]) -> Tuple[Fence, ...]:
+    """
+    Converts and validates the geofence of a QGC plan.
+    """
+    geo_fence = plan.get("geoFence", {})
+
+    if not isinstance(geo_fence, dict):
+        raise ValueError("invalid geofence")
+
+    polygons = geo_fence.get("polygons", [])
+    circles = geo_fence.get("circles", [])
+
+    if not isinstance(polygons, list) or not isinstance(circles, list):
+        raise ValueError("invalid geofence")
+
+    fences: List[Fence] = []
+
+    for n, polygon in enumerate(polygons, 1):
+        what = f"fence polygon {n}"
+
+        if not isinstance(polygon, dict) or not isinstance(
+            polygon.get("polygon"), list
+        ):
+            raise ValueError(f"{what}: has no points")
+
+        points = polygon["polygon"]
+
+        if len(points) < 3:
+            raise ValueError(f"{what}: needs at least 3 points")
+
+        fences.append(
+            FencePolygon(
+                tuple(_point(p, f"{what}: point {i}") for i, p in enumerate(points, 1)),
+                _inclusion(polygon, what),
+            )
+        )
+
+    for n, circle in enumerate(circles, 1):
+        what = f"fence circle {n}"
+
+        if not isinstance(circle, dict) or not isinstance(circle.get("circle"), dict):
+            raise ValueError(f"{what}: has no circle")
+
+        center = _point(circle["circle"].get("center"), f"{what}: center")
+        radius = _number(circle["circle"].get("radius"), f"{what}: radius")
+
+        if radius <= 0:
+            raise ValueError(f"{what}: radius must be positive")
+
+        fences.append(FenceCircle(center, radius, _inclusion(circle, what)))
+
+    return tuple(fences)
+
+
+def plan_mission(plan: Dict[str, Any]) -> CompiledMission:
+    """
+    Converts and validates a QGC plan.
+
+    Only the items that ``main.py`` generates are supported: takeoff,
+    waypoints (with hold time), speed changes and return to launch. The
+    polygon and circle geofences are kept and checked in flight.
+
+    Args:
+        plan: The decoded ``.plan`` file.
+
+    Returns:
+        The compiled mission.
+
+    Raises:
+        ValueError: if the plan is not valid or can't be flown by the server.
+    """
+    if not isinstance(plan, dict) or plan.get("fileType") != "Plan":
+        raise ValueError("not a QGC plan file")
+
+    mission = plan.get("mission")
+
+    if not isinstance(mission, dict) or not isinstance(mission.get("items"), list):
+        raise ValueError("plan has no mission")
+
+    try:
+        home_altitude = _number(mission["plannedHomePosition"][2], "home altitude")
+    except (KeyError, IndexError, TypeError):
+        raise ValueError("plan has no home position")
+
+    items = mission["items"]
+
+    # the default speed, waypoints keep track of the speed changes
+    hover_speed = _number(mission.get("hoverSpeed", SPEED), "hover speed")
+    speed = hover_speed
+    waypoints: List[MissionWaypoint] = []
+    takeoff_altitude: Optional[float] = None
+    returned = False
+
+    for n, item in enumerate(items, 1):
+        if not isinstance(item, dict) or item.get("type") != "SimpleItem":
+            raise ValueError(f"item {n}: only simple items are supported")
+
+        command = item.get("command")
+        params = item.get("params")
+
+        if not isinstance(params, list) or len(params) != 7:
+            raise ValueError(f"item {n}: needs 7 params")
+
+        if returned:
+            raise ValueError(f"item {n}: return to launch must be the last item")
+
+        if command == NAV_TAKEOFF:
+            if n != 1:
+                raise ValueError(f"item {n}: takeoff must be the first item")
+
+            takeoff_altitude = _number(params[6], f"item {n}: altitude")
+        elif command == NAV_WAYPOINT:
+            if takeoff_altitude is None:
+                raise ValueError(f"item {n}: waypoint before takeoff")
+
+            latitude = _number(params[4], f"item {n}: latitude")
+            longitude = _number(params[5], f"item {n}: longitude")
+            altitude = _number(params[6], f"item {n}: altitude")
+            hold = _number(params[0] or 0, f"item {n}: hold time")
+
+            if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+                raise ValueError(f"item {n}: invalid position")
+
+            if hold < 0:
+                raise ValueError(f"item {n}: negative hold time")
+
+            if item.get("frame") == FRAME_GLOBAL_RELATIVE_ALT:
+                altitude += home_altitude
+            elif item.get("frame") != FRAME_GLOBAL:
+                raise ValueError(f"item {n}: unsupported frame")
+
+            waypoints.append(
+                MissionWaypoint(
+                    chr(ord("B") + len(waypoints)),
+                    latitude,
+                    longitude,
+                    altitude,
+                    # until changed by a following DO_CHANGE_SPEED
+                    speed,
+                    hold,
+                )
+            )
+        elif command == DO_CHANGE_SPEED:
+            new_speed = _number(params[1], f"item {n}: speed")
+
+            # -1 is no change
+            if new_speed > 0:
+                speed = new_speed
+
+                if waypoints:
+                    waypoints[-1] = waypoints[-1]._replace(speed=speed)
+        elif command == NAV_RETURN_TO_LAUNCH:
+            # the server always returns to launch after the mission
+            returned = True
+        else:
+            raise ValueError(f"item {n}: unsupported command {command}")
+
+    if not waypoints:
+        raise ValueError("plan has no waypoints")
+
+    # the takeoff and return altitudes are vehicle parameters set by the server
+    if takeoff_altitude != SAFE_ALTITUDE:
+        raise ValueError(f"takeoff altitude must be {SAFE_ALTITUDE} m")
+
+    return CompiledMission(
+        home_altitude,
+        tuple(waypoints),
+        SAFE_ALTITUDE,
+        hover_speed,
+        _plan_fences(plan),
+    )
+
+
+def _simple_item(
+    jump_id: int,
+    command: int,
+    frame: int,
+    altitude: float,
+    params: List[Optional[float]],
+    altitude_mode: int = ALTITUDE_MODE_MIXED,
+) -> Dict[str, Any]:
+    return {
+        "AMSLAltAboveTerrain": None,
+        "Altitude": altitude,
+        "AltitudeMode": altitude_mode,
+        "autoContinue": True,
+        "command": command,
+        "doJumpId": jump_id,
+        "frame": frame,
+        "params": params,
+        "type": "SimpleItem",
+    }
+
+
+def mission_plan(mission: CompiledMission, home: Tuple[float, float]) -> Dict[str, Any]:
+    """
+    Converts a compiled mission to a QGC plan.
+
+    This is the inverse of :func:`plan_mission` and creates the same items
+    as the planner (``sw_mission``), so plans from the server and from
+    ``main.py`` can be compared in QGC.
+
+    Args:
+        mission: The compiled mission.
+        home: The latitude and longitude of the home (takeoff) position.
+
+    Returns:
+        The ``.plan`` file contents.
+    """
+    latitude, longitude = home
+    speed = mission.speed
+    jump_id = 1
+
+    # Point A is taking off to safe altitude above home
+    items = [
+        _simple_item(
+            jump_id,
+            NAV_TAKEOFF,
+            FRAME_GLOBAL_RELATIVE_ALT,
+            mission.safe_altitude,
+            [0, 0, 0, None, latitude, longitude, mission.safe_altitude],
+            ALTITUDE_MODE_LAUNCH,
+        )
+    ]
+
+    for w in mission.waypoints:
+        jump_id += 1
+        items.append(
+            _simple_item(
+                jump_id,
+                NAV_WAYPOINT,
+                FRAME_GLOBAL,
+                mission.home_altitude + mission.safe_altitude,
+                [w.hold, 0, 0, None, w.latitude, w.longitude, w.altitude],
+                ALTITUDE_MODE_AMSL,
+            )
+        )
+
+        if w.speed is not None and w.speed != speed:
+            speed = w.speed
+            jump_id += 1
+            items.append(
+                _simple_item(
+                    jump_id,
+                    DO_CHANGE_SPEED,
+                    FRAME_MISSION,
+                    0,
+                    [1, speed, -1, 0, 0, 0, 0],
+                )
+            )
+
+    jump_id += 1
+    items.append(
+        _simple_item(
+            jump_id,
+            NAV_RETURN_TO_LAUNCH,
+            FRAME_MISSION,
+            mission.safe_altitude,
+            [0, 0, 0, 0, 0, 0, 0],
+            ALTITUDE_MODE_LAUNCH,
+        )
+    )
+
+    # same as the QGC encoder of the planner
+    circles = [
+        {
+            "circle": {"center": list(f.center), "radius": f.radius},
+            "inclusion": f.inclusion,
+            "version": 1,
+        }
+        for f in mission.fences
+        if isinstance(f, FenceCircle)
+    ]
+    polygons = [
+        {
+            "inclusion": f.inclusion,
+            "polygon": [list(p) for p in f.points],
+            "version": 1,
+        }
+        for f in mission.fences
+        if isinstance(f, FencePolygon)
+    ]
+
+    return {
+        "fileType": "Plan",
+        "geoFence": {"circles": circles, "polygons": polygons, "version": 2},
+        "groundStation": "SkyWrangler",
+        "mission": {
+            "cruiseSpeed": mission.speed,
+            "firmwareType": FIRMWARE_PX4,
+            "globalPlanAltitudeMode": ALTITUDE_MODE_MIXED,
+            "hoverSpeed": mission.speed,
+            "items": items,
+            "plannedHomePosition": [latitude, longitude, mission.home_altitude],
+            "vehicleType": VEHICLE_QUADROTOR,
+            "version": 2,
+        },
+        "rallyPoints": {"points": [], "version": 2},
+        "version": 1,
+    }
+
+
+class PlanFile(NamedTuple):
+    """
+    An encoded ``.plan`` file.
+    """
+
+    body: bytes
+    """The JSON encoded plan."""
+    etag: str
+    """The entity tag (content hash) for HTTP caching."""
+
+
+@functools.lru_cache(maxsize=32)
+def plan_file(mission: CompiledMission, home: Tuple[float, float]) -> PlanFile:
+    """
+    Gets a mission as an encoded ``.plan`` file.
+
+    Results are cached, so downloading the same plan again doesn't convert or
+    encode it again.
+
+    Args:
+        mission: The compiled mission.
+        home: The latitude and longitude of the home (takeoff) position.
+
+    Returns:
+        The plan file.
+    """
+    body = json.dumps(mission_plan(mission, home), indent=4).encode()
+
+    return PlanFile(body, f'"{hashlib.sha256(body).hexdigest()[:32]}"')
+
+
+class PlanStore:
+    """
+    Plans uploaded to the server.
+
+    Plans are converted once when they are added and kept in memory. They
+    are also saved to disk so that they survive a restart of the server.
+
+    Args:
+        directory: The directory for the ``.plan`` files or ``None`` to keep
+            the plans in memory only.
+    """
+
+    def __init__(self, directory: Optional[pathlib.Path]) -> None:
+        self._directory = directory
+        self._missions: Dict[str, CompiledMission] = {}
+
+        if directory is None or not directory.exists():
+            return
+
+        for path in sorted(directory.glob("*.plan")):
+            try:
+                with open(path) as f:
+                    self._missions[path.stem] = plan_mission(json.load(f))
+            except Exception:
+                logger.exception("failed to load %s", path)
+
+    def ids(self) -> List[str]:
+        """
+        Gets the IDs of all plans.
+        """
+        return sorted(self._missions)
+
+    def add(self, plan_id: str, plan: Dict[str, Any]) -> CompiledMission:
+        """
+        Adds or replaces a plan.
+
+        Args:
+            plan_id: The ID of the plan, e.g. the file name without ``.plan``.
+            plan: The decoded ``.plan`` file.
+
+        Returns:
+            The compiled mission.
+
+        Raises:
+            ValueError: if the ID or the plan is not valid.
+        """
+        if not PLAN_ID_PATTERN.fullmatch(plan_id):
+            raise ValueError("invalid plan ID")
+
+        mission = plan_mission(plan)
+
+        if self._directory:
+            self._directory.mkdir(parents=True, exist_ok=True)
+            path = self._directory / f"{plan_id}.plan"
+            tmp_path = path.with_suffix(".tmp")
+
+            with open(tmp_path, "w") as f:
+                json.dump(plan, f)
+
+            # atomic so we never leave a partially written file
+            os.replace(tmp_path, path)
+
+        self._missions[plan_id] = mission
+
+        return mission
+
+    def get(self, plan_id: str) -> CompiledMission:
+        """
+        Gets a plan.
+
+        Raises:
+            KeyError: if there is no plan with this ID.
+        """
+        try:
+            return self._missions[plan_id]
+        except KeyError:
+            raise KeyError(f"no plan with ID {plan_id!r}")
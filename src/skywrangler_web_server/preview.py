@@ -0,0 +1,148 @@
+"""
+Mission previews for showing the planned path on the map before flying.
+"""
+
+import functools
+import json
+import math
+from typing import Any, Dict, List, Tuple, Union
+
+from .ir import CompiledMission, compile_mission
+from .mission import MissionRequest
+
+# meters per degree of latitude
+METERS_PER_DEGREE = math.radians(1) * 6371008.8
+
+Home = Tuple[float, float, float]
+"""The (latitude, longitude, AMSL altitude) of the home position."""
+
+
+def normalize_home(latitude: float, longitude: float, altitude: float) -> Home:
+    """
+    Rounds a home position to the precision the vehicle reports so that
+    small differences don't defeat the preview cache.
+    """
+    return round(latitude, 7), round(longitude, 7), round(altitude, 2)
+
+
+def _distance(a: Tuple[float, float], b: Tuple[float, float]) -> float:
+    # legs are short, so a local equirectangular projection is good enough
+    dy = (b[0] - a[0]) * METERS_PER_DEGREE
+    dx = (b[1] - a[1]) * METERS_PER_DEGREE * math.cos(math.radians(a[0]))
+    return math.hypot(dx, dy)
+
+
+def mission_geojson(mission: CompiledMission, home: Home) -> Dict[str, Any]:
+    """
+    Gets the planned path of a mission as GeoJSON.
+
+    Args:
+        mission: The compiled mission.
+        home: The home position the mission is flown from.
+
+    Returns:
+        A feature collection with a ``Point`` feature for each waypoint,
+        starting with point A above home, and a ``LineString`` feature for
+        each leg, ending with the return to launch. Coordinates include the
+        AMSL altitude.
+    """
+    latitude, longitude, altitude = home
+    safe_altitude = altitude + mission.safe_altitude
+    speed = mission.speed
+
+    points: List[Dict[str, Any]] = [
+        {
+            "name": "A",
+            "latitude": latitude,
+            "longitude": longitude,
+            "altitude": safe_altitude,
+            "speed": speed,
+            "hold": 0.0,
+        }
+    ]
+
+    for w in mission.waypoints:
+        if w.speed is not None:
+            speed = w.speed
+
+        points.append(
+            {
+                "name": w.name,
+                "latitude": w.latitude,
+                "longitude": w.longitude,
+                "altitude": w.altitude,
+                "speed": speed,
+                "hold": w.hold,
+            }
+        )
+
+    features: List[Dict[str, Any]] = [
+        {
+            "type": "Feature",
+            "geometry": {
+                "type": "Point",
+                "coordinates": [p["longitude"], p["latitude"], p["altitude"]],
+            },
+            "properties": {
+                "name": p["name"],
+                "altitude": p["altitude"],
+                "relativeAltitude": p["altitude"] - altitude,
+                "speed": p["speed"],
+                "hold": p["hold"],
+            },
+        }
+        for p in points
+    ]
+
+    # returns to launch at safe altitude
+    legs = list(zip(points, points[1:])) + [(points[-1], points[0])]
+
+    for a, b in legs:
+        length = _distance(
+            (a["latitude"], a["longitude"]), (b["latitude"], b["longitude"])
+        )
+        features.append(
+            {
+                "type": "Feature",
+                "geometry": {
+                    "type": "LineString",
+                    "coordinates": [
+                        [a["longitude"], a["latitude"], a["altitude"]],
+                        [b["longitude"], b["latitude"], b["altitude"]],
+                    ],
+                },
+                "properties": {
+                    "name": f"{a['name']}-{b['name']}",
+                    "speed": a["speed"],
+                    "length": length,
+                    "climb": b["altitude"] - a["altitude"],
+                    "angle": math.degrees(
+                        math.atan2(b["altitude"] - a["altitude"], length)
+                    ),
+                },
+            }
+        )
+
+    return {"type": "FeatureCollection", "features": features}
+
+
+@functools.lru_cache(maxsize=256)
+def mission_preview(mission: Union[MissionRequest, CompiledMission], home: Home) -> str:
+    """
+    Computes the preview of a mission.
+
+    Results are cached, so previewing the same mission again only costs a
+    dictionary lookup.
+
+    Args:
+        mission: The mission parameters (with a known origin elevation) or
+            a compiled mission.
+        home: The normalized home position, see :func:`normalize_home`.
+
+    Returns:
+        The GeoJSON text from :func:`mission_geojson`.
+    """
+    if isinstance(mission, MissionRequest):
+        mission = compile_mission(mission, home[2])
+
+    return json.dumps(mission_geojson(mission, home))
@@ -1,8 +1,10 @@
+import asyncio
 import logging
+from typing import TYPE_CHECKING
 
-from dbus_next.aio import MessageBus
-from dbus_next.constants import BusType
-from dbus_next.introspection import Node
+# dbus_next is imported on first use to keep server startup fast
+if TYPE_CHECKING:
+    from dbus_next.introspection import Node
 
 logger = logging.getLogger(__name__)
 
@@ -13,12 +15,16 @@ class RPi:
     """
 
     @property
-    def _avahi_server_xml(self) -> Node:
+    def _avahi_server_xml(self) -> "Node":
+        from dbus_next.introspection import Node
+
         with open("/usr/share/dbus-1/interfaces/org.freedesktop.Avahi.Server.xml") as f:
             return Node.parse(f.read())
 
     @property
-    def _avahi_entry_group_xml(self) -> Node:
+    def _avahi_entry_group_xml(self) -> "Node":
+        from dbus_next.introspection import Node
+
         with open(
             "/usr/share/dbus-1/interfaces/org.freedesktop.Avahi.EntryGroup.xml"
         ) as f:
@@ -30,9 +36,17 @@ class RPi:
         """
         Performs async init (since it can't be done in __init__()).
         """
+        from dbus_next.aio import MessageBus
+        from dbus_next.constants import BusType
+
         # set up D-bus
         self._bus = await MessageBus(bus_type=BusType.SYSTEM).connect()
 
+        # these only depend on the bus, so don't wait for one to finish
+        # before starting the other
+        await asyncio.gather(self._init_login_manager(), self._register_service())
+
+    async def _init_login_manager(self) -> None:
         introspection = await self._bus.introspect(
             "org.freedesktop.login1", "/org/freedesktop/login1"
         )
@@ -41,6 +55,7 @@ class RPi:
         )
         self._login_manager = obj.get_interface("org.freedesktop.login1.Manager")
 
+    async def _register_service(self) -> None:
         # register server with avahi
         obj = self._bus.get_proxy_object(
             "org.freedesktop.Avahi", "/", self._avahi_server_xml
@@ -0,0 +1,283 @@
+"""
+Experiment sequencer that flies all runs of a parameter sweep.
+"""
+
+import asyncio
+import itertools
+import json
+import logging
+import os
+import pathlib
+from typing import Any, Dict, List, NamedTuple, Optional
+
+from .drone import Drone
+
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+ACTIVE = "active"
+DONE = "done"
+ABORTED = "aborted"
+FAILED = "failed"
+
+
+class Run(NamedTuple):
+    """
+    A single run of the sweep.
+    """
+
+    mission: Dict[str, Any]
+    """The mission parameters in the same format as ``/api/drone/fly_mission``."""
+    status: str = PENDING
+    """One of ``pending``, ``active``, ``done``, ``aborted`` or ``failed``."""
+    error: Optional[str] = None
+    """The reason the run failed."""
+    battery: Optional[int] = None
+    """The battery the run is flown with when following a battery schedule."""
+
+
+def sweep_runs(sweep: Dict[str, Any]) -> List[Run]:
+    """
+    Expands a sweep into runs.
+
+    Args:
+        sweep: A sweep in the same format as ``mission-data.json``.
+
+    Returns:
+        One run for each combination of the variables in the same order as
+        the ``.plan`` files generated by ``main.py``.
+
+    Raises:
+        KeyError: if a required value is missing.
+    """
+    variables = sweep["variables"]
+
+    return [
+        Run(
+            {
+                "origin": {
+                    "latitude": sweep["origin"]["latitude"],
+                    "longitude": sweep["origin"]["longitude"],
+                    "elevation": sweep["origin"]["altitude"],
+                },
+                "transect": {
+                    "azimuth": sweep["transect"]["azimuth"],
+                    "length": sweep["transect"]["length"],
+                },
+                "parameters": {"speed": speed, "distance": distance, "angle": angle},
+                "returnPoint": {
+                    "latitude": sweep["away"]["latitude"],
+                    "longitude": sweep["away"]["longitude"],
+                },
+            }
+        )
+        for speed, angle, distance in itertools.product(
+            variables["speed"], variables["angle"], variables["distance"]
+        )
+    ]
+
+
+def schedule_runs(schedule: Dict[str, Any]) -> List[Run]:
+    """
+    Gets the runs of a battery schedule.
+
+    Args:
+        schedule: A schedule from ``python -m sw_mission.schedule``.
+
+    Returns:
+        The runs in the order of the schedule.
+
+    Raises:
+        KeyError: if a required value is missing.
+    """
+    return [
+        Run(run["mission"], battery=battery)
+        for battery, b in enumerate(schedule["batteries"])
+        for run in b["runs"]
+    ]
+
+
+class Sequencer:
+    """
+    Works through a queue of runs, flying each one after the previous one
+    has landed.
+
+    The queue is saved to disk after every change so that it survives a
+    restart of the server. After a restart, the sequencer is always paused.
+
+    When following a battery schedule, the sequencer also pauses after the
+    last run of each battery so that the battery can be swapped.
+
+    Args:
+        drone: The drone.
+        state_path: Path to the file for saving the queue or ``None`` to
+            keep it in memory only.
+    """
+
+    def __init__(self, drone: Drone, state_path: Optional[pathlib.Path]) -> None:
+        self._drone = drone
+        self._state_path = state_path
+        self._runs: List[Run] = []
+        self._task: Optional[asyncio.Task] = None
+        self._pause_requested = False
+        self._load()
+
+    @property
+    def is_running(self) -> bool:
+        return self._task is not None
+
+    def _load(self) -> None:
+        if not self._state_path or not self._state_path.exists():
+            return
+
+        try:
+            with open(self._state_path) as f:
+                state = json.load(f)
+
+            self._runs = [Run(**r) for r in state["runs"]]
+        except Exception:
+            logger.exception("failed to load sequencer state")
+            return
+
+        for i, run in enumerate(self._runs):
+            if run.status == ACTIVE:
+                logger.warning("run %d was interrupted by a restart", i)
+                self._runs[i] = run._replace(status=PENDING)
+
+    def _save(self) -> None:
+        if not self._state_path:
+            return
+
+        tmp_path = self._state_path.with_suffix(".tmp")
+
+        with open(tmp_path, "w") as f:
+            json.dump({"runs": [r._asdict() for r in self._runs]}, f)
+
+        # atomic so we never leave a partially written file
+        os.replace(tmp_path, self._state_path)
+
+    def _set_status(self, index: int, status: str, error: Optional[str] = None):
+        self._runs[index] = self._runs[index]._replace(status=status, error=error)
+        self._save()
+
+    def _next_pending(self) -> Optional[int]:
+        return next((i for i, r in enumerate(self._runs) if r.status == PENDING), None)
+
+    def status(self) -> Dict[str, Any]:
+        """
+        Gets a JSON-serializable snapshot of the sequencer.
+        """
+        return {
+            "isRunning": self.is_running,
+            "runs": [r._asdict() for r in self._runs],
+        }
+
+    def load_sweep(self, sweep: Dict[str, Any]) -> None:
+        """
+        Replaces the queue with the runs of a sweep.
+
+        Args:
+            sweep: A sweep in the same format as ``mission-data.json`` or a
+                battery schedule from ``python -m sw_mission.schedule``.
+
+        Raises:
+            RuntimeError: if the sequencer is running.
+        """
+        if self.is_running:
+            raise RuntimeError("sequencer is running")
+
+        if "batteries" in sweep:
+            self._runs = schedule_runs(sweep)
+        else:
+            self._runs = sweep_runs(sweep)
+
+        self._save()
+
+    def start(self) -> None:
+        """
+        Starts (or resumes) flying the pending runs.
+
+        Runs that were aborted or failed are queued again.
+
+        Raises:
+            RuntimeError: if the sequencer is already running.
+        """
+        if self.is_running:
+            raise RuntimeError("sequencer is already running")
+
+        for i, run in enumerate(self._runs):
+            if run.status in (ABORTED, FAILED):
+                self._runs[i] = run._replace(status=PENDING, error=None)
+
+        self._save()
+
+        self._pause_requested = False
+        self._task = asyncio.create_task(self._run())
+
+    def pause(self) -> None:
+        """
+        Stops the sequencer after the current run has landed.
+        """
+        self._pause_requested = True
+
+    def cancel(self) -> None:
+        """
+        Stops the sequencer immediately, e.g. on shutdown.
+        """
+        if self._task:
+            self._task.cancel()
+
+    async def _precompute_next(self) -> None:
+        """
+        Computes the geometry of the next run while the current one flies.
+
+        The next mission can't be uploaded while this one is flying, but the
+        geometry can be computed. Errors don't affect the flying run, the
+        next run fails when it is prepared instead.
+        """
+        index = self._next_pending()
+
+        if index is None:
+            return
+
+        try:
+            await self._drone.precompute_mission(self._runs[index].mission)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("failed to precompute run %d", index)
+
+    async def _run(self) -> None:
+        try:
+            index = self._next_pending()
+
+            while index is not None and not self._pause_requested:
+                run = self._runs[index]
+                logger.info("starting run %d: %r", index, run.mission)
+                self._set_status(index, ACTIVE)
+
+                try:
+                    await self._drone.prepare_mission(run.mission)
+                    await self._drone.launch_mission()
+                    await self._precompute_next()
+                    completed = await self._drone.wait_mission_complete()
+                except asyncio.CancelledError:
+                    raise
+                except Exception as ex:
+                    logger.exception("run %d failed", index)
+                    self._set_status(index, FAILED, str(ex))
+                    break
+
+                if not completed:
+                    logger.warning("run %d was aborted", index)
+                    self._set_status(index, ABORTED)
+                    break
+
+                self._set_status(index, DONE)
+                index = self._next_pending()
+
+                if index is not None and self._runs[index].battery != run.battery:
+                    logger.info("pausing for battery swap")
+                    break
+        finally:
+            self._task = None
@@ -1,38 +1,130 @@
 import asyncio
-from typing import Optional
+import contextlib
+import functools
+import logging
+import os
+import pathlib
+import socket
+import time
+from typing import TYPE_CHECKING, Iterator, Optional, cast
 import weakref
 
 from aiohttp import web
 from aiohttp.typedefs import PathLike
+from mavsdk import System
 from sdnotify import SystemdNotifier
 
 from .api import routes
-from .drone import Drone
+from .drone import Drone, _log_task_error
+from .plan import PlanStore
 from .rpi import RPi
+from .sequencer import Sequencer
+from .static import StaticFiles
+from .tiles import TileStore
+
+if TYPE_CHECKING:
+    from .sim import SimConfig
+
+logger = logging.getLogger(__name__)
+
+# first file descriptor passed by systemd socket activation
+SD_LISTEN_FDS_START = 3
+
+
+@contextlib.contextmanager
+def _profile(app: web.Application, name: str) -> Iterator[None]:
+    """
+    Logs the time spent in the ``with`` block when startup profiling is enabled.
+    """
+    start = time.perf_counter()
+
+    try:
+        yield
+    finally:
+        if app["profile_startup"]:
+            logger.info(
+                "startup profile: %-32s %8.1f ms",
+                f"{name} init",
+                (time.perf_counter() - start) * 1000,
+            )
 
 
 async def on_startup(app: web.Application) -> None:
     # track "forever" tasks so we can cancel on shutdown
     app["tasks"] = weakref.WeakSet()
 
-    app["drone"] = Drone()
+    terrain = None
+
+    if app["dem_path"]:
+        with _profile(app, "terrain"):
+            # numpy is only imported when needed
+            from .terrain import TerrainModel
+
+            terrain = TerrainModel(app["dem_path"])
+
+    with _profile(app, "drone"):
+        system = None
 
+        if app["sim"]:
+            from .sim import SimulatedSystem
+
+            system = SimulatedSystem(app["sim"])
+            app["sim_system"] = system
+
+        app["drone"] = Drone(terrain, cast(System, system))
+
+    state_dir: Optional[pathlib.Path] = app["state_dir"]
+
+    with _profile(app, "plans"):
+        app["plans"] = PlanStore(state_dir / "plans" if state_dir else None)
+
+    with _profile(app, "sequencer"):
+        app["sequencer"] = Sequencer(
+            app["drone"], state_dir / "sequencer.json" if state_dir else None
+        )
+
+    # D-Bus may be slow to respond during boot, so this runs in the background
+    # while the server starts listening. Progress is reported by the
+    # /api/health/ready endpoint.
     rpi = RPi()
-    await rpi.async_init()
     app["rpi"] = rpi
+    app["rpi_init"] = asyncio.create_task(_rpi_init(app, rpi), name="rpi_init")
+    app["rpi_init"].add_done_callback(_log_task_error)
+
+
+async def _rpi_init(app: web.Application, rpi: RPi) -> None:
+    with _profile(app, "rpi"):
+        await rpi.async_init()
+
+
+def _on_listening(app: web.Application, message: str) -> None:
+    """
+    Called by ``web.run_app()`` once the server is listening.
+    """
+    logger.info(message)
+
+    if app["profile_startup"]:
+        logger.info(
+            "startup profile: %-32s %8.1f ms",
+            "listening",
+            (time.perf_counter() - app["start_time"]) * 1000,
+        )
 
-    # FIXME: how to wait for socket to become ready?
-    # Without this delay, nginx will fail to start up because it can't see the
-    # server. It would be better if we could find the actual condition to test
-    # for instead of using an arbitrary delay.
-    asyncio.get_running_loop().call_later(
-        10, lambda: SystemdNotifier().notify("READY=1")
-    )
+    # nginx is started after this service, so we have to wait until we are
+    # listening, otherwise nginx fails to start because it can't see the server
+    SystemdNotifier().notify("READY=1")
 
 
 async def on_shutdown(app: web.Application) -> None:
     tasks: weakref.WeakSet[asyncio.Future] = app["tasks"]
     drone: Drone = app["drone"]
+    sequencer: Sequencer = app["sequencer"]
+
+    sequencer.cancel()
+    app["rpi_init"].cancel()
+
+    if "sim_system" in app:
+        app["sim_system"].close()
 
     for t in tasks:
         t.cancel()
@@ -47,24 +139,115 @@ async def root_handler(request):
     return web.HTTPFound("/index.html")
 
 
-def serve(port: Optional[int] = None, static_path: Optional[PathLike] = None) -> None:
+def systemd_socket() -> Optional[socket.socket]:
+    """
+    Gets the listening socket passed to us by systemd socket activation.
+
+    Returns:
+        The socket or ``None`` if the process was not socket activated.
+    """
+    if os.environ.get("LISTEN_PID") != str(os.getpid()):
+        return None
+
+    if int(os.environ.get("LISTEN_FDS", "0")) < 1:
+        return None
+
+    # don't pass these on to child processes
+    for name in ("LISTEN_PID", "LISTEN_FDS", "LISTEN_FDNAMES"):
+        os.environ.pop(name, None)
+
+    # family and type are detected from the file descriptor
+    return socket.socket(fileno=SD_LISTEN_FDS_START)
+
+
+def unix_socket(path: PathLike) -> socket.socket:
+    """
+    Creates a listening Unix domain socket.
+
+    Args:
+        path: The path of the socket file. A stale socket file from a previous
+            run is replaced.
+
+    Returns:
+        The socket.
+    """
+    with contextlib.suppress(FileNotFoundError):
+        os.unlink(path)
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.bind(os.fspath(path))
+    # allow the reverse proxy (nginx) to connect
+    os.chmod(path, 0o666)
+
+    return sock
+
+
+def serve(
+    port: Optional[int] = None,
+    static_path: Optional[PathLike] = None,
+    state_dir: Optional[pathlib.Path] = None,
+    unix_socket_path: Optional[PathLike] = None,
+    profile_startup: bool = False,
+    tiles_path: Optional[PathLike] = None,
+    dem_path: Optional[PathLike] = None,
+    sim: Optional["SimConfig"] = None,
+) -> None:
     """
     Runs the web server.
 
+    The server listens on the socket passed by systemd socket activation if
+    there is one, otherwise on ``unix_socket_path`` if given, otherwise on
+    TCP ``port``.
+
     Args:
+        port: optional TCP port.
         static_path: optional path to directory containing static files to
             be served.
+        state_dir: optional path to a directory for saving state that needs
+            to survive a restart.
+        unix_socket_path: optional path for a Unix domain socket.
+        profile_startup: if ``True``, log the time taken to initialize each
+            subsystem.
+        tiles_path: optional path to an MBTiles file with offline map tiles
+            to be served at ``/tiles/{z}/{x}/{y}``.
+        dem_path: optional path to a directory of SRTM ``.hgt`` files for
+            looking up elevations and checking terrain clearance.
+        sim: optional settings for flying a simulated vehicle instead of
+            connecting to ``mavsdk_server``.
     """
     app = web.Application()
+    app["state_dir"] = state_dir
+    app["profile_startup"] = profile_startup
+    app["dem_path"] = dem_path
+    app["sim"] = sim
+    app["start_time"] = time.perf_counter()
 
     app.router.add_routes(routes)
     app.on_startup.append(on_startup)
     app.on_shutdown.append(on_shutdown)
 
+    if tiles_path:
+        tile_store = TileStore(tiles_path)
+        app.on_cleanup.append(tile_store.on_cleanup)
+        app.router.add_get(r"/tiles/{z:\d+}/{x:\d+}/{y:\d+}", tile_store.handle)
+
     # If a path is given, serve static content, e.g the web client.
     # NB: since this uses the root path, it needs to go after all other routes.
     if static_path:
+        static_files = StaticFiles(pathlib.Path(static_path))
+        app.on_startup.append(static_files.on_startup)
+        app.on_cleanup.append(static_files.on_cleanup)
         app.router.add_route("*", "/", root_handler)
-        app.router.add_static("/", static_path)
+        app.router.add_get("/{path:.*}", static_files.handle)
+
+    sock = systemd_socket()
+
+    if sock is None and unix_socket_path:
+        sock = unix_socket(unix_socket_path)
+
+    on_listening = functools.partial(_on_listening, app)
 
-    web.run_app(app, port=port)
+    if sock is None:
+        web.run_app(app, port=port, print=on_listening)
+    else:
+        web.run_app(app, sock=sock, print=on_listening)
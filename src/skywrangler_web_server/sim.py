@@ -0,0 +1,705 @@
+"""
+Simulated vehicle for running the server without an autopilot.
+
+:class:`SimulatedSystem` stands in for the MAVSDK ``System``, so every
+:class:`.drone.Drone` code path (vehicle parameters, mission upload, mission
+progress and telemetry fan-out) can be exercised on a laptop or in CI without
+``mavsdk_server``. Telemetry is either synthesized from a simple kinematic
+model at a configurable rate or replayed from a recording made with::
+
+    python -m skywrangler_web_server.sim record telemetry.jsonl
+
+Synthesized telemetry only depends on the number of simulation steps, not on
+wall clock time, so the same mission always produces the same samples.
+"""
+
+import argparse
+import asyncio
+import enum
+import json
+import logging
+import math
+import pathlib
+import time
+from typing import (
+    Any,
+    AsyncGenerator,
+    Callable,
+    Dict,
+    Generic,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+    TypeVar,
+)
+
+from mavsdk.core import ConnectionState
+from mavsdk.mission import MissionItem, MissionPlan, MissionProgress
+from mavsdk.param import AllParams, FloatParam
+from mavsdk.telemetry import (
+    Battery,
+    FixType,
+    GpsInfo,
+    Health,
+    LandedState,
+    Position,
+    StatusText,
+    StatusTextType,
+)
+
+logger = logging.getLogger(__name__)
+
+# meters per degree of latitude
+METERS_PER_DEGREE = math.radians(1) * 6371008.8
+# flight time on a full battery
+BATTERY_ENDURANCE = 20 * 60  # seconds
+
+# PX4 defaults of the parameters used by the simulation. The server changes
+# some of them before the first mission, just like on a real vehicle.
+DEFAULT_PARAMS: Dict[str, float] = {
+    "MIS_TAKEOFF_ALT": 2.5,
+    "RTL_RETURN_ALT": 60.0,
+    "MPC_XY_CRUISE": 5.0,
+    "MPC_Z_VEL_MAX_DN": 1.5,
+    "MPC_Z_VEL_MAX_UP": 3.0,
+    "MPC_Z_V_AUTO_DN": 1.5,
+    "MPC_Z_V_AUTO_UP": 3.0,
+}
+
+# decoders for the recorded telemetry, see _encode()
+TELEMETRY_TOPICS: Dict[str, Callable[[Any], Any]] = {
+    "position": lambda v: Position(**v),
+    "home": lambda v: Position(**v),
+    "in_air": bool,
+    "landed_state": lambda v: LandedState[v],
+    "armed": bool,
+    "gps_info": lambda v: GpsInfo(v["num_satellites"], FixType[v["fix_type"]]),
+    "battery": lambda v: Battery(**v),
+    "health": lambda v: Health(**v),
+    "status_text": lambda v: StatusText(StatusTextType[v["type"]], v["text"]),
+    "health_all_ok": bool,
+}
+
+T = TypeVar("T")
+
+
+class SimConfig(NamedTuple):
+    """
+    Simulation settings.
+    """
+
+    home: Tuple[float, float, float] = (35.9301904, -97.2645029, 307.0)
+    """The latitude, longitude and AMSL altitude of the takeoff position."""
+    rate: float = 10.0
+    """The position telemetry rate in Hz. Other telemetry is sent at 1 Hz."""
+    speedup: float = 1.0
+    """How many simulated seconds pass per second of wall clock time."""
+    replay: Optional[pathlib.Path] = None
+    """A telemetry recording to replay (in a loop) instead of synthesizing
+    telemetry. Missions and actions are still accepted, but they don't change
+    the replayed telemetry."""
+    clock: bool = False
+    """If ``True``, a debug status text with the wall clock time (``"clock
+    <seconds>"``) is sent with each position, so that load tests can measure
+    the delivery latency of events. This makes the telemetry depend on time."""
+    rpc_latency: float = 0.0
+    """The time each action, mission and parameter call takes in seconds, like
+    the gRPC round trip to ``mavsdk_server`` and the MAVLink round trip to the
+    vehicle."""
+
+
+class _Topic(Generic[T]):
+    """
+    A telemetry stream with any number of subscribers.
+    """
+
+    def __init__(self, value: Optional[T] = None) -> None:
+        self._value = value
+        self._queues: List["asyncio.Queue[T]"] = []
+
+    def publish(self, value: T) -> None:
+        self._value = value
+
+        for queue in self._queues:
+            queue.put_nowait(value)
+
+    @property
+    def subscribers(self) -> int:
+        return len(self._queues)
+
+    async def subscribe(self) -> AsyncGenerator[T, None]:
+        queue: "asyncio.Queue[T]" = asyncio.Queue()
+        self._queues.append(queue)
+
+        try:
+            # like MAVSDK, new subscribers get the current value
+            if self._value is not None:
+                yield self._value
+
+            while True:
+                yield await queue.get()
+        finally:
+            self._queues.remove(queue)
+
+
+class _Leg(NamedTuple):
+    x: float
+    y: float
+    z: float
+    """The target position in meters east, north and up from home."""
+    speed: float
+    """The horizontal speed in meters per second."""
+    hold: float = 0.0
+    """How long to hover at the target in seconds."""
+    item: Optional[int] = None
+    """The index of the mission item that is reached at the target."""
+
+
+class _Core:
+    def __init__(self) -> None:
+        self._connection_state = _Topic(ConnectionState(True))
+
+    def connection_state(self) -> AsyncGenerator[ConnectionState, None]:
+        return self._connection_state.subscribe()
+
+
+class _Telemetry:
+    def __init__(self) -> None:
+        self.topics: Dict[str, _Topic] = {name: _Topic() for name in TELEMETRY_TOPICS}
+        # rates requested with set_rate_*(), the simulation always sends
+        # telemetry at the configured rates
+        self.rates: Dict[str, float] = {}
+
+    def position(self) -> AsyncGenerator[Position, None]:
+        return self.topics["position"].subscribe()
+
+    def home(self) -> AsyncGenerator[Position, None]:
+        return self.topics["home"].subscribe()
+
+    def in_air(self) -> AsyncGenerator[bool, None]:
+        return self.topics["in_air"].subscribe()
+
+    def landed_state(self) -> AsyncGenerator[LandedState, None]:
+        return self.topics["landed_state"].subscribe()
+
+    def armed(self) -> AsyncGenerator[bool, None]:
+        return self.topics["armed"].subscribe()
+
+    def gps_info(self) -> AsyncGenerator[GpsInfo, None]:
+        return self.topics["gps_info"].subscribe()
+
+    def battery(self) -> AsyncGenerator[Battery, None]:
+        return self.topics["battery"].subscribe()
+
+    def health(self) -> AsyncGenerator[Health, None]:
+        return self.topics["health"].subscribe()
+
+    def status_text(self) -> AsyncGenerator[StatusText, None]:
+        return self.topics["status_text"].subscribe()
+
+    def health_all_ok(self) -> AsyncGenerator[bool, None]:
+        return self.topics["health_all_ok"].subscribe()
+
+    async def set_rate_position(self, rate_hz: float) -> None:
+        self.rates["position"] = rate_hz
+
+    async def set_rate_home(self, rate_hz: float) -> None:
+        self.rates["home"] = rate_hz
+
+    async def set_rate_in_air(self, rate_hz: float) -> None:
+        self.rates["in_air"] = rate_hz
+
+    async def set_rate_landed_state(self, rate_hz: float) -> None:
+        self.rates["landed_state"] = rate_hz
+
+    async def set_rate_gps_info(self, rate_hz: float) -> None:
+        self.rates["gps_info"] = rate_hz
+
+    async def set_rate_battery(self, rate_hz: float) -> None:
+        self.rates["battery"] = rate_hz
+
+
+class _Param:
+    def __init__(self, vehicle: "SimulatedSystem") -> None:
+        self._vehicle = vehicle
+        self.values = dict(DEFAULT_PARAMS)
+
+    async def get_all_params(self) -> AllParams:
+        await self._vehicle.rpc()
+        return AllParams(
+            [], [FloatParam(name, value) for name, value in self.values.items()], []
+        )
+
+    async def set_param_float(self, name: str, value: float) -> None:
+        await self._vehicle.rpc()
+        self.values[name] = value
+
+    async def get_param_float(self, name: str) -> float:
+        await self._vehicle.rpc()
+        return self.values[name]
+
+
+class _Mission:
+    def __init__(self, vehicle: "SimulatedSystem") -> None:
+        self._vehicle = vehicle
+        self.items: List[MissionItem] = []
+        self.current = 0
+        self.return_to_launch_after_mission = False
+        self._progress: _Topic[MissionProgress] = _Topic()
+
+    def mission_progress(self) -> AsyncGenerator[MissionProgress, None]:
+        return self._progress.subscribe()
+
+    def publish_progress(self) -> None:
+        self._progress.publish(MissionProgress(self.current, len(self.items)))
+
+    async def upload_mission(self, mission_plan: MissionPlan) -> None:
+        await self._vehicle.rpc()
+        self.items = list(mission_plan.mission_items)
+        self.current = 0
+        self.publish_progress()
+
+    async def download_mission(self) -> MissionPlan:
+        await self._vehicle.rpc()
+        return MissionPlan(list(self.items))
+
+    async def set_current_mission_item(self, index: int) -> None:
+        await self._vehicle.rpc()
+        self.current = index
+        self.publish_progress()
+
+    async def set_return_to_launch_after_mission(self, enable: bool) -> None:
+        await self._vehicle.rpc()
+        self.return_to_launch_after_mission = enable
+
+    async def start_mission(self) -> None:
+        await self._vehicle.rpc()
+        self._vehicle.start_mission()
+
+    async def is_mission_finished(self) -> bool:
+        await self._vehicle.rpc()
+        return bool(self.items) and self.current >= len(self.items)
+
+
+class _Action:
+    def __init__(self, vehicle: "SimulatedSystem") -> None:
+        self._vehicle = vehicle
+
+    async def arm(self) -> None:
+        await self._vehicle.rpc()
+        self._vehicle.arm()
+
+    async def return_to_launch(self) -> None:
+        await self._vehicle.rpc()
+        self._vehicle.return_to_launch()
+
+
+class SimulatedSystem:
+    """
+    Simulated vehicle with the subset of the MAVSDK ``System`` API used by
+    :class:`.drone.Drone`.
+
+    The vehicle flies straight lines between the mission items at the item
+    speeds, limited by the vertical speed parameters, and hovers at items with
+    a loiter time, like PX4 does.
+
+    Args:
+        config: The simulation settings.
+    """
+
+    def __init__(self, config: SimConfig = SimConfig()) -> None:
+        self.config = config
+        self.core = _Core()
+        self.telemetry = _Telemetry()
+        self.param = _Param(self)
+        self.mission = _Mission(self)
+        self.action = _Action(self)
+        self._task: Optional[asyncio.Task] = None
+
+        self.steps = 0
+        """The number of simulation steps so far."""
+        self.rpc_calls = 0
+        """The number of action, mission and parameter calls so far."""
+        self.mission_started_ns: Optional[int] = None
+        """The ``time.perf_counter_ns()`` when the last mission was started."""
+        self._armed = False
+        self._landed_state = LandedState.ON_GROUND
+        self._x = self._y = self._z = 0.0
+        self._route: List[_Leg] = []
+        self._hold = 0.0
+        self._returning = False
+        self._air_time = 0.0
+
+    async def connect(self) -> None:
+        """
+        Starts the simulation.
+        """
+        if self._task is None:
+            run = self._replay if self.config.replay else self._simulate
+            self._task = asyncio.create_task(run())
+
+    def close(self) -> None:
+        """
+        Stops the simulation.
+        """
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    async def rpc(self) -> None:
+        """
+        Called at the start of each action, mission and parameter call.
+        """
+        self.rpc_calls += 1
+
+        if self.config.rpc_latency:
+            await asyncio.sleep(self.config.rpc_latency)
+
+    def reset(self) -> None:
+        """
+        Puts the vehicle back on the ground at home, e.g. between benchmark
+        runs. The mission and the parameters are kept.
+        """
+        self._route = []
+        self._hold = 0.0
+        self._returning = False
+        self._x = self._y = self._z = 0.0
+        self._armed = False
+        self._set_landed_state(LandedState.ON_GROUND)
+
+    # vehicle actions
+
+    def arm(self) -> None:
+        if self._landed_state != LandedState.ON_GROUND:
+            raise RuntimeError("already flying")
+
+        self._armed = True
+        self.telemetry.topics["armed"].publish(True)
+        self._status("Armed by external command")
+
+    def start_mission(self) -> None:
+        if not self._armed:
+            raise RuntimeError("not armed")
+
+        if not self.mission.items:
+            raise RuntimeError("no mission")
+
+        vz_up = self.param.values["MPC_Z_V_AUTO_UP"]
+        speed = self.param.values["MPC_XY_CRUISE"]
+        ky, kx = self._scale()
+        lat0, lon0, _ = self.config.home
+        self._route = [_Leg(0.0, 0.0, self.param.values["MIS_TAKEOFF_ALT"], vz_up)]
+
+        for i, item in enumerate(self.mission.items):
+            if i < self.mission.current:
+                continue
+
+            self._route.append(
+                _Leg(
+                    (item.longitude_deg - lon0) * kx,
+                    (item.latitude_deg - lat0) * ky,
+                    item.relative_altitude_m,
+                    speed,
+                    0.0 if math.isnan(item.loiter_time_s) else item.loiter_time_s,
+                    i,
+                )
+            )
+
+            # the item speed applies after reaching the item
+            if not math.isnan(item.speed_m_s):
+                speed = item.speed_m_s
+
+        self._returning = False
+        self.mission_started_ns = time.perf_counter_ns()
+        self._set_landed_state(LandedState.TAKING_OFF)
+        self._status("Takeoff detected")
+
+    def return_to_launch(self) -> None:
+        if self._landed_state == LandedState.ON_GROUND:
+            return
+
+        speed = self.param.values["MPC_XY_CRUISE"]
+        altitude = max(self._z, self.param.values["RTL_RETURN_ALT"])
+        self._route = [
+            _Leg(self._x, self._y, altitude, speed),
+            _Leg(0.0, 0.0, altitude, speed),
+            _Leg(0.0, 0.0, 0.0, speed),
+        ]
+        self._hold = 0.0
+        self._returning = True
+        self._status(f"RTL: start return at {altitude:.0f} m")
+
+    # simulation
+
+    def _scale(self) -> Tuple[float, float]:
+        lat0 = self.config.home[0]
+        return METERS_PER_DEGREE, METERS_PER_DEGREE * math.cos(math.radians(lat0))
+
+    def _status(self, text: str) -> None:
+        self.telemetry.topics["status_text"].publish(
+            StatusText(StatusTextType.INFO, text)
+        )
+
+    def _set_landed_state(self, state: LandedState) -> None:
+        if state == self._landed_state:
+            return
+
+        self._landed_state = state
+        self.telemetry.topics["landed_state"].publish(state)
+        self.telemetry.topics["in_air"].publish(state != LandedState.ON_GROUND)
+
+    def step(self, dt: float) -> None:
+        """
+        Advances the simulation by one step and publishes the telemetry.
+
+        Args:
+            dt: The simulated time step in seconds.
+        """
+        self._fly(dt)
+        self.steps += 1
+
+        lat0, lon0, alt0 = self.config.home
+        ky, kx = self._scale()
+        topics = self.telemetry.topics
+
+        topics["position"].publish(
+            Position(
+                lat0 + self._y / ky,
+                lon0 + self._x / kx,
+                alt0 + self._z,
+                self._z,
+            )
+        )
+
+        if self.config.clock:
+            topics["status_text"].publish(
+                StatusText(StatusTextType.DEBUG, f"clock {time.time():.6f}")
+            )
+
+        # everything else is sent at 1 Hz
+        if (self.steps - 1) % max(1, round(self.config.rate)) == 0:
+            remaining = max(0.0, 1 - self._air_time / BATTERY_ENDURANCE)
+
+            topics["home"].publish(Position(lat0, lon0, alt0, 0.0))
+            topics["in_air"].publish(self._landed_state != LandedState.ON_GROUND)
+            topics["landed_state"].publish(self._landed_state)
+            topics["armed"].publish(self._armed)
+            topics["gps_info"].publish(GpsInfo(16, FixType.FIX_3D))
+            topics["battery"].publish(Battery(0, 14.0 + 2.8 * remaining, remaining))
+            topics["health"].publish(Health(True, True, True, True, True, True, True))
+            topics["health_all_ok"].publish(True)
+
+    def _fly(self, dt: float) -> None:
+        if self._landed_state == LandedState.ON_GROUND:
+            return
+
+        self._air_time += dt
+
+        if self._hold > 0:
+            self._hold -= dt
+            return
+
+        if not self._route:
+            if self.mission.return_to_launch_after_mission or self._returning:
+                self.return_to_launch()
+
+            return
+
+        leg = self._route[0]
+        dx, dy, dz = leg.x - self._x, leg.y - self._y, leg.z - self._z
+        horizontal = math.hypot(dx, dy)
+        vz = self.param.values["MPC_Z_V_AUTO_UP" if dz > 0 else "MPC_Z_V_AUTO_DN"]
+
+        # fly a straight line, limited by both the horizontal and vertical speed
+        fraction = min(
+            1.0,
+            leg.speed * dt / horizontal if horizontal else 1.0,
+            vz * dt / abs(dz) if dz else 1.0,
+        )
+
+        self._x += fraction * dx
+        self._y += fraction * dy
+        self._z += fraction * dz
+
+        if self._returning and self._route[-1] == leg and dz < 0:
+            self._set_landed_state(LandedState.LANDING)
+
+        if fraction < 1:
+            return
+
+        self._route.pop(0)
+        self._hold = leg.hold
+
+        if self._landed_state == LandedState.TAKING_OFF:
+            self._set_landed_state(LandedState.IN_AIR)
+
+        if leg.item is not None:
+            self.mission.current = leg.item + 1
+            self.mission.publish_progress()
+
+            if self.mission.current == len(self.mission.items):
+                self._status("Mission finished")
+
+        if self._returning and not self._route:
+            self._returning = False
+            self._armed = False
+            self.telemetry.topics["armed"].publish(False)
+            self._set_landed_state(LandedState.ON_GROUND)
+            self._status("Landing detected")
+
+    async def _simulate(self) -> None:
+        loop = asyncio.get_running_loop()
+        dt = 1 / self.config.rate
+        start = loop.time()
+        n = 0
+
+        while True:
+            self.step(dt)
+            n += 1
+
+            # scheduled from the start so that the rate doesn't drift
+            await asyncio.sleep(
+                max(0.0, start + n * dt / self.config.speedup - loop.time())
+            )
+
+    async def _replay(self) -> None:
+        assert self.config.replay is not None
+
+        records = load_recording(self.config.replay)
+
+        if not records:
+            raise RuntimeError(f"{self.config.replay} has no telemetry")
+
+        loop = asyncio.get_running_loop()
+        duration = records[-1][0]
+
+        while True:
+            start = loop.time()
+
+            for t, topic, value in records:
+                delay = start + t / self.config.speedup - loop.time()
+
+                if delay > 0:
+                    await asyncio.sleep(delay)
+
+                self.telemetry.topics[topic].publish(value)
+
+            # don't replay all samples at once if the recording is very short
+            await asyncio.sleep(max(0.0, start + duration - loop.time()))
+
+
+def _encode(value: Any) -> Any:
+    if isinstance(value, enum.Enum):
+        return value.name
+
+    if isinstance(value, (bool, int, float, str)):
+        return value
+
+    return {k: _encode(v) for k, v in vars(value).items()}
+
+
+def load_recording(path: pathlib.Path) -> List[Tuple[float, str, Any]]:
+    """
+    Loads a telemetry recording.
+
+    Args:
+        path: A file from :func:`record_telemetry` with one JSON record per
+            line with the ``time`` in seconds, the ``topic`` and the ``value``.
+
+    Returns:
+        The time, topic and decoded value of each sample, sorted by time.
+        Unknown topics are skipped.
+    """
+    records = []
+
+    with open(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+
+            record = json.loads(line)
+            decode = TELEMETRY_TOPICS.get(record["topic"])
+
+            if decode is None:
+                continue
+
+            records.append((record["time"], record["topic"], decode(record["value"])))
+
+    records.sort(key=lambda r: r[0])
+
+    return records
+
+
+async def record_telemetry(system: Any, path: pathlib.Path, duration: float) -> int:
+    """
+    Records telemetry from a vehicle for replaying with :class:`SimConfig`.
+
+    Args:
+        system: A connected MAVSDK ``System`` (or :class:`SimulatedSystem`).
+        path: The output file.
+        duration: How long to record in seconds.
+
+    Returns:
+        The number of recorded samples.
+    """
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    count = 0
+
+    with open(path, "w") as f:
+
+        async def record(topic: str) -> None:
+            nonlocal count
+
+            async for value in getattr(system.telemetry, topic)():
+                record = {
+                    "time": round(loop.time() - start, 6),
+                    "topic": topic,
+                    "value": _encode(value),
+                }
+                f.write(json.dumps(record) + "\n")
+                count += 1
+
+        tasks = [asyncio.create_task(record(topic)) for topic in TELEMETRY_TOPICS]
+
+        try:
+            await asyncio.sleep(duration)
+        finally:
+            for t in tasks:
+                t.cancel()
+
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    return count
+
+
+async def _record(path: pathlib.Path, duration: float) -> None:
+    # imported here since the simulation itself doesn't need mavsdk_server
+    from mavsdk import System
+
+    system = System(mavsdk_server_address="localhost")
+    await system.connect()
+
+    count = await record_telemetry(system, path, duration)
+    logger.info("recorded %d samples to %s", count, path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Records vehicle telemetry.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    record_parser = subparsers.add_parser(
+        "record", help="record telemetry from mavsdk_server for --sim-replay"
+    )
+    record_parser.add_argument("output", type=pathlib.Path)
+    record_parser.add_argument(
+        "--duration",
+        type=float,
+        default=60.0,
+        metavar="<seconds>",
+        help="recording time (default: %(default)s)",
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_record(args.output, args.duration))
@@ -0,0 +1,290 @@
+"""
+Static file serving for the web client.
+
+All files are read into memory and compressed once, so page loads don't hit
+the SD card and clients on the hotspot get the smallest encoding they accept.
+"""
+
+import asyncio
+import gzip
+import hashlib
+import logging
+import math
+import mimetypes
+import os
+import pathlib
+import re
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from aiohttp import web
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# File names containing a content hash, e.g. "index.4f3c2a1b.js" (webpack) or
+# "index-D3adBeef.js" (Vite). These never change, so clients can cache forever.
+HASHED_NAME = re.compile(r"[.-]([0-9a-f]{8,}|(?=[\w-]*\d)[\w-]{8})\.\w+$")
+
+# Don't bother compressing small files.
+MIN_COMPRESS_SIZE = 1024
+
+COMPRESSIBLE_TYPES = {
+    "application/javascript",
+    "application/json",
+    "application/manifest+json",
+    "application/wasm",
+    "application/xml",
+    "image/svg+xml",
+    "text/javascript",
+}
+
+CACHE_IMMUTABLE = "public, max-age=31536000, immutable"
+CACHE_REVALIDATE = "no-cache"
+
+# how long requests wait for the first index before failing with 503
+READY_TIMEOUT = 5.0  # seconds
+
+
+class Asset(NamedTuple):
+    """
+    A file in the static file index.
+    """
+
+    content_type: str
+    """The MIME type."""
+    etag: str
+    """Strong ETag of the uncompressed content."""
+    cache_control: str
+    """The Cache-Control header value."""
+    bodies: Dict[str, bytes]
+    """The content for each available encoding ("identity", "gzip", "br")."""
+
+
+def _is_compressible(content_type: str) -> bool:
+    return content_type.startswith("text/") or content_type in COMPRESSIBLE_TYPES
+
+
+def build_asset(path: pathlib.Path, name: str) -> Asset:
+    """
+    Reads and compresses a single file.
+
+    Args:
+        path: The path to the file.
+        name: The path relative to the static root (used for the hash check).
+
+    Returns:
+        The asset.
+    """
+    data = path.read_bytes()
+    content_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+    bodies = {"identity": data}
+
+    if len(data) >= MIN_COMPRESS_SIZE and _is_compressible(content_type):
+        compressed = gzip.compress(data, compresslevel=9, mtime=0)
+
+        if len(compressed) < len(data):
+            bodies["gzip"] = compressed
+
+        if brotli is not None:
+            compressed = brotli.compress(data, quality=11)
+
+            if len(compressed) < len(data):
+                bodies["br"] = compressed
+
+    return Asset(
+        content_type,
+        '"' + hashlib.sha256(data).hexdigest()[:32] + '"',
+        CACHE_IMMUTABLE if HASHED_NAME.search(name) else CACHE_REVALIDATE,
+        bodies,
+    )
+
+
+def build_index(root: pathlib.Path) -> Dict[str, Asset]:
+    """
+    Builds the index of all files in a directory.
+
+    Args:
+        root: The directory.
+
+    Returns:
+        Dictionary of relative POSIX paths to assets.
+    """
+    return {
+        path.relative_to(root).as_posix(): build_asset(
+            path, path.relative_to(root).as_posix()
+        )
+        for path in root.rglob("*")
+        if path.is_file()
+    }
+
+
+def directory_signature(root: pathlib.Path) -> List[Tuple[str, int, int]]:
+    """
+    Gets a cheap signature of a directory that changes when any file changes.
+    """
+    signature = []
+
+    for dirpath, _dirnames, filenames in os.walk(root):
+        for filename in filenames:
+            st = os.stat(os.path.join(dirpath, filename))
+            signature.append(
+                (os.path.join(dirpath, filename), st.st_mtime_ns, st.st_size)
+            )
+
+    return sorted(signature)
+
+
+def select_encoding(accept_encoding: str, available: Dict[str, bytes]) -> str:
+    """
+    Selects the best available encoding for an Accept-Encoding header.
+
+    Args:
+        accept_encoding: The Accept-Encoding request header value.
+        available: The available encodings.
+
+    Returns:
+        The encoding ("br", "gzip" or "identity").
+    """
+    accepted = set()
+
+    for token in accept_encoding.split(","):
+        coding, _, params = token.strip().partition(";")
+        q = params.strip()
+
+        if q.startswith("q="):
+            try:
+                if float(q[2:]) == 0:
+                    continue
+            except ValueError:
+                continue
+
+        accepted.add(coding.strip().lower())
+
+    # prefer the smallest encoding
+    for encoding in ("br", "gzip"):
+        if encoding in available and (encoding in accepted or "*" in accepted):
+            return encoding
+
+    return "identity"
+
+
+class StaticFiles:
+    """
+    Serves a directory from an in-memory index.
+
+    The index is built in the background at startup and rebuilt when the
+    directory changes. Requests wait for the first index, but fail with 503
+    if it can't be built in time, e.g. because a file can't be read.
+
+    Args:
+        root: The directory to serve.
+        poll_interval: How often to check for changes in seconds.
+        ready_timeout: How long requests wait for the first index in seconds.
+    """
+
+    def __init__(
+        self,
+        root: pathlib.Path,
+        poll_interval: float = 2.0,
+        ready_timeout: float = READY_TIMEOUT,
+    ) -> None:
+        self._root = pathlib.Path(root)
+        self._poll_interval = poll_interval
+        self._ready_timeout = ready_timeout
+        self._index: Dict[str, Asset] = {}
+        self._signature: Optional[List[Tuple[str, int, int]]] = None
+        self._ready = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    async def refresh(self) -> bool:
+        """
+        Rebuilds the index if the directory has changed.
+
+        Returns:
+            ``True`` if the index was rebuilt.
+        """
+        loop = asyncio.get_running_loop()
+        signature = await loop.run_in_executor(None, directory_signature, self._root)
+
+        if signature == self._signature:
+            return False
+
+        # the new index replaces the old one all at once, so requests never
+        # see a partially built index
+        self._index = await loop.run_in_executor(None, build_index, self._root)
+        self._signature = signature
+        self._ready.set()
+        logger.info("indexed %d static files", len(self._index))
+
+        return True
+
+    async def _watch(self) -> None:
+        while True:
+            try:
+                await self.refresh()
+            except Exception:
+                logger.exception("failed to index static files")
+
+            await asyncio.sleep(self._poll_interval)
+
+    async def on_startup(self, app: web.Application) -> None:
+        self._task = asyncio.create_task(self._watch())
+
+    async def on_cleanup(self, app: web.Application) -> None:
+        if self._task:
+            self._task.cancel()
+
+    async def handle(self, request: web.Request) -> web.StreamResponse:
+        if not self._ready.is_set():
+            try:
+                await asyncio.wait_for(self._ready.wait(), self._ready_timeout)
+            except asyncio.TimeoutError:
+                raise web.HTTPServiceUnavailable(
+                    headers={"Retry-After": str(math.ceil(self._poll_interval))}
+                )
+
+        name = request.match_info["path"]
+
+        if name == "" or name.endswith("/"):
+            name += "index.html"
+
+        asset = self._index.get(name)
+
+        if asset is None:
+            raise web.HTTPNotFound()
+
+        encoding = select_encoding(
+            request.headers.get("Accept-Encoding", ""), asset.bodies
+        )
+
+        # each encoding is a different representation, so needs its own ETag
+        etag = (
+            asset.etag if encoding == "identity" else f'{asset.etag[:-1]}-{encoding}"'
+        )
+
+        headers = {
+            "Cache-Control": asset.cache_control,
+            "ETag": etag,
+            "Vary": "Accept-Encoding",
+        }
+
+        if_none_match = {
+            t.strip().removeprefix("W/")
+            for t in request.headers.get("If-None-Match", "").split(",")
+        }
+
+        if etag in if_none_match or "*" in if_none_match:
+            return web.Response(status=304, headers=headers)
+
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+
+        return web.Response(
+            body=asset.bodies[encoding],
+            content_type=asset.content_type,
+            headers=headers,
+        )
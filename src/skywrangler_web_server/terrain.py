@@ -0,0 +1,205 @@
+"""
+Terrain elevation from local SRTM ``.hgt`` tiles.
+
+Tiles are memory mapped, so only the parts of a tile that are actually used
+are read from disk and no network connection is needed in the field.
+
+Tiles can be downloaded from e.g. https://dwtkns.com/srtm30m/ and must keep
+their original names, e.g. ``N35W098.hgt``.
+
+This module is also imported by the planner (``sw_mission``), so it must stay
+compatible with the oldest Python supported by the server and must not import
+aiohttp.
+"""
+
+import math
+import os
+import threading
+from collections import OrderedDict
+from typing import Tuple, Union
+
+import numpy as np
+
+# marks missing data in SRTM tiles
+HGT_VOID = -32768
+
+# maximum number of tiles kept open
+MAX_TILES = 16
+
+# distance between terrain samples when checking a leg in meters
+DEFAULT_SPACING = 10.0
+
+EARTH_RADIUS = 6371008.8
+
+ArrayLike = Union[float, np.ndarray]
+
+
+def hgt_name(latitude: int, longitude: int) -> str:
+    """
+    Gets the file name of the SRTM tile with the given south-west corner.
+
+    Args:
+        latitude: The latitude of the south edge in degrees.
+        longitude: The longitude of the west edge in degrees.
+
+    Returns:
+        The file name, e.g. ``N35W098.hgt``.
+    """
+    return "{}{:02d}{}{:03d}.hgt".format(
+        "N" if latitude >= 0 else "S",
+        abs(latitude),
+        "E" if longitude >= 0 else "W",
+        abs(longitude),
+    )
+
+
+class TerrainModel:
+    """
+    Digital elevation model made from a directory of SRTM ``.hgt`` tiles.
+
+    The model can be used from several threads at once, e.g. the server's
+    executor.
+
+    Args:
+        directory: The directory containing the tiles.
+        max_tiles: The maximum number of tiles to keep open.
+    """
+
+    def __init__(
+        self, directory: Union[str, os.PathLike], max_tiles: int = MAX_TILES
+    ) -> None:
+        self._directory = directory
+        self._max_tiles = max_tiles
+        self._tiles: "OrderedDict[Tuple[int, int], np.ndarray]" = OrderedDict()
+        # guards the least recently used order of the tiles
+        self._lock = threading.Lock()
+
+    def _tile(self, latitude: int, longitude: int) -> np.ndarray:
+        key = (latitude, longitude)
+
+        with self._lock:
+            try:
+                self._tiles.move_to_end(key)
+                return self._tiles[key]
+            except KeyError:
+                pass
+
+            path = os.path.join(self._directory, hgt_name(latitude, longitude))
+            # big-endian 16-bit integers, square, first row is the north edge
+            size = math.isqrt(os.path.getsize(path) // 2)
+            tile = np.memmap(path, dtype=">i2", mode="r", shape=(size, size))
+
+            self._tiles[key] = tile
+
+            if len(self._tiles) > self._max_tiles:
+                self._tiles.popitem(last=False)
+
+            return tile
+
+    def elevation(self, latitude: ArrayLike, longitude: ArrayLike) -> np.ndarray:
+        """
+        Gets the terrain elevation using bilinear interpolation.
+
+        Args:
+            latitude: The latitude(s) in degrees.
+            longitude: The longitude(s) in degrees.
+
+        Returns:
+            The elevation(s) AMSL in meters with the broadcast shape of the
+            inputs.
+
+        Raises:
+            FileNotFoundError: if a tile is missing.
+            ValueError: if the tile has no data at a point.
+        """
+        lat, lon = np.broadcast_arrays(
+            np.asarray(latitude, dtype=float), np.asarray(longitude, dtype=float)
+        )
+        shape = lat.shape
+        lat = lat.ravel()
+        lon = lon.ravel()
+
+        tile_lat = np.floor(lat).astype(int)
+        tile_lon = np.floor(lon).astype(int)
+        result = np.empty(lat.shape)
+
+        for t_lat, t_lon in set(zip(tile_lat.tolist(), tile_lon.tolist())):
+            mask = (tile_lat == t_lat) & (tile_lon == t_lon)
+            tile = self._tile(t_lat, t_lon)
+            n = tile.shape[0] - 1
+
+            y = (t_lat + 1 - lat[mask]) * n
+            x = (lon[mask] - t_lon) * n
+            row = np.clip(np.floor(y).astype(int), 0, n - 1)
+            col = np.clip(np.floor(x).astype(int), 0, n - 1)
+            fy = y - row
+            fx = x - col
+
+            z00 = tile[row, col]
+            z01 = tile[row, col + 1]
+            z10 = tile[row + 1, col]
+            z11 = tile[row + 1, col + 1]
+
+            corners = np.stack([z00, z01, z10, z11])
+
+            if np.any(corners == HGT_VOID):
+                raise ValueError(f"no terrain data near {lat[mask][0]}, {lon[mask][0]}")
+
+            result[mask] = (z00 * (1 - fx) + z01 * fx) * (1 - fy) + (
+                z10 * (1 - fx) + z11 * fx
+            ) * fy
+
+        return result.reshape(shape)
+
+    def leg_clearance(
+        self,
+        latitudes: ArrayLike,
+        longitudes: ArrayLike,
+        altitudes: ArrayLike,
+        spacing: float = DEFAULT_SPACING,
+    ) -> np.ndarray:
+        """
+        Gets the minimum height above the terrain along each leg of a path.
+
+        Each leg is a straight line (in latitude, longitude and altitude)
+        between consecutive points and is sampled every ``spacing`` meters.
+
+        Args:
+            latitudes: The latitudes of the points in degrees.
+            longitudes: The longitudes of the points in degrees.
+            altitudes: The altitudes AMSL of the points in meters.
+            spacing: The maximum distance between samples in meters.
+
+        Returns:
+            The minimum clearance in meters for each leg (one less than the
+            number of points).
+
+        Raises:
+            FileNotFoundError: if a tile is missing.
+            ValueError: if a tile has no data along the path.
+        """
+        lat = np.asarray(latitudes, dtype=float)
+        lon = np.asarray(longitudes, dtype=float)
+        alt = np.asarray(altitudes, dtype=float)
+
+        # legs are short, so an equirectangular approximation is fine
+        dy = np.radians(np.diff(lat)) * EARTH_RADIUS
+        dx = (
+            np.radians(np.diff(lon))
+            * np.cos(np.radians((lat[:-1] + lat[1:]) / 2))
+            * EARTH_RADIUS
+        )
+        samples = np.maximum(np.ceil(np.hypot(dx, dy) / spacing).astype(int), 1)
+
+        # each leg includes both of its end points
+        counts = samples + 1
+        starts = np.cumsum(counts) - counts
+        leg = np.repeat(np.arange(len(samples)), counts)
+        t = (np.arange(counts.sum()) - starts[leg]) / samples[leg]
+
+        clearance = (alt[leg] + (alt[leg + 1] - alt[leg]) * t) - self.elevation(
+            lat[leg] + (lat[leg + 1] - lat[leg]) * t,
+            lon[leg] + (lon[leg + 1] - lon[leg]) * t,
+        )
+
+        return np.minimum.reduceat(clearance, starts)
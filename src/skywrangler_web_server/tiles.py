@@ -0,0 +1,196 @@
+"""
+Offline map tiles served from a local MBTiles file.
+
+See https://github.com/mapbox/mbtiles-spec for the file format.
+"""
+
+import asyncio
+import collections
+import hashlib
+import logging
+import queue
+import sqlite3
+from typing import NamedTuple, Optional, OrderedDict, Tuple
+
+from aiohttp import web
+from aiohttp.typedefs import PathLike
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPES = {
+    "png": "image/png",
+    "jpg": "image/jpeg",
+    "jpeg": "image/jpeg",
+    "webp": "image/webp",
+    "pbf": "application/x-protobuf",
+}
+
+# tiles don't change once seeded
+CACHE_CONTROL = "public, max-age=86400"
+
+# deepest zoom level that any tile source provides
+MAX_ZOOM = 24
+
+# let SQLite read the file through a memory map instead of read() calls
+MMAP_SIZE = 256 * 1024 * 1024
+
+
+class Tile(NamedTuple):
+    """
+    A tile read from the MBTiles file.
+    """
+
+    data: bytes
+    """The tile image (or gzipped vector tile)."""
+    etag: str
+    """Strong ETag of the data."""
+
+
+class TileStore:
+    """
+    Read-only access to tiles in an MBTiles file.
+
+    Queries run in the default executor using a pool of SQLite connections.
+    Recently used tiles are kept in memory.
+
+    Args:
+        path: The path to the MBTiles file.
+        cache_size: The maximum number of tiles to keep in memory.
+    """
+
+    def __init__(self, path: PathLike, cache_size: int = 1024) -> None:
+        self._path = path
+        self._cache_size = cache_size
+        self._cache: OrderedDict[Tuple[int, int, int], Optional[Tile]] = (
+            collections.OrderedDict()
+        )
+        self._pool: "queue.SimpleQueue[sqlite3.Connection]" = queue.SimpleQueue()
+
+        conn = self._connect()
+
+        try:
+            row = conn.execute(
+                "SELECT value FROM metadata WHERE name = 'format'"
+            ).fetchone()
+        finally:
+            self._pool.put(conn)
+
+        self.format = row[0] if row else "png"
+        self.content_type = CONTENT_TYPES.get(self.format, "application/octet-stream")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            f"file:{self._path}?mode=ro", uri=True, check_same_thread=False
+        )
+        conn.execute(f"PRAGMA mmap_size = {MMAP_SIZE}")
+        return conn
+
+    def read_tile(self, z: int, x: int, y: int) -> Optional[Tile]:
+        """
+        Reads a tile from the file (blocking).
+
+        Args:
+            z: The zoom level.
+            x: The column.
+            y: The row (XYZ scheme, i.e. 0 is north).
+
+        Returns:
+            The tile or ``None`` if the file does not contain the tile.
+        """
+        try:
+            conn = self._pool.get_nowait()
+        except queue.Empty:
+            conn = self._connect()
+
+        try:
+            row = conn.execute(
+                "SELECT tile_data FROM tiles "
+                "WHERE zoom_level = ? AND tile_column = ? AND tile_row = ?",
+                # MBTiles uses the TMS scheme where 0 is south
+                (z, x, (1 << z) - 1 - y),
+            ).fetchone()
+        finally:
+            self._pool.put(conn)
+
+        if row is None:
+            return None
+
+        data = bytes(row[0])
+        return Tile(data, '"' + hashlib.sha1(data).hexdigest() + '"')
+
+    async def get_tile(self, z: int, x: int, y: int) -> Optional[Tile]:
+        """
+        Gets a tile, from memory if possible.
+
+        Args:
+            z: The zoom level.
+            x: The column.
+            y: The row (XYZ scheme, i.e. 0 is north).
+
+        Returns:
+            The tile or ``None`` if the file does not contain the tile.
+        """
+        key = (z, x, y)
+
+        try:
+            self._cache.move_to_end(key)
+            return self._cache[key]
+        except KeyError:
+            pass
+
+        tile = await asyncio.get_running_loop().run_in_executor(
+            None, self.read_tile, z, x, y
+        )
+
+        # missing tiles are cached too, since the map will keep asking for them
+        self._cache[key] = tile
+
+        if len(self._cache) > self._cache_size:
+            self._cache.popitem(last=False)
+
+        return tile
+
+    def close(self) -> None:
+        """
+        Closes all database connections.
+        """
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                break
+
+    async def on_cleanup(self, app: web.Application) -> None:
+        self.close()
+
+    async def handle(self, request: web.Request) -> web.Response:
+        z = int(request.match_info["z"])
+        x = int(request.match_info["x"])
+        y = int(request.match_info["y"])
+
+        # don't let bogus requests fill the cache
+        if z > MAX_ZOOM or x >= 1 << z or y >= 1 << z:
+            raise web.HTTPNotFound()
+
+        tile = await self.get_tile(z, x, y)
+
+        if tile is None:
+            raise web.HTTPNotFound()
+
+        headers = {"Cache-Control": CACHE_CONTROL, "ETag": tile.etag}
+
+        if_none_match = {
+            t.strip().removeprefix("W/")
+            for t in request.headers.get("If-None-Match", "").split(",")
+        }
+
+        if tile.etag in if_none_match or "*" in if_none_match:
+            return web.Response(status=304, headers=headers)
+
+        # vector tiles are usually stored gzipped
+        if tile.data[:2] == b"\x1f\x8b":
+            headers["Content-Encoding"] = "gzip"
+
+        return web.Response(
+            body=tile.data, content_type=self.content_type, headers=headers
+        )
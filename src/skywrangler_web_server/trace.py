@@ -0,0 +1,179 @@
+"""
+Lightweight tracing of the mission pipeline.
+
+Each mission records a :class:`Trace` made up of timed :class:`Span` objects
+so that we can see which stage (geometry, parameter setting, upload, arming,
+etc.) is taking the time. Traces can be exported in the Chrome trace event
+format and opened in ``chrome://tracing`` or https://ui.perfetto.dev.
+"""
+
+import contextlib
+import itertools
+import os
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Iterator, List, NamedTuple, Optional
+
+
+class Span(NamedTuple):
+    """
+    A timed stage of a trace.
+    """
+
+    name: str
+    """The name of the stage."""
+    start_ns: int
+    """The start time in nanoseconds relative to the start of the trace."""
+    duration_ns: int
+    """The duration in nanoseconds."""
+    error: Optional[str]
+    """The name of the exception type if the stage failed, otherwise ``None``."""
+
+
+class Trace:
+    """
+    The spans recorded for a single mission.
+    """
+
+    def __init__(self, trace_id: int, name: str) -> None:
+        self.id = trace_id
+        self.name = name
+        self.wall_time = time.time()
+        self._origin_ns = time.perf_counter_ns()
+        self.spans: List[Span] = []
+
+    @contextlib.contextmanager
+    def span(self, name: str) -> Iterator[None]:
+        """
+        Context manager that records the time spent in the ``with`` block.
+
+        Args:
+            name: The name of the stage.
+        """
+        start = time.perf_counter_ns()
+        error: Optional[str] = None
+
+        try:
+            yield
+        except BaseException as ex:
+            error = type(ex).__name__
+            raise
+        finally:
+            self.spans.append(
+                Span(
+                    name,
+                    start - self._origin_ns,
+                    time.perf_counter_ns() - start,
+                    error,
+                )
+            )
+
+    @property
+    def duration_ns(self) -> int:
+        """
+        The time from the start of the trace to the end of the last span.
+        """
+        return max((s.start_ns + s.duration_ns for s in self.spans), default=0)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Gets a JSON-serializable summary of the trace.
+        """
+        return {
+            "id": self.id,
+            "name": self.name,
+            "time": self.wall_time,
+            "durationMs": self.duration_ns / 1e6,
+            "spans": [
+                {
+                    "name": s.name,
+                    "startMs": s.start_ns / 1e6,
+                    "durationMs": s.duration_ns / 1e6,
+                    "error": s.error,
+                }
+                for s in sorted(self.spans, key=lambda s: s.start_ns)
+            ],
+        }
+
+    def to_chrome_trace(self) -> Dict[str, Any]:
+        """
+        Gets the trace in the Chrome trace event JSON object format.
+        """
+        pid = os.getpid()
+
+        events: List[Dict[str, Any]] = [
+            {
+                "name": "process_name",
+                "ph": "M",
+                "pid": pid,
+                "args": {"name": f"{self.name} {self.id}"},
+            }
+        ]
+
+        for s in sorted(self.spans, key=lambda s: s.start_ns):
+            event: Dict[str, Any] = {
+                "name": s.name,
+                "cat": self.name,
+                "ph": "X",
+                "ts": s.start_ns / 1e3,
+                "dur": s.duration_ns / 1e3,
+                "pid": pid,
+                "tid": self.id,
+            }
+
+            if s.error:
+                event["args"] = {"error": s.error}
+
+            events.append(event)
+
+        return {
+            "traceEvents": events,
+            "displayTimeUnit": "ms",
+            "otherData": {"id": self.id, "time": self.wall_time},
+        }
+
+
+class Tracer:
+    """
+    Keeps the most recent traces.
+
+    Args:
+        max_traces: The maximum number of traces to keep.
+    """
+
+    def __init__(self, max_traces: int = 20) -> None:
+        self._ids = itertools.count(1)
+        self._traces: Deque[Trace] = deque(maxlen=max_traces)
+
+    def start(self, name: str) -> Trace:
+        """
+        Starts a new trace.
+
+        Args:
+            name: The name of the trace.
+
+        Returns:
+            The new trace.
+        """
+        trace = Trace(next(self._ids), name)
+        self._traces.append(trace)
+        return trace
+
+    def get(self, trace_id: int) -> Optional[Trace]:
+        """
+        Gets a trace by id.
+
+        Args:
+            trace_id: The id of the trace.
+
+        Returns:
+            The trace or ``None`` if the trace does not exist (anymore).
+        """
+        for t in self._traces:
+            if t.id == trace_id:
+                return t
+
+        return None
+
+    def __iter__(self) -> Iterator[Trace]:
+        return iter(self._traces)
@@ -0,0 +1,302 @@
+"""
+Runtime watchdog that returns the drone to launch when it leaves the mission
+corridor or a geofence, or flies below the altitude floor.
+
+All geometry is precomputed when the watchdog is created, so checking a
+position sample only costs a few microseconds of plain Python arithmetic and
+can be done synchronously as each telemetry sample arrives.
+"""
+
+import logging
+import math
+import time
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from mavsdk.telemetry import Position
+
+from .broadcast import Broadcast, Listener
+from .fence import Fence, FenceCircle
+
+logger = logging.getLogger(__name__)
+
+# maximum horizontal distance from the planned path
+CORRIDOR_WIDTH = 25.0  # meters
+# how far below the planned altitude of the nearby legs the drone may fly
+ALTITUDE_MARGIN = 3.0  # meters
+# position telemetry rate while checking, at 5 m/s the drone flies 0.5 m
+# between samples
+POSITION_RATE = 10.0  # Hz
+
+EARTH_RADIUS = 6371008.8
+
+LEFT_CORRIDOR = "left the mission corridor"
+BELOW_FLOOR = "below the altitude floor"
+LEFT_FENCE = "left the geofence"
+IN_EXCLUSION_ZONE = "entered an exclusion zone"
+
+
+class Waypoint(NamedTuple):
+    """
+    A point of the planned path.
+    """
+
+    latitude: float
+    longitude: float
+    relative_altitude: float
+    """The altitude relative to home in meters."""
+
+
+class _Leg(NamedTuple):
+    x: float
+    y: float
+    dx: float
+    dy: float
+    inv_length2: float
+    floor: float
+
+
+class _Polygon(NamedTuple):
+    edges: List[Tuple[float, float, float, float]]
+    inclusion: bool
+
+
+class _Circle(NamedTuple):
+    x: float
+    y: float
+    radius2: float
+    inclusion: bool
+
+
+class MissionGeometry:
+    """
+    Precomputed geometry of a mission for fast containment checks.
+
+    Args:
+        home: The (latitude, longitude) of the home position.
+        path: The planned path, starting above home.
+        fences: Optional polygon and circle geofences.
+        corridor_width: The maximum horizontal distance from the path in meters.
+        altitude_margin: How far below the planned altitude the drone may fly
+            in meters.
+    """
+
+    def __init__(
+        self,
+        home: Tuple[float, float],
+        path: Sequence[Waypoint],
+        fences: Sequence[Fence] = (),
+        corridor_width: float = CORRIDOR_WIDTH,
+        altitude_margin: float = ALTITUDE_MARGIN,
+    ) -> None:
+        self._lat0, self._lon0 = home
+        # meters per degree in a local equirectangular projection
+        self._ky = math.radians(1) * EARTH_RADIUS
+        self._kx = self._ky * math.cos(math.radians(self._lat0))
+        self._width2 = corridor_width**2
+        self._legs: List[_Leg] = []
+        self._polygons: List[_Polygon] = []
+        self._circles: List[_Circle] = []
+
+        for a, b in zip(path, path[1:]):
+            ax, ay = self._to_local(a.latitude, a.longitude)
+            bx, by = self._to_local(b.latitude, b.longitude)
+            dx, dy = bx - ax, by - ay
+            length2 = dx * dx + dy * dy
+            self._legs.append(
+                _Leg(
+                    ax,
+                    ay,
+                    dx,
+                    dy,
+                    1 / length2 if length2 else 0.0,
+                    min(a.relative_altitude, b.relative_altitude) - altitude_margin,
+                )
+            )
+
+        for fence in fences:
+            if isinstance(fence, FenceCircle):
+                x, y = self._to_local(*fence.center)
+                self._circles.append(_Circle(x, y, fence.radius**2, fence.inclusion))
+                continue
+
+            points = [self._to_local(lat, lon) for lat, lon in fence.points]
+            edges = [
+                (x0, y0, x1, y1)
+                for (x0, y0), (x1, y1) in zip(points, points[1:] + points[:1])
+            ]
+            self._polygons.append(_Polygon(edges, fence.inclusion))
+
+        self._has_fences = bool(self._polygons or self._circles)
+        self._has_inclusion = any(p.inclusion for p in self._polygons) or any(
+            c.inclusion for c in self._circles
+        )
+
+    def _to_local(self, latitude: float, longitude: float) -> Tuple[float, float]:
+        return (longitude - self._lon0) * self._kx, (latitude - self._lat0) * self._ky
+
+    @staticmethod
+    def _inside(
+        edges: List[Tuple[float, float, float, float]], x: float, y: float
+    ) -> bool:
+        inside = False
+
+        for x0, y0, x1, y1 in edges:
+            if (y0 > y) != (y1 > y) and x < x0 + (y - y0) * (x1 - x0) / (y1 - y0):
+                inside = not inside
+
+        return inside
+
+    def check(
+        self, latitude: float, longitude: float, relative_altitude: float
+    ) -> Optional[str]:
+        """
+        Checks a position.
+
+        Args:
+            latitude: The latitude in degrees.
+            longitude: The longitude in degrees.
+            relative_altitude: The altitude relative to home in meters.
+
+        Returns:
+            The reason the position is not allowed or ``None`` if it is OK.
+        """
+        x, y = self._to_local(latitude, longitude)
+
+        in_corridor = False
+        floor = math.inf
+
+        for leg in self._legs:
+            # distance to the closest point of the leg
+            t = ((x - leg.x) * leg.dx + (y - leg.y) * leg.dy) * leg.inv_length2
+            t = 0.0 if t < 0.0 else 1.0 if t > 1.0 else t
+            ex = x - leg.x - t * leg.dx
+            ey = y - leg.y - t * leg.dy
+
+            if ex * ex + ey * ey <= self._width2:
+                in_corridor = True
+
+                if leg.floor < floor:
+                    floor = leg.floor
+
+        if not in_corridor:
+            return LEFT_CORRIDOR
+
+        if relative_altitude < floor:
+            return BELOW_FLOOR
+
+        if self._has_fences:
+            included = not self._has_inclusion
+
+            for polygon in self._polygons:
+                if self._inside(polygon.edges, x, y):
+                    if not polygon.inclusion:
+                        return IN_EXCLUSION_ZONE
+
+                    included = True
+
+            for circle in self._circles:
+                dx, dy = x - circle.x, y - circle.y
+
+                if dx * dx + dy * dy <= circle.radius2:
+                    if not circle.inclusion:
+                        return IN_EXCLUSION_ZONE
+
+                    included = True
+
+            if not included:
+                return LEFT_FENCE
+
+        return None
+
+
+class Watchdog:
+    """
+    Checks each position sample of a flying mission.
+
+    The altitude floor is only enforced once the drone has climbed above it,
+    so that the takeoff does not count as a violation.
+
+    Args:
+        geometry: The mission geometry.
+        on_violation: Called (once) with the reason when a check fails.
+    """
+
+    def __init__(
+        self, geometry: MissionGeometry, on_violation: Callable[[str], None]
+    ) -> None:
+        self._geometry = geometry
+        self._on_violation = on_violation
+        self._listener: Optional[Listener] = None
+        self._climbed = False
+        self.samples = 0
+        self.violation: Optional[str] = None
+        self.last_check_ns = 0
+        self.max_check_ns = 0
+        self.trigger_ns: Optional[int] = None
+        """Time from receiving the violating sample to calling ``on_violation``."""
+
+    @property
+    def is_active(self) -> bool:
+        return self._listener is not None
+
+    def start(self, position: Broadcast[Position]) -> None:
+        """
+        Starts checking position samples.
+        """
+        # the latest sample may be from before the mission was started
+        self._listener = position.listen(
+            self.on_position, replay=False, rate=POSITION_RATE
+        )
+
+    def stop(self) -> None:
+        """
+        Stops checking position samples.
+        """
+        if self._listener:
+            self._listener.close()
+            self._listener = None
+
+    def on_position(self, position: Position) -> None:
+        start = time.perf_counter_ns()
+
+        if self.violation is not None:
+            return
+
+        self.samples += 1
+
+        reason = self._geometry.check(
+            position.latitude_deg,
+            position.longitude_deg,
+            position.relative_altitude_m,
+        )
+
+        if reason is None:
+            self._climbed = True
+        elif reason == BELOW_FLOOR and not self._climbed:
+            # still taking off
+            reason = None
+
+        self.last_check_ns = time.perf_counter_ns() - start
+        self.max_check_ns = max(self.max_check_ns, self.last_check_ns)
+
+        if reason is None:
+            return
+
+        logger.warning("watchdog: %s at %r", reason, position)
+        self.violation = reason
+        self.stop()
+        self.trigger_ns = time.perf_counter_ns() - start
+        self._on_violation(reason)
+
+    def status(self) -> Dict[str, Any]:
+        """
+        Gets a JSON-serializable snapshot of the watchdog.
+        """
+        return {
+            "active": self.is_active,
+            "samples": self.samples,
+            "violation": self.violation,
+            "lastCheckUs": self.last_check_ns / 1e3,
+            "maxCheckUs": self.max_check_ns / 1e3,
+            "triggerUs": None if self.trigger_ns is None else self.trigger_ns / 1e3,
+        }
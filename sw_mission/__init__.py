@@ -1,23 +1,41 @@
 from itertools import count
-from qgc_mission import Mission, PlanFile, SimpleItem
+from typing import Sequence
+from qgc_mission import GeoFence, Mission, PlanFile, SimpleItem
 from qgc_mission.enums import AltitudeMode, Command, FirmwareType, Frame, VehicleType
-from qgc_mission.params import NavTakeoffParams, NavWaypointParams, ReturnToLaunchParams
-from sw_mission.geo import (
-    diagonal_point,
-    dist_ang_to_horiz_vert,
-    origin_alt_to_takeoff_alt,
+from qgc_mission.params import (
+    DoChangeSpeedParams,
+    NavTakeoffParams,
+    NavWaypointParams,
+    ReturnToLaunchParams,
 )
+
+# the mission geometry and the terrain model are shared with the web server,
+# which has to support older Python versions, so they live in the web server
+# package
+from src.skywrangler_web_server.ir import (
+    SAFE_ALTITUDE,
+    CompiledMission,
+    compile_mission,
+)
+from src.skywrangler_web_server.mission import (
+    Coordinate2D as ServerCoordinate2D,
+    MissionRequest,
+    Origin,
+    Parameters as ServerParameters,
+    Transect as ServerTransect,
+)
+from src.skywrangler_web_server.terrain import TerrainModel
+from sw_mission.fence import buffered_fence, check_fence
 from sw_mission.points import (
     Coordinate2D,
     Point,
     Parameters,
     Transect,
-    transect_points,
 )
 
-
-SAFE_ALTITUDE = 100  # meters
-SPEED = 10  # meters per second
+# minimum height above the terrain model on every leg of the mission, more
+# than the 10-16 m error of SRTM elevations
+MIN_TERRAIN_CLEARANCE = 20.0  # meters
 
 
 def create_mission(
@@ -26,153 +44,284 @@ def create_mission(
     transect: Transect,
     parameters: Parameters,
     return_point: Coordinate2D,
+    terrain: TerrainModel | None = None,
+    geo_fence: GeoFence | None = None,
 ) -> PlanFile:
-    jump_id = count(1)
+    """
+    Creates the mission for one set of experiment parameters.
+
+    Args:
+        launch: The takeoff point.
+        origin: The center of the goat enclosure.
+        transect: The path of the drone as it passes by the enclosure.
+        parameters: The variable parameters of the experiment.
+        return_point: Where to fly to before returning to launch.
+        terrain: Optional terrain model. If given, the launch and origin
+            altitudes are replaced with the terrain elevation and every leg
+            of the mission is checked for terrain clearance.
+        geo_fence: Optional fixed fence, e.g. the field boundary and
+            exclusion zones. If it has no inclusion zones, a fence around the
+            mission footprint is added.
+
+    Returns:
+        The QGC plan.
 
-    _horizontal, vertical = dist_ang_to_horiz_vert(
-        parameters.distance, parameters.angle
+    Raises:
+        ValueError: if a leg of the mission is too close to the terrain or
+            leaves the geofence.
+    """
+    return create_multi_pass_mission(
+        launch,
+        origin,
+        transect,
+        [parameters],
+        return_point,
+        terrain=terrain,
+        geo_fence=geo_fence,
     )
-    c, d = transect_points(origin, transect, parameters)
 
-    # mission items need altitudes relative to takeoff altitude
-    relative_vertical = origin_alt_to_takeoff_alt(
-        vertical, origin.altitude, launch.altitude
+
+def create_multi_pass_mission(
+    launch: Point,
+    origin: Point,
+    transect: Transect,
+    passes: Sequence[Parameters],
+    return_point: Coordinate2D,
+    loiter_time: float = 0,
+    terrain: TerrainModel | None = None,
+    geo_fence: GeoFence | None = None,
+) -> PlanFile:
+    """
+    Creates a mission that flies several passes of the transect with
+    different experiment parameters in one flight.
+
+    After each pass, the drone climbs back to safe altitude (point E) and
+    flies at safe altitude to the start of the approach of the next pass
+    (point B), where it can hover for a while so the animals can settle.
+
+    Args:
+        launch: The takeoff point.
+        origin: The center of the goat enclosure.
+        transect: The path of the drone as it passes by the enclosure.
+        passes: The variable parameters of the experiment for each pass.
+        return_point: Where to fly to before returning to launch.
+        loiter_time: How long to hover at safe altitude before each pass
+            after the first one in seconds.
+        terrain: Optional terrain model, see :func:`create_mission`.
+        geo_fence: Optional fixed fence, see :func:`create_mission`.
+
+    Returns:
+        The QGC plan.
+
+    Raises:
+        ValueError: if there are no passes or a leg of the mission is too
+            close to the terrain or leaves the geofence.
+    """
+    mission = compile_multi_pass_mission(
+        launch,
+        origin,
+        transect,
+        passes,
+        return_point,
+        loiter_time=loiter_time,
+        terrain=terrain,
     )
-    b_lat, b_long = diagonal_point(
-        c.latitude,
-        c.longitude,
-        SAFE_ALTITUDE - relative_vertical,
-        transect.azimuth - 90,
+    launch = launch._replace(altitude=mission.home_altitude)
+    mission_items = qgc_mission_items(mission, launch)
+
+    if terrain is not None:
+        check_terrain_clearance(terrain, launch, mission_items)
+
+    # Point A (takeoff) is straight above launch
+    path = [(launch.latitude, launch.longitude)] + [
+        (item.params.latitude, item.params.longitude)
+        for item in mission_items
+        if item.command == Command.NAV_WAYPOINT
+    ]
+
+    fence = geo_fence or GeoFence()
+
+    if not any(c.enabled for c in fence.circles) and not any(
+        p.enabled for p in fence.polygons
+    ):
+        fence = GeoFence(
+            circles=fence.circles, polygons=fence.polygons + [buffered_fence(path)]
+        )
+
+    check_fence(fence, path)
+
+    plan = PlanFile(
+        ground_station="SkyWrangler",
+        mission=Mission(
+            firmware_type=FirmwareType.PX4,
+            vehicle_type=VehicleType.QUADROTOR,
+            global_plan_altitude_mode=AltitudeMode.MIXED,
+            hover_speed=mission.speed,
+            cruise_speed=mission.speed,
+            planned_home_position=launch,
+            items=mission_items,
+        ),
+        geo_fence=fence,
     )
-    e_lat, e_long = diagonal_point(
-        d.latitude,
-        d.longitude,
-        SAFE_ALTITUDE - relative_vertical,
-        transect.azimuth + 90,
+
+    return plan
+
+
+def compile_multi_pass_mission(
+    launch: Point,
+    origin: Point,
+    transect: Transect,
+    passes: Sequence[Parameters],
+    return_point: Coordinate2D,
+    loiter_time: float = 0,
+    terrain: TerrainModel | None = None,
+) -> CompiledMission:
+    """
+    Compiles a mission to the representation shared with the web server.
+
+    Args:
+        See :func:`create_multi_pass_mission`.
+
+    Returns:
+        The compiled mission. The result is cached, so creating the QGC plan
+        and exporting the compiled mission only computes the geometry once.
+
+    Raises:
+        ValueError: if there are no passes.
+    """
+    if not passes:
+        raise ValueError("mission needs at least one pass")
+
+    if terrain is not None:
+        launch = launch._replace(
+            altitude=float(terrain.elevation(launch.latitude, launch.longitude))
+        )
+        origin = origin._replace(
+            altitude=float(terrain.elevation(origin.latitude, origin.longitude))
+        )
+
+    request = MissionRequest(
+        origin=Origin(origin.latitude, origin.longitude, origin.altitude),
+        transect=ServerTransect(transect.azimuth, transect.length),
+        parameters=ServerParameters(*passes[0]),
+        return_point=ServerCoordinate2D(return_point.latitude, return_point.longitude),
+        passes=tuple(ServerParameters(*p) for p in passes[1:]),
+        loiter_time=loiter_time,
     )
-    f_lat, f_long = return_point.latitude, return_point.longitude
 
-    mission_items: list[SimpleItem] = []
+    return compile_mission(request, launch.altitude)
+
+
+def qgc_mission_items(mission: CompiledMission, launch: Point) -> list[SimpleItem]:
+    """
+    Converts a compiled mission to QGC mission items.
+
+    Args:
+        mission: The compiled mission.
+        launch: The takeoff point.
+
+    Returns:
+        The mission items from takeoff to return to launch. A speed change
+        item follows each waypoint where the speed changes.
+    """
+    jump_id = count(1)
+    speed = mission.speed
 
     # Point A is taking off to safe altitude above launch
-    mission_items.append(
+    mission_items = [
         SimpleItem(
             do_jump_id=next(jump_id),
             command=Command.NAV_TAKEOFF,
             altitude_mode=AltitudeMode.LAUNCH,
-            altitude=SAFE_ALTITUDE,
+            altitude=mission.safe_altitude,
             frame=Frame.GLOBAL_RELATIVE_ALT,
             params=NavTakeoffParams(
                 latitude=launch.latitude,
                 longitude=launch.longitude,
-                altitude=SAFE_ALTITUDE,
+                altitude=mission.safe_altitude,
             ),
         )
-    )
+    ]
 
-    # Flies to line colinear of the transect
-    # Point B
-    mission_items.append(
-        SimpleItem(
-            do_jump_id=next(jump_id),
-            command=Command.NAV_WAYPOINT,
-            altitude_mode=AltitudeMode.AMSL,
-            altitude=launch.altitude + SAFE_ALTITUDE,
-            frame=Frame.GLOBAL,
-            params=NavWaypointParams(
-                latitude=b_lat,
-                longitude=b_long,
-                altitude=launch.altitude + SAFE_ALTITUDE,
-            ),
-        )
-    )
-    # flies at an angle of 60 degrees towards the start of the transect
-    # Point C
-    mission_items.append(
-        SimpleItem(
-            do_jump_id=next(jump_id),
-            command=Command.NAV_WAYPOINT,
-            altitude_mode=AltitudeMode.AMSL,
-            altitude=launch.altitude + SAFE_ALTITUDE,
-            frame=Frame.GLOBAL,
-            params=NavWaypointParams(
-                latitude=c.latitude,
-                longitude=c.longitude,
-                altitude=c.altitude,
-            ),
-        )
-    )
-    # Flies at requested speed and requested altitude to the end of the transect
-    # Point D
-    mission_items.append(
-        SimpleItem(
-            do_jump_id=next(jump_id),
-            command=Command.NAV_WAYPOINT,
-            altitude_mode=AltitudeMode.AMSL,
-            altitude=launch.altitude + SAFE_ALTITUDE,
-            frame=Frame.GLOBAL,
-            params=NavWaypointParams(
-                latitude=d.latitude,
-                longitude=d.longitude,
-                altitude=d.altitude,
-            ),
-        )
-    )
-    # ascends at 60 degrees towards the safe altitude towards the return point
-    # Point E
-    mission_items.append(
-        SimpleItem(
-            do_jump_id=next(jump_id),
-            command=Command.NAV_WAYPOINT,
-            altitude_mode=AltitudeMode.AMSL,
-            altitude=launch.altitude + SAFE_ALTITUDE,
-            frame=Frame.GLOBAL,
-            params=NavWaypointParams(
-                latitude=e_lat,
-                longitude=e_long,
-                altitude=launch.altitude + SAFE_ALTITUDE,
-            ),
+    for w in mission.waypoints:
+        mission_items.append(
+            SimpleItem(
+                do_jump_id=next(jump_id),
+                command=Command.NAV_WAYPOINT,
+                altitude_mode=AltitudeMode.AMSL,
+                altitude=launch.altitude + mission.safe_altitude,
+                frame=Frame.GLOBAL,
+                params=NavWaypointParams(
+                    hold=w.hold,
+                    latitude=w.latitude,
+                    longitude=w.longitude,
+                    altitude=w.altitude,
+                ),
+            )
         )
-    )
-    # Flies at a safe altitude and returns to launch
-    # Point F
-    mission_items.append(
-        SimpleItem(
-            do_jump_id=next(jump_id),
-            command=Command.NAV_WAYPOINT,
-            altitude_mode=AltitudeMode.AMSL,
-            altitude=launch.altitude + SAFE_ALTITUDE,
-            frame=Frame.GLOBAL,
-            params=NavWaypointParams(
-                latitude=f_lat,
-                longitude=f_long,
-                altitude=launch.altitude + SAFE_ALTITUDE,
-            ),
-        )
-    )
+
+        if w.speed is not None and w.speed != speed:
+            speed = w.speed
+            mission_items.append(
+                SimpleItem(
+                    do_jump_id=next(jump_id),
+                    command=Command.DO_CHANGE_SPEED,
+                    altitude=0,
+                    frame=Frame.MISSION,
+                    params=DoChangeSpeedParams(speed=speed),
+                )
+            )
 
     mission_items.append(
         SimpleItem(
             do_jump_id=next(jump_id),
             command=Command.NAV_RETURN_TO_LAUNCH,
             altitude_mode=AltitudeMode.LAUNCH,
-            altitude=SAFE_ALTITUDE,
+            altitude=mission.safe_altitude,
             frame=Frame.MISSION,
             params=ReturnToLaunchParams(),
         )
     )
 
-    plan = PlanFile(
-        ground_station="SkyWrangler",
-        mission=Mission(
-            firmware_type=FirmwareType.PX4,
-            vehicle_type=VehicleType.QUADROTOR,
-            global_plan_altitude_mode=AltitudeMode.MIXED,
-            hover_speed=SPEED,
-            cruise_speed=SPEED,
-            planned_home_position=launch,
-            items=mission_items,
-        ),
+    return mission_items
+
+
+def check_terrain_clearance(
+    terrain: TerrainModel, launch: Point, mission_items: list[SimpleItem]
+) -> None:
+    """
+    Checks that no leg of a mission from the takeoff point to the return
+    point goes below :data:`MIN_TERRAIN_CLEARANCE`.
+
+    Legs down to the transect are flown low on purpose, so they only need
+    to clear the terrain by their planned height above the lowest point of
+    the mission, if that is less.
+
+    Args:
+        terrain: The terrain model.
+        launch: The takeoff point.
+        mission_items: The mission items as created by :func:`create_mission`.
+
+    Raises:
+        ValueError: if a leg is too close to the terrain.
+    """
+    # Point A (takeoff) is relative to launch, the rest are AMSL
+    path = [(launch.latitude, launch.longitude, launch.altitude + SAFE_ALTITUDE)]
+    path.extend(
+        (item.params.latitude, item.params.longitude, item.params.altitude)
+        for item in mission_items
+        if item.command == Command.NAV_WAYPOINT
     )
 
-    return plan
+    clearance = terrain.leg_clearance(*zip(*path))
+    altitudes = [altitude for *_, altitude in path]
+    lowest = min(altitudes)
+
+    for i, c in enumerate(clearance):
+        floor = min(altitudes[i], altitudes[i + 1]) - lowest
+
+        if c < min(MIN_TERRAIN_CLEARANCE, floor):
+            raise ValueError(
+                f"leg {chr(ord('A') + i)}-{chr(ord('B') + i)} has "
+                f"{c:.1f} m terrain clearance"
+            )
@@ -0,0 +1,329 @@
+"""
+Geofence generation and preflight containment checks.
+
+Geometry is done in a local east/north plane (in meters) around a reference
+point, which is accurate enough over the few hundred meters of a mission.
+
+QGC writes the ``enabled`` flag of :class:`CircleGeoFence` and
+:class:`PolygonGeoFence` as the ``inclusion`` flag, so fences with
+``enabled=False`` are treated as exclusion zones.
+"""
+
+import math
+from typing import NamedTuple, Sequence
+
+import numpy as np
+import numpy.typing as npt
+
+from qgc_mission import GeoFence, PolygonGeoFence
+from src.skywrangler_web_server.fence import (
+    DEFAULT_BUFFER,
+    EARTH_RADIUS,
+    buffered_fence as _buffered_fence,
+)
+
+# distance between points when checking a leg
+DEFAULT_SPACING = 5.0  # meters
+
+
+class LocalFrame(NamedTuple):
+    """
+    Local east/north plane with the origin at a reference point.
+    """
+
+    latitude: float
+    longitude: float
+
+    def to_local(
+        self, latitude: npt.ArrayLike, longitude: npt.ArrayLike
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Converts latitude and longitude in degrees to east and north in meters.
+        """
+        x = (
+            np.radians(np.asarray(longitude, dtype=float) - self.longitude)
+            * math.cos(math.radians(self.latitude))
+            * EARTH_RADIUS
+        )
+        y = np.radians(np.asarray(latitude, dtype=float) - self.latitude) * EARTH_RADIUS
+        return x, y
+
+    def to_global(
+        self, x: npt.ArrayLike, y: npt.ArrayLike
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Converts east and north in meters to latitude and longitude in degrees.
+        """
+        latitude = self.latitude + np.degrees(np.asarray(y) / EARTH_RADIUS)
+        longitude = self.longitude + np.degrees(
+            np.asarray(x) / EARTH_RADIUS / math.cos(math.radians(self.latitude))
+        )
+        return latitude, longitude
+
+
+def densify(
+    x: npt.ArrayLike, y: npt.ArrayLike, spacing: float
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Adds points along each leg of a path.
+
+    Args:
+        x: The east coordinates of the path in meters.
+        y: The north coordinates of the path in meters.
+        spacing: The maximum distance between points in meters.
+
+    Returns:
+        The x and y coordinates of the points and the index of the leg that
+        each point belongs to. Each leg includes both of its end points.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+
+    samples = np.maximum(
+        np.ceil(np.hypot(np.diff(x), np.diff(y)) / spacing).astype(int), 1
+    )
+    counts = samples + 1
+    starts = np.cumsum(counts) - counts
+    leg = np.repeat(np.arange(len(samples)), counts)
+    t = (np.arange(counts.sum()) - starts[leg]) / samples[leg]
+
+    return (
+        x[leg] + (x[leg + 1] - x[leg]) * t,
+        y[leg] + (y[leg + 1] - y[leg]) * t,
+        leg,
+    )
+
+
+def buffered_fence(
+    points: Sequence[tuple[float, float]], buffer: float = DEFAULT_BUFFER
+) -> PolygonGeoFence:
+    """
+    Creates an inclusion fence around the footprint of a mission.
+
+    The fence is computed by the web server's :func:`fence.buffered_fence`,
+    so the server can fly the same fence for computed missions.
+
+    Args:
+        points: (latitude, longitude) of every point the mission flies to.
+        buffer: The minimum distance from the points to the fence in meters.
+
+    Returns:
+        The convex hull of the points grown by ``buffer``.
+    """
+    return PolygonGeoFence(points=list(_buffered_fence(points, buffer).points))
+
+
+class _EdgeIndex:
+    """
+    Spatial index of the edges of a polygon.
+
+    Edges are bucketed into horizontal slabs so that each test only looks at
+    the edges that span the same north coordinates as the test point or leg.
+    """
+
+    def __init__(self, x: np.ndarray, y: np.ndarray) -> None:
+        self.x0 = x
+        self.y0 = y
+        self.x1 = np.roll(x, -1)
+        self.y1 = np.roll(y, -1)
+
+        y_min = np.minimum(self.y0, self.y1)
+        y_max = np.maximum(self.y0, self.y1)
+
+        self._bottom = float(y_min.min())
+        self._count = max(1, math.isqrt(len(x)))
+        self._height = max(float(y_max.max()) - self._bottom, 1e-9) / self._count
+
+        first = self._slab(y_min)
+        last = self._slab(y_max)
+        self._slabs: list[np.ndarray] = [
+            np.flatnonzero((first <= s) & (last >= s)) for s in range(self._count)
+        ]
+
+    def _slab(self, y: npt.ArrayLike) -> np.ndarray:
+        return np.clip(
+            ((np.asarray(y) - self._bottom) // self._height).astype(int),
+            0,
+            self._count - 1,
+        )
+
+    def contains(self, px: np.ndarray, py: np.ndarray) -> np.ndarray:
+        """
+        Point-in-polygon test by ray casting (even-odd rule).
+        """
+        inside = np.zeros(px.shape, dtype=bool)
+        slab = self._slab(py)
+
+        for s in np.unique(slab):
+            points = np.flatnonzero(slab == s)
+            edges = self._slabs[s]
+
+            if len(edges) == 0:
+                continue
+
+            x, y = px[points, None], py[points, None]
+            x0, y0 = self.x0[edges], self.y0[edges]
+            x1, y1 = self.x1[edges], self.y1[edges]
+
+            with np.errstate(divide="ignore", invalid="ignore"):
+                crosses = ((y0 > y) != (y1 > y)) & (
+                    x < x0 + (y - y0) * (x1 - x0) / (y1 - y0)
+                )
+
+            inside[points] = np.count_nonzero(crosses, axis=1) % 2 == 1
+
+        return inside
+
+    def intersects(self, ax: float, ay: float, bx: float, by: float) -> bool:
+        """
+        Checks if a segment crosses any edge of the polygon.
+        """
+        first, last = self._slab([min(ay, by), max(ay, by)])
+        edges = np.unique(np.concatenate(self._slabs[first : last + 1]))
+
+        if len(edges) == 0:
+            return False
+
+        x0, y0 = self.x0[edges], self.y0[edges]
+        x1, y1 = self.x1[edges], self.y1[edges]
+
+        def orientation(px, py, qx, qy, rx, ry):
+            return np.sign((qx - px) * (ry - py) - (qy - py) * (rx - px))
+
+        o1 = orientation(ax, ay, bx, by, x0, y0)
+        o2 = orientation(ax, ay, bx, by, x1, y1)
+        o3 = orientation(x0, y0, x1, y1, ax, ay)
+        o4 = orientation(x0, y0, x1, y1, bx, by)
+
+        # proper crossings only, touching the fence is not leaving it
+        return bool(np.any((o1 * o2 < 0) & (o3 * o4 < 0)))
+
+
+class FenceChecker:
+    """
+    Checks points and paths against a geofence.
+
+    A point is inside the fence if it is inside any inclusion zone (or there
+    are no inclusion zones) and outside all exclusion zones.
+
+    Args:
+        fence: The geofence.
+        frame: The local frame for the computations, somewhere near the fence.
+    """
+
+    def __init__(self, fence: GeoFence, frame: LocalFrame) -> None:
+        self._frame = frame
+        self._polygons: list[tuple[_EdgeIndex, bool]] = []
+        self._circles: list[tuple[float, float, float, bool]] = []
+
+        for polygon in fence.polygons:
+            lat, lon = np.array(polygon.points, dtype=float).T
+            x, y = frame.to_local(lat, lon)
+            self._polygons.append((_EdgeIndex(x, y), polygon.enabled))
+
+        for circle in fence.circles:
+            x, y = frame.to_local(*circle.center)
+            self._circles.append((float(x), float(y), circle.radius, circle.enabled))
+
+        self._has_inclusion = any(inc for _, inc in self._polygons) or any(
+            inc for *_, inc in self._circles
+        )
+
+    def _contains_local(self, x: np.ndarray, y: np.ndarray) -> np.ndarray:
+        included = np.full(x.shape, not self._has_inclusion)
+        excluded = np.zeros(x.shape, dtype=bool)
+
+        for index, inclusion in self._polygons:
+            inside = index.contains(x, y)
+
+            if inclusion:
+                included |= inside
+            else:
+                excluded |= inside
+
+        for cx, cy, radius, inclusion in self._circles:
+            inside = np.hypot(x - cx, y - cy) <= radius
+
+            if inclusion:
+                included |= inside
+            else:
+                excluded |= inside
+
+        return included & ~excluded
+
+    def contains(self, latitude: npt.ArrayLike, longitude: npt.ArrayLike) -> np.ndarray:
+        """
+        Checks if points are inside the fence.
+
+        Args:
+            latitude: The latitude(s) in degrees.
+            longitude: The longitude(s) in degrees.
+
+        Returns:
+            ``True`` for each point that is inside the fence.
+        """
+        x, y = self._frame.to_local(latitude, longitude)
+        return self._contains_local(np.atleast_1d(x), np.atleast_1d(y))
+
+    def check_path(
+        self,
+        latitudes: npt.ArrayLike,
+        longitudes: npt.ArrayLike,
+        spacing: float = DEFAULT_SPACING,
+    ) -> np.ndarray:
+        """
+        Checks if each leg of a path stays inside the fence.
+
+        Each leg is densified to ``spacing`` and every point is checked. Legs
+        are also checked for crossing polygon edges between the points, which
+        is conservative when inclusion zones overlap.
+
+        Args:
+            latitudes: The latitudes of the path in degrees.
+            longitudes: The longitudes of the path in degrees.
+            spacing: The maximum distance between checked points in meters.
+
+        Returns:
+            ``True`` for each leg that stays inside the fence.
+        """
+        x, y = self._frame.to_local(latitudes, longitudes)
+        px, py, leg = densify(x, y, spacing)
+
+        legs = len(x) - 1
+        outside = np.bincount(leg[~self._contains_local(px, py)], minlength=legs)
+        ok = outside == 0
+
+        for i in np.flatnonzero(ok):
+            if any(
+                index.intersects(x[i], y[i], x[i + 1], y[i + 1])
+                for index, _ in self._polygons
+            ):
+                ok[i] = False
+
+        return ok
+
+
+def check_fence(
+    fence: GeoFence,
+    path: Sequence[tuple[float, float]],
+    spacing: float = DEFAULT_SPACING,
+) -> None:
+    """
+    Checks that every leg of a path stays inside a fence.
+
+    Args:
+        fence: The geofence.
+        path: (latitude, longitude) of the points of the path.
+        spacing: The maximum distance between checked points in meters.
+
+    Raises:
+        ValueError: if a leg leaves the fence.
+    """
+    lat, lon = np.array(path, dtype=float).T
+    checker = FenceChecker(fence, LocalFrame(float(lat[0]), float(lon[0])))
+
+    for i, ok in enumerate(checker.check_path(lat, lon, spacing)):
+        if not ok:
+            raise ValueError(
+                f"leg {chr(ord('A') + i)}-{chr(ord('B') + i)} leaves the geofence"
+            )
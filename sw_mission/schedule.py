@@ -0,0 +1,284 @@
+"""
+Battery-aware experiment scheduler.
+
+Estimates the energy of each run of the experiment grid in
+``mission-data.json`` and packs the runs into as few batteries as possible.
+
+Usage::
+
+    python -m sw_mission.schedule mission-data.json --output schedule.json
+
+The output can be loaded into the web server sequencer, which pauses for a
+battery swap between batteries.
+"""
+
+import argparse
+import itertools
+import json
+from typing import Any, NamedTuple, Sequence
+
+import numpy as np
+
+from sw_mission import create_mission
+from sw_mission.fence import LocalFrame
+from sw_mission.points import Coordinate2D, Parameters, Point, Transect
+from sw_mission.simulate import Simulation, simulate_plan
+
+
+class BatteryModel(NamedTuple):
+    """
+    Simple energy model of the vehicle and its battery.
+
+    The defaults are for a ~2 kg quadcopter with a 4S 5000 mAh battery.
+    """
+
+    capacity: float = 74.0
+    """The battery capacity in watt hours."""
+    reserve: float = 0.25
+    """The fraction of the capacity that must be left after landing."""
+    hover_power: float = 250.0
+    """The power needed to hover in watts."""
+    drag: float = 1.0
+    """Extra power for forward flight in watts per (m/s)²."""
+    climb: float = 40.0
+    """Extra energy for climbing in joules per meter."""
+
+    @property
+    def usable(self) -> float:
+        """
+        The usable energy per battery in watt hours.
+        """
+        return self.capacity * (1 - self.reserve)
+
+    def energy(self, sim: Simulation) -> float:
+        """
+        Estimates the energy used for a simulated flight.
+
+        Args:
+            sim: The simulated flight.
+
+        Returns:
+            The energy in watt hours.
+        """
+        x, y = LocalFrame(sim.latitude[0], sim.longitude[0]).to_local(
+            sim.latitude, sim.longitude
+        )
+        dt = np.diff(sim.time)
+        valid = dt > 0
+        speed = np.hypot(np.diff(x), np.diff(y))[valid] / dt[valid]
+        climb = np.clip(np.diff(sim.altitude), 0, None).sum()
+
+        joules = (
+            np.sum((self.hover_power + self.drag * speed**2) * dt[valid])
+            + self.climb * climb
+        )
+
+        return float(joules / 3600)
+
+
+class RunEstimate(NamedTuple):
+    """
+    The estimated cost of one run of the experiment.
+    """
+
+    parameters: Parameters
+    """The experiment parameters."""
+    duration: float
+    """The flight time in seconds."""
+    energy: float
+    """The energy in watt hours."""
+
+
+def run_mission(mission_data: dict[str, Any], parameters: Parameters) -> dict:
+    """
+    Gets a run in the JSON format of the web server ``fly_mission`` API.
+    """
+    return {
+        "origin": {
+            "latitude": mission_data["origin"]["latitude"],
+            "longitude": mission_data["origin"]["longitude"],
+            "elevation": mission_data["origin"]["altitude"],
+        },
+        "transect": {
+            "azimuth": mission_data["transect"]["azimuth"],
+            "length": mission_data["transect"]["length"],
+        },
+        "parameters": parameters._asdict(),
+        "returnPoint": {
+            "latitude": mission_data["away"]["latitude"],
+            "longitude": mission_data["away"]["longitude"],
+        },
+    }
+
+
+def estimate_run(
+    mission_data: dict[str, Any], parameters: Parameters, battery: BatteryModel
+) -> RunEstimate:
+    """
+    Estimates the duration and energy of a run.
+
+    Args:
+        mission_data: The contents of ``mission-data.json``.
+        parameters: The experiment parameters of the run.
+        battery: The energy model.
+
+    Returns:
+        The estimate.
+    """
+    plan = create_mission(
+        launch=Point(**mission_data["home"]),
+        origin=Point(**mission_data["origin"]),
+        transect=Transect(**mission_data["transect"]),
+        parameters=parameters,
+        return_point=Coordinate2D(**mission_data["away"]),
+    )
+
+    sim = simulate_plan(plan)
+
+    return RunEstimate(parameters, sim.duration, battery.energy(sim))
+
+
+def _pack(
+    energies: Sequence[float], capacity: float, best_fit: bool
+) -> list[list[int]]:
+    bins: list[list[int]] = []
+    free: list[float] = []
+
+    for i in sorted(range(len(energies)), key=lambda i: -energies[i]):
+        fits = [b for b, f in enumerate(free) if f >= energies[i]]
+
+        if not fits:
+            bins.append([i])
+            free.append(capacity - energies[i])
+            continue
+
+        b = min(fits, key=lambda b: free[b]) if best_fit else fits[0]
+        bins[b].append(i)
+        free[b] -= energies[i]
+
+    return bins
+
+
+def pack_runs(energies: Sequence[float], capacity: float) -> list[list[int]]:
+    """
+    Packs runs into batteries (bin packing).
+
+    Both first-fit decreasing and best-fit decreasing are tried and the one
+    that needs fewer batteries (then the one with the fullest first batteries)
+    is used.
+
+    Args:
+        energies: The energy of each run.
+        capacity: The usable energy per battery.
+
+    Returns:
+        The indices of the runs for each battery. Runs keep their original
+        order within a battery and batteries are ordered by their first run.
+
+    Raises:
+        ValueError: if a run needs more than a full battery.
+    """
+    if any(e > capacity for e in energies):
+        raise ValueError("run needs more energy than a full battery")
+
+    def fullness(bins: list[list[int]]) -> list[float]:
+        return sorted((-sum(energies[i] for i in b) for b in bins))
+
+    candidates = [_pack(energies, capacity, best_fit) for best_fit in (False, True)]
+    bins = min(candidates, key=lambda bins: (len(bins), fullness(bins)))
+
+    return sorted((sorted(b) for b in bins), key=lambda b: b[0])
+
+
+def schedule(
+    mission_data: dict[str, Any], battery: BatteryModel = BatteryModel()
+) -> dict[str, Any]:
+    """
+    Creates a battery schedule for the experiment grid.
+
+    Args:
+        mission_data: The contents of ``mission-data.json``.
+        battery: The energy model.
+
+    Returns:
+        A JSON-serializable schedule with the runs for each battery.
+    """
+    variables = mission_data["variables"]
+    estimates = [
+        estimate_run(
+            mission_data,
+            Parameters(speed=speed, distance=distance, angle=angle),
+            battery,
+        )
+        for speed, angle, distance in itertools.product(
+            variables["speed"], variables["angle"], variables["distance"]
+        )
+    ]
+
+    batteries = pack_runs([e.energy for e in estimates], battery.usable)
+
+    return {
+        "batteries": [
+            {
+                "energy": sum(estimates[i].energy for i in b),
+                "duration": sum(estimates[i].duration for i in b),
+                "runs": [
+                    {
+                        "mission": run_mission(mission_data, estimates[i].parameters),
+                        "energy": estimates[i].energy,
+                        "duration": estimates[i].duration,
+                    }
+                    for i in b
+                ],
+            }
+            for b in batteries
+        ],
+        "usableEnergy": battery.usable,
+        "duration": sum(e.duration for e in estimates),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Packs experiment runs per battery.")
+    parser.add_argument("mission_data", nargs="?", default="mission-data.json")
+    parser.add_argument("--output", help="JSON file for the schedule")
+    parser.add_argument(
+        "--capacity",
+        type=float,
+        default=BatteryModel().capacity,
+        help="battery capacity in Wh (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--hover-power",
+        type=float,
+        default=BatteryModel().hover_power,
+        help="hover power in W (default: %(default)s)",
+    )
+    args = parser.parse_args()
+
+    with open(args.mission_data, "r") as f:
+        mission_data = json.load(f)
+
+    result = schedule(
+        mission_data,
+        BatteryModel(capacity=args.capacity, hover_power=args.hover_power),
+    )
+
+    for n, b in enumerate(result["batteries"], 1):
+        print(f"battery {n}: {b['energy']:.1f} Wh, {b['duration'] / 60:.1f} min")
+
+        for run in b["runs"]:
+            p = run["mission"]["parameters"]
+            print(
+                f"  speed {p['speed']} angle {p['angle']} distance {p['distance']}:",
+                f"{run['energy']:.1f} Wh, {run['duration']:.0f} s",
+            )
+
+    print(
+        f"{len(result['batteries'])} batteries,",
+        f"{result['duration'] / 60:.0f} min flight time",
+    )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=4)
@@ -0,0 +1,318 @@
+"""
+Kinematic mission simulator for predicting flight time and trajectory.
+
+Each leg is flown in a straight line at constant speed. The horizontal speed
+is the requested speed, unless the vertical velocity limit (``MPC_Z_V_AUTO_*``)
+would be exceeded, in which case the whole leg is slowed down so that the
+vehicle still follows the line, like PX4 does in missions. Acceleration and
+corner cutting at fly-through waypoints are not modeled, so real flights are
+a bit slower.
+"""
+
+import math
+from typing import Any, NamedTuple, Sequence
+
+import numpy as np
+
+from qgc_mission import PlanFile
+from qgc_mission.enums import Command
+from sw_mission.fence import LocalFrame
+from sw_mission.points import Point
+
+# vertical velocity limits, as set by the web server before each mission
+Z_VEL_UP = 4.0  # MPC_Z_V_AUTO_UP, meters per second
+Z_VEL_DOWN = 4.0  # MPC_Z_V_AUTO_DN, meters per second
+
+# PX4 slows down for the last part of the landing
+LAND_ALTITUDE = 5.0  # MPC_LAND_ALT2, meters
+LAND_SPEED = 0.7  # MPC_LAND_SPEED, meters per second
+
+# sampling interval of the trajectory
+DEFAULT_DT = 0.1  # seconds
+
+# waypoints of each pass of the transect (B to E), see
+# ``src.skywrangler_web_server.ir.compile_mission``
+WAYPOINTS_PER_PASS = 4
+
+
+def pass_legs(index: int) -> tuple[str, str]:
+    """
+    Gets the names of the approach (e.g. ``"B-C"``) and transect (e.g.
+    ``"C-D"``) legs of a pass, named like the waypoints of the compiled
+    mission.
+
+    Args:
+        index: The index of the pass, starting at 0.
+    """
+    b, c, d = (chr(ord("B") + WAYPOINTS_PER_PASS * index + i) for i in range(3))
+    return f"{b}-{c}", f"{c}-{d}"
+
+
+class SimWaypoint(NamedTuple):
+    """
+    A point the vehicle flies to.
+    """
+
+    latitude: float
+    longitude: float
+    altitude: float
+    """The altitude AMSL in meters."""
+    speed: float | None = None
+    """The horizontal speed after reaching this point in meters per second or
+    ``None`` to keep the current speed."""
+    hold: float = 0
+    """How long to hover at this point in seconds."""
+
+
+class Simulation(NamedTuple):
+    """
+    The result of simulating a mission.
+    """
+
+    time: np.ndarray
+    """The sample times in seconds since takeoff."""
+    latitude: np.ndarray
+    """The latitude in degrees at each sample time."""
+    longitude: np.ndarray
+    """The longitude in degrees at each sample time."""
+    altitude: np.ndarray
+    """The altitude AMSL in meters at each sample time."""
+    leg_names: list[str]
+    """The name of each leg, e.g. ``"takeoff"``, ``"C-D"``, ``"hold F"`` or
+    ``"land"``."""
+    leg_durations: np.ndarray
+    """The duration of each leg in seconds."""
+    approach_angles: list[float]
+    """The descent angle of the approach leg (e.g. B-C) of each pass in
+    degrees (NaN if there is none)."""
+
+    @property
+    def duration(self) -> float:
+        """
+        The total flight time in seconds.
+        """
+        return float(self.leg_durations.sum())
+
+    def leg_time(self, name: str) -> float:
+        """
+        Gets the time spent on a leg in seconds (NaN if there is no such leg).
+        """
+        try:
+            return float(self.leg_durations[self.leg_names.index(name)])
+        except ValueError:
+            return math.nan
+
+    @property
+    def approach_angle(self) -> float:
+        """
+        The descent angle of the approach of the first pass (B-C) in degrees.
+        """
+        return self.approach_angles[0]
+
+    @property
+    def transect_times(self) -> list[float]:
+        """
+        The time spent on the transect (e.g. C-D) by each pass in seconds.
+        """
+        return [
+            self.leg_time(pass_legs(i)[1]) for i in range(len(self.approach_angles))
+        ]
+
+    @property
+    def transect_time(self) -> float:
+        """
+        The time spent on the transect by all passes in seconds.
+        """
+        return sum(self.transect_times)
+
+
+def plan_waypoints(plan: PlanFile) -> tuple[Point, list[SimWaypoint]]:
+    """
+    Gets the waypoints of a QGC plan from :func:`sw_mission.create_mission`.
+
+    Args:
+        plan: The plan.
+
+    Returns:
+        The home position and the waypoints, starting with the takeoff point.
+    """
+    home = Point(*plan.mission.planned_home_position)
+    waypoints: list[SimWaypoint] = []
+
+    for item in plan.mission.items:
+        match item.command:
+            case Command.NAV_TAKEOFF:
+                waypoints.append(
+                    SimWaypoint(
+                        home.latitude,
+                        home.longitude,
+                        home.altitude + item.altitude,
+                        plan.mission.hover_speed,
+                    )
+                )
+            case Command.NAV_WAYPOINT:
+                waypoints.append(
+                    SimWaypoint(
+                        item.params.latitude,
+                        item.params.longitude,
+                        item.params.altitude,
+                        hold=item.params.hold,
+                    )
+                )
+            case Command.DO_CHANGE_SPEED:
+                # applies after reaching the previous waypoint
+                waypoints[-1] = waypoints[-1]._replace(speed=item.params.speed)
+
+    return home, waypoints
+
+
+def mission_item_waypoints(
+    items: Sequence[Any], home: Point, takeoff_altitude: float
+) -> list[SimWaypoint]:
+    """
+    Gets the waypoints of MAVSDK mission items.
+
+    Args:
+        items: ``mavsdk.mission.MissionItem`` objects, as flown by the web
+            server. The speed of an item applies after reaching it.
+        home: The home position (AMSL altitude).
+        takeoff_altitude: The takeoff altitude (``MIS_TAKEOFF_ALT``) in meters.
+
+    Returns:
+        The waypoints, starting with the takeoff point.
+    """
+    return [
+        SimWaypoint(home.latitude, home.longitude, home.altitude + takeoff_altitude)
+    ] + [
+        SimWaypoint(
+            item.latitude_deg,
+            item.longitude_deg,
+            home.altitude + item.relative_altitude_m,
+            None if math.isnan(item.speed_m_s) else item.speed_m_s,
+            0 if math.isnan(item.loiter_time_s) else item.loiter_time_s,
+        )
+        for item in items
+    ]
+
+
+def simulate(
+    home: Point,
+    waypoints: Sequence[SimWaypoint],
+    speed: float,
+    return_altitude: float,
+    dt: float = DEFAULT_DT,
+    passes: int = 1,
+) -> Simulation:
+    """
+    Simulates a mission from takeoff to landing.
+
+    The vehicle takes off straight up to the first waypoint, flies to each
+    waypoint in turn (hovering at waypoints with a hold time), then returns
+    to launch at ``return_altitude`` and lands.
+
+    Args:
+        home: The home position (AMSL altitude).
+        waypoints: The waypoints, starting with the takeoff point.
+        speed: The default horizontal speed (hover/cruise speed) in meters
+            per second.
+        return_altitude: The return to launch altitude (``RTL_RETURN_ALT``)
+            relative to home in meters.
+        dt: The sampling interval of the trajectory in seconds.
+        passes: The number of passes of the transect.
+
+    Returns:
+        The simulation result.
+    """
+    letters = [chr(ord("A") + i) for i in range(len(waypoints))]
+    leg_names = (
+        ["takeoff"]
+        + [f"{a}-{b}" for a, b in zip(letters, letters[1:])]
+        + ["return", "descend", "land"]
+    )
+
+    lat = np.array(
+        [home.latitude]
+        + [w.latitude for w in waypoints]
+        + [home.latitude, home.latitude, home.latitude]
+    )
+    lon = np.array(
+        [home.longitude]
+        + [w.longitude for w in waypoints]
+        + [home.longitude, home.longitude, home.longitude]
+    )
+    alt = np.array(
+        [home.altitude]
+        + [w.altitude for w in waypoints]
+        + [
+            home.altitude + return_altitude,
+            home.altitude + LAND_ALTITUDE,
+            home.altitude,
+        ]
+    )
+
+    # speed after each waypoint applies to the next leg
+    leg_speed = [speed]
+    for w in waypoints:
+        leg_speed.append(w.speed if w.speed is not None else leg_speed[-1])
+    # the return is flown at the default speed
+    leg_speed[-1] = speed
+    leg_speed += [speed, speed]
+
+    x, y = LocalFrame(home.latitude, home.longitude).to_local(lat, lon)
+    horizontal = np.hypot(np.diff(x), np.diff(y))
+    vertical = np.diff(alt)
+
+    durations = np.maximum(
+        horizontal / np.array(leg_speed),
+        np.where(vertical > 0, vertical / Z_VEL_UP, -vertical / Z_VEL_DOWN),
+    )
+    durations[-1] = -vertical[-1] / LAND_SPEED
+
+    approach_angles = []
+
+    for i in range(passes):
+        try:
+            leg = leg_names.index(pass_legs(i)[0])
+            angle = math.degrees(math.atan2(-vertical[leg], horizontal[leg]))
+        except ValueError:
+            angle = math.nan
+
+        approach_angles.append(angle)
+
+    # hovering is a leg that starts and ends at the same point, waypoint i is
+    # the end of leg i
+    for i in reversed(range(len(waypoints))):
+        if waypoints[i].hold > 0:
+            leg_names.insert(i + 1, f"hold {letters[i]}")
+            durations = np.insert(durations, i + 1, waypoints[i].hold)
+            lat = np.insert(lat, i + 1, lat[i + 1])
+            lon = np.insert(lon, i + 1, lon[i + 1])
+            alt = np.insert(alt, i + 1, alt[i + 1])
+
+    knots = np.concatenate([[0.0], np.cumsum(durations)])
+    time = np.arange(0.0, knots[-1] + dt, dt)
+    time[-1] = min(time[-1], knots[-1])
+
+    return Simulation(
+        time,
+        np.interp(time, knots, lat),
+        np.interp(time, knots, lon),
+        np.interp(time, knots, alt),
+        leg_names,
+        durations,
+        approach_angles,
+    )
+
+
+def simulate_plan(plan: PlanFile, dt: float = DEFAULT_DT) -> Simulation:
+    """
+    Simulates a QGC plan from :func:`sw_mission.create_mission`.
+    """
+    home, waypoints = plan_waypoints(plan)
+    takeoff_altitude = waypoints[0].altitude - home.altitude
+    # the takeoff point, the passes and the return point
+    passes = max(1, (len(waypoints) - 2) // WAYPOINTS_PER_PASS)
+
+    return simulate(
+        home, waypoints, plan.mission.hover_speed, takeoff_altitude, dt, passes
+    )
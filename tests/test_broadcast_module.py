@@ -0,0 +1,255 @@
+import asyncio
+
+import pytest
+
+from benchmarks.broadcast_overhead import bench_listen, bench_subscribe
+from src.skywrangler_web_server.broadcast import (
+    Broadcast,
+    Overflow,
+    Stream,
+    Subscription,
+    SubscriptionOverflow,
+)
+
+
+def test_listen():
+    broadcast = Broadcast()
+    values = []
+
+    assert not broadcast.has_value
+
+    with pytest.raises(LookupError):
+        broadcast.value
+
+    listener = broadcast.listen(values.append)
+    broadcast.publish(1)
+    broadcast.publish(2)
+
+    assert values == [1, 2]
+    assert broadcast.value == 2
+
+    # the latest value is replayed to new listeners
+    late = []
+    broadcast.listen(late.append)
+    broadcast.listen(late.append, replay=False)
+
+    assert late == [2]
+
+    listener.close()
+    listener.close()
+    broadcast.publish(3)
+
+    assert values == [1, 2]
+    assert late == [2, 3, 3]
+
+
+def test_failing_listener():
+    broadcast = Broadcast(0)
+    values = []
+
+    def fail(value):
+        if value:
+            raise ValueError(value)
+
+    broadcast.listen(fail)
+    broadcast.listen(values.append)
+    broadcast.publish(1)
+
+    assert values == [0, 1]
+
+
+def test_subscribe():
+    async def run():
+        broadcast = Broadcast("a")
+        subscription = broadcast.subscribe()
+        received = []
+
+        async def consume():
+            async for value in subscription:
+                received.append(value)
+
+        task = asyncio.create_task(consume())
+        await asyncio.sleep(0)
+        broadcast.publish("b")
+        broadcast.publish("c")
+        await asyncio.sleep(0)
+
+        assert broadcast.consumers == 1
+
+        subscription.close()
+        await task
+
+        assert broadcast.consumers == 0
+
+        return received
+
+    assert asyncio.run(run()) == ["a", "b", "c"]
+
+
+def test_overflow():
+    async def drain(subscription):
+        return [value async for value in subscription]
+
+    for overflow, expected in [
+        (Overflow.DROP_OLDEST, [3, 4]),
+        (Overflow.DROP_NEWEST, [0, 1]),
+    ]:
+        subscription = Subscription(2, overflow)
+
+        for n in range(5):
+            subscription.put(n)
+
+        subscription.close()
+
+        assert asyncio.run(drain(subscription)) == expected
+        assert subscription.dropped == 3
+
+    subscription = Subscription(2, Overflow.CLOSE)
+
+    for n in range(3):
+        subscription.put(n)
+
+    with pytest.raises(SubscriptionOverflow):
+        asyncio.run(drain(subscription))
+
+
+def test_closing_subscription():
+    async def drain(subscription):
+        return [value async for value in subscription]
+
+    broadcast = Broadcast()
+    closing = broadcast.subscribe(1, Overflow.CLOSE)
+    normal = broadcast.subscribe()
+
+    broadcast.publish(1)
+    # closes the first subscription, the second one still gets the value
+    broadcast.publish(2)
+    normal.close()
+
+    with pytest.raises(SubscriptionOverflow):
+        asyncio.run(drain(closing))
+
+    assert asyncio.run(drain(normal)) == [1, 2]
+    assert broadcast.consumers == 0
+
+
+def test_wait_for():
+    async def run():
+        broadcast = Broadcast(1)
+
+        # the latest value matches
+        assert await broadcast.wait_for() == 1
+
+        waiter = asyncio.create_task(broadcast.wait_for(lambda v: v > 2))
+        await asyncio.sleep(0)
+        broadcast.publish(2)
+        broadcast.publish(3)
+        broadcast.publish(4)
+
+        assert await waiter == 3
+
+        cancelled = asyncio.create_task(broadcast.wait_for(lambda v: v > 10))
+        await asyncio.sleep(0)
+
+        assert broadcast.consumers == 1
+
+        cancelled.cancel()
+        await asyncio.sleep(0)
+
+        assert broadcast.consumers == 0
+
+    asyncio.run(run())
+
+
+def test_stream_demand():
+    opened = []
+    rates = []
+
+    async def values():
+        opened.append(True)
+        n = 0
+
+        while True:
+            yield n
+            n += 1
+            await asyncio.sleep(0)
+
+    async def set_rate(rate):
+        rates.append(rate)
+
+    async def run():
+        stream = Stream(values, set_rate, close_delay=0)
+
+        # nothing is listening
+        await asyncio.sleep(0.01)
+        assert not stream.is_open
+
+        slow = stream.listen(lambda _: None, rate=1)
+        fast = stream.subscribe(rate=10)
+
+        assert await stream.wait_for(lambda n: n > 3) > 3
+        assert stream.rate == 10
+
+        # back to the slow rate when the fast consumer leaves
+        fast.close()
+        await asyncio.sleep(0)
+        assert stream.rate == 1
+
+        slow.close()
+        await asyncio.sleep(0.01)
+
+        assert not stream.is_open
+        assert not stream.has_value
+
+        await stream.close()
+
+    asyncio.run(run())
+
+    assert opened == [True]
+    # the first two consumers were added before the rate was set
+    assert rates == [10, 1, 0]
+
+
+def test_stream_reopens():
+    opened = []
+
+    async def values():
+        opened.append(True)
+
+        if len(opened) == 1:
+            yield 1
+            raise RuntimeError("connection lost")
+
+        if len(opened) == 2:
+            # ends without a value
+            return
+
+        n = 2
+
+        while True:
+            yield n
+            n += 1
+            await asyncio.sleep(0)
+
+    async def run():
+        stream = Stream(values, retry_delay=0.001)
+        received = []
+        stream.listen(received.append)
+
+        assert await asyncio.wait_for(stream.wait_for(lambda n: n > 3), 1) > 3
+        assert stream.is_open
+
+        await stream.close()
+
+        return received
+
+    received = asyncio.run(run())
+
+    assert len(opened) == 3
+    assert received[:3] == [1, 2, 3]
+
+
+def test_overhead_benchmark():
+    # the benchmarks check that every consumer got every event
+    assert bench_listen(10, 1000) > 0
+    assert bench_subscribe(10, 1000) > 0
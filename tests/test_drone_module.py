@@ -0,0 +1,227 @@
+import asyncio
+import struct
+from types import SimpleNamespace
+
+import pytest
+from mavsdk.core import ConnectionState
+from mavsdk.mission import MissionItem
+from mavsdk.param import AllParams, FloatParam
+from mavsdk.telemetry import LandedState
+
+from src.skywrangler_web_server.broadcast import Broadcast
+from src.skywrangler_web_server.drone import (
+    NO_VALUE,
+    SAFE_ALTITUDE,
+    Drone,
+    VehicleConfig,
+    compute_mission_items,
+    mission_fingerprint,
+)
+from src.skywrangler_web_server.mission import parse_mission_request
+
+
+class FakeParam:
+    def __init__(self, params, reject=()):
+        self.params = dict(params)
+        self.reject = reject
+        self.get_all_count = 0
+        self.set_calls = []
+
+    async def get_all_params(self):
+        self.get_all_count += 1
+        return AllParams(
+            [], [FloatParam(name, value) for name, value in self.params.items()], []
+        )
+
+    async def set_param_float(self, name, value):
+        self.set_calls.append(name)
+
+        if name not in self.reject:
+            self.params[name] = value
+
+    async def get_param_float(self, name):
+        return self.params[name]
+
+
+def test_vehicle_config_diff():
+    param = FakeParam({"MPC_Z_VEL_MAX_UP": 3.0, "MPC_Z_VEL_MAX_DN": 4.0000001})
+    config = VehicleConfig(param)
+    asyncio.run(config.load())
+
+    assert config.diff(
+        {"MPC_Z_VEL_MAX_UP": 4.0, "MPC_Z_VEL_MAX_DN": 4.0, "MIS_TAKEOFF_ALT": 100}
+    ) == {"MPC_Z_VEL_MAX_UP": 4.0, "MIS_TAKEOFF_ALT": 100}
+
+
+def test_vehicle_config_apply_only_changed():
+    param = FakeParam({"MPC_Z_VEL_MAX_UP": 3.0, "MPC_Z_VEL_MAX_DN": 4.0})
+    config = VehicleConfig(param)
+    profile = {"MPC_Z_VEL_MAX_UP": 4.0, "MPC_Z_VEL_MAX_DN": 4.0}
+
+    async def run():
+        assert await config.apply(profile) == {"MPC_Z_VEL_MAX_UP": 4.0}
+        assert await config.apply(profile) == {}
+
+    asyncio.run(run())
+
+    assert param.get_all_count == 1
+    assert param.set_calls == ["MPC_Z_VEL_MAX_UP"]
+
+
+def test_vehicle_config_apply_rejected():
+    param = FakeParam({"MPC_Z_VEL_MAX_UP": 3.0}, reject=["MPC_Z_VEL_MAX_UP"])
+    config = VehicleConfig(param)
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(config.apply({"MPC_Z_VEL_MAX_UP": 4.0}))
+
+
+def mission_item(latitude, longitude, altitude, speed):
+    return MissionItem(
+        latitude_deg=latitude,
+        longitude_deg=longitude,
+        relative_altitude_m=altitude,
+        speed_m_s=speed,
+        is_fly_through=True,
+        gimbal_pitch_deg=NO_VALUE,
+        gimbal_yaw_deg=NO_VALUE,
+        camera_action=MissionItem.CameraAction.NONE,
+        loiter_time_s=NO_VALUE,
+        camera_photo_interval_s=NO_VALUE,
+        acceptance_radius_m=NO_VALUE,
+        yaw_deg=NO_VALUE,
+        camera_photo_distance_m=NO_VALUE,
+    )
+
+
+def float32(value):
+    return struct.unpack("f", struct.pack("f", value))[0]
+
+
+def test_mission_fingerprint_round_trip():
+    uploaded = [
+        mission_item(35.93212164513, -97.26312492667, 100, 10),
+        mission_item(35.93224479120, -97.26301283304, 13.4807621, 5),
+    ]
+    # what we get back from the vehicle after download
+    downloaded = [
+        mission_item(
+            round(i.latitude_deg * 1e7) / 1e7,
+            round(i.longitude_deg * 1e7) / 1e7,
+            float32(i.relative_altitude_m),
+            float32(i.speed_m_s),
+        )
+        for i in uploaded
+    ]
+
+    assert mission_fingerprint(downloaded) == mission_fingerprint(uploaded)
+
+
+def test_mission_fingerprint_changes():
+    a = [mission_item(35.9321216, -97.2631249, 100, 10)]
+    b = [mission_item(35.9321216, -97.2631249, 100, 5)]
+    c = [mission_item(35.9321217, -97.2631249, 100, 10)]
+
+    assert mission_fingerprint(a) != mission_fingerprint(b)
+    assert mission_fingerprint(a) != mission_fingerprint(c)
+    assert mission_fingerprint(a) != mission_fingerprint(a + a)
+
+
+def test_compute_mission_items():
+    request = parse_mission_request(
+        {
+            "origin": {
+                "latitude": 35.9459702,
+                "longitude": -97.2586730,
+                "elevation": 77.7,
+            },
+            "transect": {"azimuth": 0, "length": 40},
+            "parameters": {"speed": 5, "distance": 30, "angle": 90},
+            "returnPoint": {"latitude": 35.9469702, "longitude": -97.2586730},
+        }
+    )
+
+    items = compute_mission_items(request, home_altitude=80.7)
+
+    assert len(items) == 5
+    assert [i.relative_altitude_m for i in items] == pytest.approx(
+        [SAFE_ALTITUDE, 27, 27, SAFE_ALTITUDE, SAFE_ALTITUDE]
+    )
+    # transect is flown at the requested speed
+    assert items[1].speed_m_s == 5
+    assert items[4].latitude_deg == 35.9469702
+
+
+def test_compute_multi_pass_mission_items():
+    request = parse_mission_request(
+        {
+            "origin": {
+                "latitude": 35.9459702,
+                "longitude": -97.2586730,
+                "elevation": 77.7,
+            },
+            "transect": {"azimuth": 0, "length": 40},
+            "passes": [
+                {"speed": 5, "distance": 30, "angle": 90},
+                {"speed": 3, "distance": 15, "angle": 90},
+            ],
+            "loiterTime": 20,
+            "returnPoint": {"latitude": 35.9469702, "longitude": -97.2586730},
+        }
+    )
+
+    items = compute_mission_items(request, home_altitude=80.7)
+
+    assert len(items) == 9
+    assert [i.relative_altitude_m for i in items] == pytest.approx(
+        [SAFE_ALTITUDE, 27, 27, SAFE_ALTITUDE, SAFE_ALTITUDE, 12, 12, SAFE_ALTITUDE]
+        + [SAFE_ALTITUDE]
+    )
+    assert [i.speed_m_s for i in items][1::4] == [5, 3]
+    # only hovers before the second pass
+    assert items[0].is_fly_through
+    assert not items[4].is_fly_through
+    assert items[4].loiter_time_s == 20
+
+
+def disconnected_drone():
+    async def is_mission_finished():
+        return True
+
+    # a drone without a connection to a vehicle
+    drone = Drone.__new__(Drone)
+    drone.system = SimpleNamespace(
+        mission=SimpleNamespace(is_mission_finished=is_mission_finished)
+    )
+    drone.landed_state = Broadcast(LandedState.ON_GROUND)
+    drone.connection_state = Broadcast(ConnectionState(True))
+
+    return drone
+
+
+def test_wait_mission_complete():
+    drone = disconnected_drone()
+
+    async def run(*states):
+        waiter = asyncio.create_task(drone.wait_mission_complete(0.1))
+
+        for state in states:
+            await asyncio.sleep(0)
+            state[0].publish(state[1])
+
+        return await waiter
+
+    flight = [
+        (drone.landed_state, LandedState.TAKING_OFF),
+        (drone.landed_state, LandedState.IN_AIR),
+        (drone.landed_state, LandedState.LANDING),
+        (drone.landed_state, LandedState.ON_GROUND),
+    ]
+
+    assert asyncio.run(run(*flight))
+
+    with pytest.raises(RuntimeError, match="did not take off"):
+        asyncio.run(run(flight[0]))
+
+    with pytest.raises(RuntimeError, match="lost connection"):
+        asyncio.run(run(*flight[:2], (drone.connection_state, ConnectionState(False))))
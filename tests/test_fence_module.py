@@ -0,0 +1,125 @@
+import numpy as np
+import pytest
+
+from qgc_mission import CircleGeoFence, GeoFence, PolygonGeoFence
+from src.skywrangler_web_server.fence import convex_hull
+from sw_mission import create_mission
+from sw_mission.fence import (
+    FenceChecker,
+    LocalFrame,
+    buffered_fence,
+    check_fence,
+    densify,
+)
+from sw_mission.points import Coordinate2D, Parameters, Point, Transect
+
+FRAME = LocalFrame(35.93, -97.26)
+
+
+def square(size, center=(0, 0), enabled=True):
+    x = center[0] + np.array([-1, -1, 1, 1]) * size / 2
+    y = center[1] + np.array([-1, 1, 1, -1]) * size / 2
+    lat, lon = FRAME.to_global(x, y)
+    return PolygonGeoFence(list(zip(lat, lon)), enabled=enabled)
+
+
+def test_local_frame_round_trip():
+    x, y = FRAME.to_local(35.931, -97.261)
+    lat, lon = FRAME.to_global(x, y)
+
+    assert y == pytest.approx(111.2, abs=0.1)
+    assert (lat, lon) == pytest.approx((35.931, -97.261))
+
+
+def test_densify():
+    x, y, leg = densify([0, 10, 10], [0, 0, 3], 5)
+
+    assert list(leg) == [0, 0, 0, 1, 1]
+    assert list(x) == [0, 5, 10, 10, 10]
+    assert list(y) == [0, 0, 0, 0, 3]
+
+
+def test_convex_hull():
+    x = [0, 1, 1, 0, 0.5]
+    y = [0, 0, 1, 1, 0.5]
+
+    assert sorted(convex_hull(x, y)) == [0, 1, 2, 3]
+
+
+def test_contains():
+    fence = GeoFence(
+        polygons=[square(200), square(50, enabled=False)],
+        circles=[CircleGeoFence(FRAME.to_global(300, 0), 50)],
+    )
+    checker = FenceChecker(fence, FRAME)
+
+    lat, lon = FRAME.to_global([75, 0, 150, 320, 400], [0, 0, 0, 0, 0])
+
+    assert list(checker.contains(lat, lon)) == [True, False, False, True, False]
+
+
+def test_check_path_concave():
+    # U shape, a leg across the gap has both ends inside
+    x = np.array([0, 0, 100, 100, 80, 80, 20, 20])
+    y = np.array([0, 100, 100, 0, 0, 90, 90, 0])
+    lat, lon = FRAME.to_global(x, y)
+    fence = GeoFence(polygons=[PolygonGeoFence(list(zip(lat, lon)))])
+    checker = FenceChecker(fence, FRAME)
+
+    lat, lon = FRAME.to_global([10, 10, 90, 90], [10, 95, 95, 10])
+    assert list(checker.check_path(lat, lon)) == [True, True, True]
+
+    lat, lon = FRAME.to_global([10, 90], [10, 10])
+    assert list(checker.check_path(lat, lon, spacing=1000)) == [False]
+
+
+def test_check_path_many_vertices():
+    t = np.linspace(0, 2 * np.pi, 5000, endpoint=False)
+    lat, lon = FRAME.to_global(500 * np.cos(t), 500 * np.sin(t))
+    checker = FenceChecker(
+        GeoFence(polygons=[PolygonGeoFence(list(zip(lat, lon)))]), FRAME
+    )
+
+    lat, lon = FRAME.to_global([0, 400, 0, 600], [0, 0, 400, 0])
+
+    assert list(checker.check_path(lat, lon)) == [True, True, False]
+
+
+def test_buffered_fence():
+    path = list(zip(*FRAME.to_global([0, 100, 100], [0, 0, 50])))
+    fence = GeoFence(polygons=[buffered_fence(path, buffer=30)])
+    checker = FenceChecker(fence, FRAME)
+
+    lat, lon = FRAME.to_global([-29, 129, 100, 50, -31], [0, 0, 79, 25, 0])
+
+    assert list(checker.contains(lat, lon)) == [True, True, True, True, False]
+    check_fence(fence, path)
+
+
+def test_create_mission_geo_fence():
+    args = dict(
+        launch=Point(35.9301904295499, -97.26450295241108, 307.0),
+        origin=Point(35.932121645130756, -97.2631249266781, 304.0),
+        transect=Transect(azimuth=-85.0, length=100.0),
+        parameters=Parameters(speed=5, distance=30, angle=60),
+        return_point=Coordinate2D(35.934456813161006, -97.2646272318608),
+    )
+
+    plan = create_mission(**args)
+
+    assert len(plan.geo_fence.polygons) == 1
+    assert plan.geo_fence.polygons[0].enabled
+
+    # exclusion zone around the origin (the enclosure) is kept and checked
+    enclosure = CircleGeoFence((35.932121645130756, -97.2631249266781), 10, False)
+    plan = create_mission(**args, geo_fence=GeoFence(circles=[enclosure]))
+
+    assert plan.geo_fence.circles == [enclosure]
+
+    with pytest.raises(ValueError, match="leaves the geofence"):
+        create_mission(
+            **args,
+            geo_fence=GeoFence(
+                circles=[CircleGeoFence(enclosure.center, 100, enabled=False)]
+            ),
+        )
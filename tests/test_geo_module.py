@@ -1,6 +1,8 @@
 import math
 
 from src.skywrangler_web_server.geo import (
+    _find_utm_crs,
+    _query_utm_crs,
     angle_and_height_to_distance,
     diagonal_point,
     latlon_to_utm,
@@ -21,6 +23,34 @@ def test_conversion():
     assert math.isclose(lon, -121.9961280, rel_tol=1e-7)
 
 
+def test_utm_zone_cache():
+    points = [
+        # inside zones, both hemispheres
+        (35.9301904, -97.2645029),
+        (37.4137157, -121.9961280),
+        (-33.8688, 151.2093),
+        (-0.5, 0.5),
+        (55.9, 179.9),
+        (-79.9, -179.9),
+        # zone boundaries and the exceptions around Norway and Svalbard are
+        # looked up in the database
+        (35.93, -96.0),
+        (60.4, 5.3),
+        (78.2, 15.6),
+    ]
+
+    for latitude, longitude in points:
+        crs = _find_utm_crs(latitude, longitude)
+
+        assert crs == _query_utm_crs(latitude, longitude)
+        assert crs == _find_utm_crs(latitude, longitude)
+
+        x, y, t = latlon_to_utm(latitude, longitude)
+        lat, lon = utm_to_latlon(x, y, t)
+        assert math.isclose(lat, latitude, abs_tol=1e-7)
+        assert math.isclose(lon, longitude, abs_tol=1e-7)
+
+
 def test_alt_conversion():
     alt = origin_alt_to_takeoff_alt(5, 998, 1000)
     assert alt == 3
@@ -0,0 +1,92 @@
+import pytest
+
+from qgc_mission.enums import Command
+from src.skywrangler_web_server.drone import (
+    SAFE_ALTITUDE,
+    compute_mission_items,
+    mission_items,
+    parse_mission,
+)
+from src.skywrangler_web_server.ir import CompiledMission, compile_mission
+from src.skywrangler_web_server.mission import parse_mission_request
+from sw_mission import compile_multi_pass_mission, create_mission
+from sw_mission.points import Coordinate2D, Parameters, Point, Transect
+
+LAUNCH = Point(35.9301904295499, -97.26450295241108, 307.0)
+MISSION = {
+    "origin": {
+        "latitude": 35.932121645130756,
+        "longitude": -97.2631249266781,
+        "elevation": 304.0,
+    },
+    "transect": {"azimuth": -85.0, "length": 100.0},
+    "parameters": {"speed": 5, "distance": 30, "angle": 60},
+    "returnPoint": {"latitude": 35.934456813161006, "longitude": -97.2646272318608},
+}
+
+
+def test_compile_mission():
+    mission = compile_mission(parse_mission_request(MISSION), LAUNCH.altitude)
+
+    assert [w.name for w in mission.waypoints] == ["B", "C", "D", "E", "F"]
+    assert mission.waypoints[0].altitude == LAUNCH.altitude + SAFE_ALTITUDE
+    # transect at 30 m distance and 60 degrees above the origin
+    assert mission.waypoints[1].altitude == pytest.approx(304 + 30 * 3**0.5 / 2)
+    assert [w.speed for w in mission.waypoints] == [10, 5, 10, 10, 10]
+    # cached
+    assert compile_mission(parse_mission_request(MISSION), LAUNCH.altitude) is mission
+
+
+def test_planner_and_server_share_geometry():
+    compiled = compile_multi_pass_mission(
+        launch=LAUNCH,
+        origin=Point(35.932121645130756, -97.2631249266781, 304.0),
+        transect=Transect(azimuth=-85.0, length=100.0),
+        passes=[Parameters(speed=5, distance=30, angle=60)],
+        return_point=Coordinate2D(35.934456813161006, -97.2646272318608),
+    )
+    plan = create_mission(
+        launch=LAUNCH,
+        origin=Point(35.932121645130756, -97.2631249266781, 304.0),
+        transect=Transect(azimuth=-85.0, length=100.0),
+        parameters=Parameters(speed=5, distance=30, angle=60),
+        return_point=Coordinate2D(35.934456813161006, -97.2646272318608),
+    )
+    items = compute_mission_items(parse_mission_request(MISSION), LAUNCH.altitude)
+
+    waypoints = [
+        item.params
+        for item in plan.mission.items
+        if item.command == Command.NAV_WAYPOINT
+    ]
+    speeds = [
+        item.params.speed
+        for item in plan.mission.items
+        if item.command == Command.DO_CHANGE_SPEED
+    ]
+
+    assert compiled == compile_mission(parse_mission_request(MISSION), LAUNCH.altitude)
+    assert [(w.latitude, w.longitude) for w in waypoints] == [
+        (i.latitude_deg, i.longitude_deg) for i in items
+    ]
+    assert [w.altitude - LAUNCH.altitude for w in waypoints] == pytest.approx(
+        [i.relative_altitude_m for i in items]
+    )
+    # transect at the requested speed, then back to the default speed
+    assert speeds == [5, 10]
+
+
+def test_fly_compiled_mission():
+    mission = compile_mission(parse_mission_request(MISSION), LAUNCH.altitude)
+
+    parsed = parse_mission(mission.to_json())
+
+    assert parsed == mission
+    assert not isinstance(parse_mission(MISSION), CompiledMission)
+
+    # flown from a home position 2 m higher than planned, the waypoints keep
+    # their altitude above sea level
+    items = mission_items(parsed, LAUNCH.altitude + 2)
+    assert items[1].relative_altitude_m == pytest.approx(
+        mission.waypoints[1].altitude - LAUNCH.altitude - 2
+    )
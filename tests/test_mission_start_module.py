@@ -0,0 +1,29 @@
+import asyncio
+
+from benchmarks.mission_start import benchmark, summary
+
+RPC_LATENCY = 0.005
+
+
+def check_runs(cold):
+    runs = asyncio.run(benchmark(4, RPC_LATENCY, cold=cold))
+
+    # arm and start, set return to launch and upload (or reset the current
+    # item), everything else must not wait for the vehicle; the first run
+    # also configures the vehicle
+    assert [r.rpc_calls for r in runs[1:]] == [4, 4, 4]
+
+    return summary(runs[1:])
+
+
+def test_cold_mission_start():
+    result = check_runs(cold=True)
+
+    assert "upload_mission" in result["stages"]
+    assert "compile_mission" in result["stages"]
+
+
+def test_warm_mission_start():
+    result = check_runs(cold=False)
+
+    assert "set_current_mission_item" in result["stages"]
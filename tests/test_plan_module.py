@@ -0,0 +1,225 @@
+import asyncio
+import json
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+
+from qgc_mission import QgcJSONEncoder
+from src.skywrangler_web_server.api import routes
+from src.skywrangler_web_server.drone import mission_items, parse_mission
+from src.skywrangler_web_server.fence import FenceCircle, FencePolygon
+from src.skywrangler_web_server.ir import CompiledMission, MissionWaypoint
+from src.skywrangler_web_server.plan import (
+    PlanStore,
+    mission_plan,
+    plan_file,
+    plan_mission,
+)
+from sw_mission import compile_multi_pass_mission, create_multi_pass_mission
+from sw_mission.points import Coordinate2D, Parameters, Point, Transect
+
+MISSION_ARGS = dict(
+    launch=Point(35.9301904295499, -97.26450295241108, 307.0),
+    origin=Point(35.932121645130756, -97.2631249266781, 304.0),
+    transect=Transect(azimuth=-85.0, length=100.0),
+    passes=[
+        Parameters(speed=5, distance=30, angle=60),
+        Parameters(speed=3, distance=15, angle=60),
+    ],
+    return_point=Coordinate2D(35.934456813161006, -97.2646272318608),
+    loiter_time=20,
+)
+
+
+def plan_json():
+    plan = create_multi_pass_mission(**MISSION_ARGS)
+    return json.loads(json.dumps(plan, cls=QgcJSONEncoder))
+
+
+def test_plan_mission():
+    compiled = compile_multi_pass_mission(**MISSION_ARGS)
+    plan = plan_json()
+
+    mission = plan_mission(plan)
+
+    # same as what the planner compiled, so the server flies exactly that
+    assert mission._replace(fences=()) == compiled
+    # and keeps the vehicle inside the planner's fence
+    (polygon,) = plan["geoFence"]["polygons"]
+    assert mission.fences == (FencePolygon(tuple(map(tuple, polygon["polygon"]))),)
+    assert [w.hold for w in mission.waypoints][4] == 20
+    assert parse_mission(plan_json()) == mission
+
+    items = mission_items(mission, home_altitude=307.0)
+    assert [i.speed_m_s for i in items][1::4] == [5, 3]
+    assert not items[4].is_fly_through
+
+
+@pytest.mark.parametrize(
+    "change, message",
+    [
+        (lambda p: p.update(fileType="Mission"), "not a QGC plan"),
+        (lambda p: p.update(mission=[]), "no mission"),
+        (lambda p: p["mission"].update(items={}), "no mission"),
+        (lambda p: p["mission"].update(plannedHomePosition=None), "home position"),
+        (lambda p: p["mission"]["items"].insert(1, 42), "only simple items"),
+        (lambda p: p["mission"]["items"].pop(0), "waypoint before takeoff"),
+        (
+            lambda p: p["mission"]["items"][0]["params"].__setitem__(6, 50),
+            "takeoff altitude",
+        ),
+        (
+            lambda p: p["mission"]["items"][1]["params"].__setitem__(4, 91),
+            "invalid position",
+        ),
+        (lambda p: p["mission"]["items"][1].update(command=21), "unsupported"),
+        (
+            lambda p: p["mission"]["items"].append(p["mission"]["items"][1]),
+            "must be the last item",
+        ),
+        (lambda p: p.update(geoFence=[]), "invalid geofence"),
+        (lambda p: p["geoFence"].update(polygons={}), "invalid geofence"),
+        (
+            lambda p: p["geoFence"]["polygons"][0]["polygon"].__delitem__(
+                slice(2, None)
+            ),
+            "at least 3 points",
+        ),
+        (
+            lambda p: p["geoFence"]["polygons"][0]["polygon"][0].append(10),
+            "polygon 1: point 1 is not a point",
+        ),
+        (
+            lambda p: p["geoFence"]["polygons"][0].update(inclusion="yes"),
+            "not a boolean",
+        ),
+        (
+            lambda p: p["geoFence"]["circles"].append({"circle": None}),
+            "circle 1: has no circle",
+        ),
+        (
+            lambda p: p["geoFence"]["circles"].append(
+                {"circle": {"center": [35.93, -97.26], "radius": 0}}
+            ),
+            "radius must be positive",
+        ),
+    ],
+)
+def test_plan_mission_invalid(change, message):
+    plan = plan_json()
+    change(plan)
+
+    with pytest.raises(ValueError, match=message):
+        plan_mission(plan)
+
+
+def test_plan_mission_not_an_object():
+    with pytest.raises(ValueError, match="not a QGC plan"):
+        plan_mission([])
+
+
+def test_plan_store(tmp_path):
+    store = PlanStore(tmp_path / "plans")
+    mission = store.add("skywrangler_s5_a60_d30+s3_a60_d15", plan_json())
+
+    with pytest.raises(ValueError):
+        store.add("../escape", plan_json())
+
+    with pytest.raises(KeyError):
+        store.get("missing")
+
+    # survives a restart
+    reloaded = PlanStore(tmp_path / "plans")
+    assert reloaded.ids() == ["skywrangler_s5_a60_d30+s3_a60_d15"]
+    assert reloaded.get("skywrangler_s5_a60_d30+s3_a60_d15") == mission
+
+
+def test_handle_plan_put():
+    app = web.Application()
+    app["plans"] = PlanStore(None)
+    app.add_routes(routes)
+
+    malformed = plan_json()
+    malformed["mission"]["items"] = {"type": "SimpleItem"}
+
+    async def run():
+        async with TestClient(TestServer(app)) as client:
+            statuses = []
+
+            for body in [plan_json(), [], malformed, "{"]:
+                data = body if isinstance(body, str) else json.dumps(body)
+                response = await client.put("/api/plans/test", data=data)
+                statuses.append(response.status)
+
+            return statuses
+
+    assert asyncio.run(run()) == [200, 400, 400, 400]
+
+
+def test_mission_plan():
+    compiled = compile_multi_pass_mission(**MISSION_ARGS)
+    launch = MISSION_ARGS["launch"]
+    home = (launch.latitude, launch.longitude)
+
+    plan = mission_plan(compiled, home)
+    expected = plan_json()
+
+    # the same as the planner, except for the geofence that is added to the
+    # plan and not to the compiled mission
+    assert plan["mission"] == expected["mission"]
+    assert plan_mission(plan) == compiled
+
+    # the fences of uploaded plans are kept
+    mission = plan_mission(expected)
+    assert mission_plan(mission, home)["geoFence"] == expected["geoFence"]
+
+    encoded = plan_file(compiled, home)
+    assert json.loads(encoded.body) == plan
+    assert plan_file(compiled, home) is encoded
+
+    # a different mission has a different ETag
+    other = compiled._replace(speed=8)
+    assert plan_file(other, home).etag != encoded.etag
+
+
+def test_mission_plan_speed_changes():
+    # the last speed change is not the default speed
+    mission = CompiledMission(
+        307.0,
+        (
+            MissionWaypoint("B", 35.931, -97.264, 407.0, 10.0),
+            MissionWaypoint("C", 35.932, -97.263, 330.0, 3.0),
+            MissionWaypoint("D", 35.933, -97.263, 330.0, 3.0),
+        ),
+        speed=10.0,
+    )
+    plan = mission_plan(mission, (35.93, -97.264))
+    round_trip = plan_mission(plan)
+
+    assert plan["mission"]["hoverSpeed"] == 10.0
+    assert round_trip.speed == 10.0
+    assert round_trip == mission
+    assert mission_plan(round_trip, (35.93, -97.264)) == plan
+
+
+def test_mission_plan_fences():
+    mission = CompiledMission(
+        307.0,
+        (MissionWaypoint("B", 35.931, -97.264, 407.0, 10.0),),
+        # plans list the polygons before the circles
+        fences=(
+            FencePolygon(
+                ((35.931, -97.2641), (35.9311, -97.264), (35.931, -97.2639)), False
+            ),
+            FenceCircle((35.93, -97.264), 500.0),
+        ),
+    )
+    plan = mission_plan(mission, (35.93, -97.264))
+
+    assert len(plan["geoFence"]["circles"]) == len(plan["geoFence"]["polygons"]) == 1
+    assert plan_mission(plan) == mission
+    # the mission JSON keeps them too
+    assert (
+        CompiledMission.from_json(json.loads(json.dumps(mission.to_json()))) == mission
+    )
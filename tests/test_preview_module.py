@@ -0,0 +1,145 @@
+import asyncio
+import json
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+
+from src.skywrangler_web_server.api import routes
+from src.skywrangler_web_server.drone import (
+    SAFE_ALTITUDE,
+    Drone,
+    HomeUnknownError,
+    MissingElevationError,
+)
+from src.skywrangler_web_server.preview import mission_preview, normalize_home
+from src.skywrangler_web_server.mission import parse_mission_request
+
+HOME = {"latitude": 35.9301904, "longitude": -97.2645029, "altitude": 307.0}
+MISSION = {
+    "origin": {
+        "latitude": 35.932121645130756,
+        "longitude": -97.2631249266781,
+        "elevation": 304.0,
+    },
+    "transect": {"azimuth": -85.0, "length": 100.0},
+    "parameters": {"speed": 5, "distance": 30, "angle": 60},
+    "returnPoint": {"latitude": 35.934456813161006, "longitude": -97.2646272318608},
+}
+
+
+def test_mission_preview():
+    home = normalize_home(**HOME)
+    preview = json.loads(mission_preview(parse_mission_request(MISSION), home))
+
+    points = [f for f in preview["features"] if f["geometry"]["type"] == "Point"]
+    legs = [f for f in preview["features"] if f["geometry"]["type"] == "LineString"]
+
+    assert preview["type"] == "FeatureCollection"
+    assert [p["properties"]["name"] for p in points] == list("ABCDEF")
+    assert [leg["properties"]["name"] for leg in legs] == [
+        "A-B",
+        "B-C",
+        "C-D",
+        "D-E",
+        "E-F",
+        "F-A",
+    ]
+    assert points[0]["properties"]["relativeAltitude"] == SAFE_ALTITUDE
+    assert points[0]["geometry"]["coordinates"] == [
+        HOME["longitude"],
+        HOME["latitude"],
+        HOME["altitude"] + SAFE_ALTITUDE,
+    ]
+    # descends at the requested angle and flies the transect at the
+    # requested speed
+    assert legs[1]["properties"]["angle"] == pytest.approx(-60, abs=0.5)
+    assert legs[2]["properties"]["speed"] == 5
+    assert legs[2]["properties"]["length"] == pytest.approx(100, rel=1e-2)
+
+
+def test_mission_preview_is_cached():
+    home = normalize_home(**HOME)
+    # same parameters with different types and a home position that differs
+    # by less than the vehicle can report
+    other = json.loads(json.dumps(MISSION))
+    other["parameters"]["speed"] = 5.0
+    other_home = normalize_home(HOME["latitude"] + 1e-9, HOME["longitude"], 307)
+
+    assert mission_preview(parse_mission_request(MISSION), home) is mission_preview(
+        parse_mission_request(other), other_home
+    )
+
+
+def test_preview_missions():
+    # a drone without a connection to a vehicle
+    drone = Drone.__new__(Drone)
+    drone.terrain = None
+    drone._home = None
+
+    async def run(missions, home):
+        return await drone.preview_missions(missions, home)
+
+    previews = asyncio.run(
+        run([MISSION, dict(MISSION, transect={"azimuth": 0, "length": 50})], HOME)
+    )
+
+    assert len(previews) == 2
+    assert previews[0] != previews[1]
+
+    with pytest.raises(HomeUnknownError):
+        asyncio.run(run([MISSION], None))
+
+    # origin elevation is needed without a terrain model
+    no_elevation = json.loads(json.dumps(MISSION))
+    del no_elevation["origin"]["elevation"]
+
+    with pytest.raises(MissingElevationError):
+        asyncio.run(run([no_elevation], HOME))
+
+
+def test_handle_preview_errors():
+    # a drone without a connection to a vehicle
+    drone = Drone.__new__(Drone)
+    drone.terrain = None
+    drone._home = None
+
+    app = web.Application()
+    app["drone"] = drone
+    app.add_routes(routes)
+
+    no_elevation = json.loads(json.dumps(MISSION))
+    del no_elevation["origin"]["elevation"]
+
+    async def run():
+        async with TestClient(TestServer(app)) as client:
+            statuses = []
+
+            for path, body in [
+                ("/api/mission/preview", dict(MISSION, home=HOME)),
+                # the vehicle has not reported its home position yet
+                ("/api/mission/preview", MISSION),
+                ("/api/mission/preview/batch", {"missions": [MISSION]}),
+                # no terrain model for the elevation
+                ("/api/mission/preview", dict(no_elevation, home=HOME)),
+                # invalid home positions
+                ("/api/mission/preview", dict(MISSION, home=[1, 2, 3])),
+                ("/api/mission/preview", dict(MISSION, home=dict(HOME, altitude="x"))),
+                (
+                    "/api/mission/preview/batch",
+                    {"missions": [MISSION], "home": dict(HOME, latitude=None)},
+                ),
+            ]:
+                response = await client.post(path, json=body)
+                statuses.append(response.status)
+
+            for params in [
+                {"mission": json.dumps(MISSION)},
+                {"mission": json.dumps(MISSION), "home": "[]"},
+            ]:
+                response = await client.get("/api/mission/plan", params=params)
+                statuses.append(response.status)
+
+            return statuses
+
+    assert asyncio.run(run()) == [200, 409, 409, 400, 400, 400, 400, 409, 400]
@@ -0,0 +1,51 @@
+import json
+
+import pytest
+
+from sw_mission.points import Parameters
+from sw_mission.schedule import BatteryModel, estimate_run, pack_runs, schedule
+
+with open("mission-data.json") as f:
+    MISSION_DATA = json.load(f)
+
+
+def test_pack_runs():
+    energies = [5, 6, 2, 4, 3]
+
+    assert pack_runs(energies, 10) == [[0, 2, 4], [1, 3]]
+    assert pack_runs(energies, 20) == [[0, 1, 2, 3, 4]]
+    assert pack_runs([], 10) == []
+
+    with pytest.raises(ValueError):
+        pack_runs(energies, 5.5)
+
+
+def test_estimate_run():
+    battery = BatteryModel()
+    slow = estimate_run(
+        MISSION_DATA, Parameters(speed=2, distance=30, angle=30), battery
+    )
+    fast = estimate_run(
+        MISSION_DATA, Parameters(speed=8, distance=30, angle=30), battery
+    )
+
+    assert slow.duration > fast.duration
+    assert slow.energy > fast.energy
+    # at least the energy for hovering for the whole flight
+    assert fast.energy > battery.hover_power * fast.duration / 3600
+
+
+def test_schedule():
+    mission_data = dict(
+        MISSION_DATA, variables={"speed": [2, 8], "angle": [60], "distance": [30]}
+    )
+    battery = BatteryModel()
+
+    result = schedule(mission_data, battery)
+
+    runs = [run for b in result["batteries"] for run in b["runs"]]
+    assert len(runs) == 2
+    assert all(b["energy"] <= battery.usable for b in result["batteries"])
+    assert result["duration"] == pytest.approx(sum(run["duration"] for run in runs))
+    assert runs[0]["mission"]["parameters"] == {"speed": 2, "distance": 30, "angle": 60}
+    json.dumps(result)
@@ -0,0 +1,137 @@
+import asyncio
+import json
+
+from src.skywrangler_web_server.sequencer import (
+    ABORTED,
+    ACTIVE,
+    DONE,
+    FAILED,
+    PENDING,
+    Run,
+    Sequencer,
+    sweep_runs,
+)
+
+with open("mission-data.json") as f:
+    SWEEP = json.load(f)
+
+
+class FakeDrone:
+    def __init__(self, completed):
+        self.completed = list(completed)
+        self.launched = []
+        self.precomputed = []
+
+    async def prepare_mission(self, mission):
+        self.prepared = mission
+
+    async def launch_mission(self):
+        self.launched.append(self.prepared)
+
+    async def precompute_mission(self, mission):
+        self.precomputed.append(mission)
+
+        if mission.get("invalid"):
+            raise ValueError("invalid mission")
+
+    async def wait_mission_complete(self):
+        return self.completed.pop(0)
+
+
+def test_sweep_runs():
+    runs = sweep_runs(SWEEP)
+
+    assert len(runs) == 3 * 3 * 4
+    assert runs[0].status == PENDING
+    assert runs[0].mission["parameters"] == {"speed": 2, "distance": 30, "angle": 30}
+    assert runs[1].mission["parameters"] == {"speed": 2, "distance": 15, "angle": 30}
+    assert runs[0].mission["origin"]["elevation"] == SWEEP["origin"]["altitude"]
+    assert runs[0].mission["returnPoint"]["latitude"] == SWEEP["away"]["latitude"]
+
+
+def test_sequencer_runs_until_aborted(tmp_path):
+    state_path = tmp_path / "sequencer.json"
+    drone = FakeDrone([True, True, False])
+
+    async def run():
+        sequencer = Sequencer(drone, state_path)
+        sequencer.load_sweep(SWEEP)
+        sequencer.start()
+        await sequencer._task
+        return sequencer
+
+    sequencer = asyncio.run(run())
+    statuses = [r["status"] for r in sequencer.status()["runs"]]
+
+    assert statuses[:4] == [DONE, DONE, ABORTED, PENDING]
+    assert len(drone.launched) == 3
+    # next run is computed while the current one flies
+    assert drone.precomputed[0] == drone.launched[1]
+
+    # state survives a restart
+    reloaded = Sequencer(drone, state_path)
+    assert reloaded.status() == sequencer.status()
+
+
+def test_sequencer_restart_resets_active_run(tmp_path):
+    state_path = tmp_path / "sequencer.json"
+    runs = [Run({}, DONE)._asdict(), Run({}, ACTIVE)._asdict()]
+    state_path.write_text(json.dumps({"runs": runs}))
+
+    sequencer = Sequencer(FakeDrone([]), state_path)
+
+    assert not sequencer.is_running
+    assert [r["status"] for r in sequencer.status()["runs"]] == [DONE, PENDING]
+
+
+def test_sequencer_pauses_for_battery_swap():
+    schedule = {
+        "batteries": [
+            {"runs": [{"mission": {"n": 0}}, {"mission": {"n": 1}}]},
+            {"runs": [{"mission": {"n": 2}}]},
+        ]
+    }
+    drone = FakeDrone([True, True, True])
+
+    async def run():
+        sequencer = Sequencer(drone, None)
+        sequencer.load_sweep(schedule)
+        sequencer.start()
+        await sequencer._task
+        statuses = [r["status"] for r in sequencer.status()["runs"]]
+        # resumes with the next battery
+        sequencer.start()
+        await sequencer._task
+        return statuses
+
+    statuses = asyncio.run(run())
+
+    assert statuses == [DONE, DONE, PENDING]
+    assert drone.launched == [{"n": 0}, {"n": 1}, {"n": 2}]
+
+
+def test_sequencer_precompute_error():
+    drone = FakeDrone([True, True])
+
+    async def prepare_mission(mission):
+        if mission.get("invalid"):
+            raise ValueError("invalid mission")
+
+        drone.prepared = mission
+
+    drone.prepare_mission = prepare_mission
+    schedule = {"batteries": [{"runs": [{"mission": {}}, {"mission": {"invalid": 1}}]}]}
+
+    async def run():
+        sequencer = Sequencer(drone, None)
+        sequencer.load_sweep(schedule)
+        sequencer.start()
+        await sequencer._task
+        return sequencer.status()["runs"]
+
+    runs = asyncio.run(run())
+
+    # the flying run still waits for landing, the next one fails to prepare
+    assert [r["status"] for r in runs] == [DONE, FAILED]
+    assert runs[1]["error"] == "invalid mission"
+    assert drone.completed == [True]
@@ -0,0 +1,29 @@
+import os
+import socket
+import stat
+
+from src.skywrangler_web_server.server import systemd_socket, unix_socket
+
+
+def test_systemd_socket_not_activated(monkeypatch):
+    monkeypatch.delenv("LISTEN_PID", raising=False)
+    assert systemd_socket() is None
+
+    # LISTEN_* for some other process, e.g. inherited from a parent
+    monkeypatch.setenv("LISTEN_PID", str(os.getpid() + 1))
+    monkeypatch.setenv("LISTEN_FDS", "1")
+    assert systemd_socket() is None
+
+
+def test_unix_socket_replaces_stale_socket(tmp_path):
+    path = tmp_path / "web.sock"
+
+    unix_socket(path).close()
+    sock = unix_socket(path)
+
+    try:
+        assert sock.family == socket.AF_UNIX
+        assert stat.S_ISSOCK(path.stat().st_mode)
+        assert stat.S_IMODE(path.stat().st_mode) == 0o666
+    finally:
+        sock.close()
@@ -0,0 +1,166 @@
+import asyncio
+
+from mavsdk.mission import MissionPlan
+from mavsdk.telemetry import LandedState, Position
+
+from src.skywrangler_web_server.drone import (
+    VEHICLE_PROFILE,
+    Drone,
+    compute_mission_items,
+)
+from src.skywrangler_web_server.fence import FenceCircle
+from src.skywrangler_web_server.ir import compile_mission
+from src.skywrangler_web_server.mission import parse_mission_request
+from src.skywrangler_web_server.sim import (
+    SimConfig,
+    SimulatedSystem,
+    load_recording,
+    record_telemetry,
+)
+from src.skywrangler_web_server.watchdog import LEFT_FENCE, POSITION_RATE
+
+from .test_preview_module import MISSION
+
+HOME = SimConfig().home
+
+
+def test_simulated_flight():
+    async def fly():
+        system = SimulatedSystem(SimConfig(rate=10, speedup=2000))
+        drone = Drone(system=system)
+
+        try:
+            while not drone.is_connected:
+                await asyncio.sleep(0.01)
+
+            await drone.fly_mission(MISSION)
+            rate = system.telemetry.rates["position"]
+            completed = await drone.wait_mission_complete()
+            await asyncio.sleep(0)
+            subscribers = {
+                name: topic.subscribers
+                for name, topic in system.telemetry.topics.items()
+            }
+        finally:
+            await drone.cancel_all_tasks()
+            system.close()
+
+        return drone, system, completed, rate, subscribers
+
+    drone, system, completed, rate, subscribers = asyncio.run(fly())
+
+    assert completed
+    # the watchdog requests a higher position rate while the mission is flying
+    assert rate == POSITION_RATE
+    assert system.telemetry.rates["position"] == 0.0
+    # streams without consumers are not opened
+    assert subscribers["home"] == 1
+    assert subscribers["armed"] == subscribers["battery"] == 0
+    assert drone.watchdog is not None
+    assert drone.watchdog.violation is None
+    assert drone.watchdog.samples > 0
+    for name, value in VEHICLE_PROFILE.items():
+        assert system.param.values[name] == value
+
+
+def test_simulated_flight_leaves_fence():
+    # the fence only covers the takeoff, the vehicle leaves it on the way to B
+    mission = compile_mission(parse_mission_request(MISSION), HOME[2])._replace(
+        fences=(FenceCircle(HOME[:2], 40),)
+    )
+
+    async def fly():
+        system = SimulatedSystem(SimConfig(rate=10, speedup=200))
+        drone = Drone(system=system)
+
+        try:
+            while not drone.is_connected:
+                await asyncio.sleep(0.01)
+
+            await drone.fly_mission(mission)
+            completed = await drone.wait_mission_complete()
+        finally:
+            await drone.cancel_all_tasks()
+            system.close()
+
+        return drone, system, completed
+
+    drone, system, completed = asyncio.run(fly())
+
+    # returned to launch and landed before reaching the end of the transect
+    assert not completed
+    assert system._landed_state == LandedState.ON_GROUND
+    assert system.mission.current < 3
+    assert drone.watchdog is not None
+    assert drone.watchdog.violation == LEFT_FENCE
+    assert [t.name for t in drone.traces][-1] == "watchdog"
+
+
+def fly_steps(rate):
+    system = SimulatedSystem(SimConfig(rate=rate))
+    items = compute_mission_items(parse_mission_request(MISSION), HOME[2])
+
+    async def start():
+        await system.mission.upload_mission(MissionPlan(items))
+        await system.mission.set_return_to_launch_after_mission(True)
+        await system.action.arm()
+        await system.mission.start_mission()
+
+    asyncio.run(start())
+
+    positions = []
+    system.step(1 / rate)
+
+    while system._landed_state != LandedState.ON_GROUND:
+        system.step(1 / rate)
+        positions.append(system.telemetry.topics["position"]._value)
+
+    return system, positions
+
+
+def test_simulated_flight_is_deterministic():
+    system, positions = fly_steps(rate=100)
+    _, again = fly_steps(rate=100)
+
+    assert [vars(p) for p in positions] == [vars(p) for p in again]
+    assert asyncio.run(system.mission.is_mission_finished())
+
+    # takes off to the safe altitude and lands at home
+    assert max(p.relative_altitude_m for p in positions) >= 100
+    assert positions[-1].relative_altitude_m == 0
+    assert positions[-1].latitude_deg == HOME[0]
+
+
+def test_record_and_replay(tmp_path):
+    path = tmp_path / "telemetry.jsonl"
+
+    async def record():
+        system = SimulatedSystem(SimConfig(rate=100))
+        await system.connect()
+
+        try:
+            return await record_telemetry(system, path, 0.2)
+        finally:
+            system.close()
+
+    count = asyncio.run(record())
+    records = load_recording(path)
+
+    assert len(records) == count
+    assert {"position", "home", "battery", "landed_state"} <= {r[1] for r in records}
+    assert all(isinstance(r[2], Position) for r in records if r[1] == "position")
+
+    async def replay():
+        system = SimulatedSystem(SimConfig(replay=path, speedup=10))
+        await system.connect()
+        positions = system.telemetry.position()
+
+        try:
+            return await asyncio.wait_for(positions.__anext__(), 1)
+        finally:
+            await positions.aclose()
+            system.close()
+
+    position = asyncio.run(replay())
+
+    assert position.latitude_deg == HOME[0]
@@ -0,0 +1,147 @@
+import math
+
+import pytest
+
+from src.skywrangler_web_server.drone import SAFE_ALTITUDE, compute_mission_items
+from src.skywrangler_web_server.mission import parse_mission_request
+from sw_mission import create_mission, create_multi_pass_mission
+from sw_mission.fence import LocalFrame
+from sw_mission.points import Coordinate2D, Parameters, Point, Transect
+from sw_mission.simulate import (
+    LAND_ALTITUDE,
+    LAND_SPEED,
+    Z_VEL_DOWN,
+    Z_VEL_UP,
+    SimWaypoint,
+    mission_item_waypoints,
+    simulate,
+    simulate_plan,
+)
+
+HOME = Point(35.93, -97.26, 300.0)
+FRAME = LocalFrame(HOME.latitude, HOME.longitude)
+
+
+def waypoint(x, y, altitude, speed=None):
+    lat, lon = FRAME.to_global(x, y)
+    return SimWaypoint(float(lat), float(lon), HOME.altitude + altitude, speed)
+
+
+def test_simulate():
+    waypoints = [
+        waypoint(0, 0, 100),
+        # speed after this point applies to the next leg
+        waypoint(100, 0, 100, speed=5),
+        waypoint(200, 0, 100),
+        # steep descent is limited by the vertical speed
+        waypoint(210, 0, 20, speed=10),
+    ]
+
+    sim = simulate(HOME, waypoints, speed=10, return_altitude=100, dt=0.5)
+
+    assert sim.leg_names == [
+        "takeoff",
+        "A-B",
+        "B-C",
+        "C-D",
+        "return",
+        "descend",
+        "land",
+    ]
+    assert sim.leg_time("takeoff") == pytest.approx(100 / Z_VEL_UP)
+    assert sim.leg_time("A-B") == pytest.approx(10, rel=1e-3)
+    assert sim.leg_time("B-C") == pytest.approx(20, rel=1e-3)
+    assert sim.leg_time("C-D") == pytest.approx(80 / Z_VEL_DOWN)
+    assert sim.leg_time("land") == pytest.approx(LAND_ALTITUDE / LAND_SPEED)
+    assert sim.approach_angle == pytest.approx(0, abs=1e-6)
+
+    assert sim.time[-1] == pytest.approx(sim.duration)
+    assert sim.altitude[0] == HOME.altitude
+    assert sim.altitude[-1] == pytest.approx(HOME.altitude)
+    # halfway through A-B
+    i = round((sim.leg_time("takeoff") + 5) / 0.5)
+    assert FRAME.to_local(sim.latitude[i], sim.longitude[i])[0] == pytest.approx(
+        50, rel=1e-3
+    )
+
+
+def test_simulate_server_mission():
+    request = parse_mission_request(
+        {
+            "origin": {"latitude": 35.932, "longitude": -97.263, "elevation": 304},
+            "transect": {"azimuth": -85, "length": 100},
+            "parameters": {"speed": 4, "distance": 30, "angle": 60},
+            "returnPoint": {"latitude": 35.934, "longitude": -97.264},
+        }
+    )
+    items = compute_mission_items(request, HOME.altitude)
+
+    sim = simulate(
+        HOME,
+        mission_item_waypoints(items, HOME, SAFE_ALTITUDE),
+        speed=10,
+        return_altitude=SAFE_ALTITUDE,
+    )
+
+    # transect is flown at the requested speed
+    # (geometry is computed in UTM, which has a slightly different scale)
+    assert sim.transect_time == pytest.approx(100 / 4, rel=1e-2)
+    assert sim.approach_angle == pytest.approx(60, abs=0.5)
+
+
+def test_simulate_plan():
+    plan = create_mission(
+        launch=Point(35.9301904295499, -97.26450295241108, 307.0),
+        origin=Point(35.932121645130756, -97.2631249266781, 304.0),
+        transect=Transect(azimuth=-85.0, length=100.0),
+        parameters=Parameters(speed=5, distance=30, angle=60),
+        return_point=Coordinate2D(35.934456813161006, -97.2646272318608),
+    )
+
+    sim = simulate_plan(plan)
+
+    assert sim.leg_names[1:6] == ["A-B", "B-C", "C-D", "D-E", "E-F"]
+    assert sim.approach_angle == pytest.approx(60, abs=0.5)
+    assert 60 < sim.duration < 600
+    assert not math.isnan(sim.transect_time)
+
+
+def test_simulate_multi_pass_plan():
+    kwargs = dict(
+        launch=Point(35.9301904295499, -97.26450295241108, 307.0),
+        origin=Point(35.932121645130756, -97.2631249266781, 304.0),
+        transect=Transect(azimuth=-85.0, length=100.0),
+        return_point=Coordinate2D(35.934456813161006, -97.2646272318608),
+    )
+    passes = [
+        Parameters(speed=5, distance=30, angle=60),
+        Parameters(speed=5, distance=15, angle=60),
+    ]
+
+    single = [simulate_plan(create_mission(parameters=p, **kwargs)) for p in passes]
+    multi = simulate_plan(
+        create_multi_pass_mission(passes=passes, loiter_time=30, **kwargs)
+    )
+
+    assert multi.leg_names[1:11] == [
+        "A-B",
+        "B-C",
+        "C-D",
+        "D-E",
+        "E-F",
+        "hold F",
+        "F-G",
+        "G-H",
+        "H-I",
+        "I-J",
+    ]
+    assert multi.leg_time("hold F") == 30
+    # one takeoff and landing instead of two
+    assert multi.duration < sum(s.duration for s in single)
+
+    # every pass flies the transect
+    assert multi.transect_times == pytest.approx(
+        [s.transect_time for s in single], rel=1e-6
+    )
+    assert multi.transect_time == pytest.approx(sum(multi.transect_times))
+    assert multi.approach_angles == pytest.approx([60, 60], abs=0.5)
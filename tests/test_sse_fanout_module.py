@@ -0,0 +1,53 @@
+import json
+import os
+
+from benchmarks.sse_fanout import (
+    clock_latency,
+    parse_events,
+    percentile,
+    process_sample,
+)
+
+
+def test_parse_events():
+    lines = [
+        "event: heartbeat",
+        "data: ",
+        "",
+        "event: statusText",
+        'data: {"text": "clock 100.5", "type": "DEBUG"}',
+        "",
+    ]
+
+    events = list(parse_events(iter(lines)))
+
+    assert events == [
+        {"event": "heartbeat", "data": ""},
+        {"event": "statusText", "data": '{"text": "clock 100.5", "type": "DEBUG"}'},
+    ]
+    assert clock_latency(events[0], 101) is None
+    assert clock_latency(events[1], 101) == 0.5
+
+    other = {"event": "statusText", "data": json.dumps({"text": "Armed"})}
+    assert clock_latency(other, 101) is None
+
+
+def test_percentile():
+    values = list(range(100, 0, -1))
+
+    assert percentile(values, 50) == 50
+    assert percentile(values, 99) == 99
+    assert percentile(values, 100) == 100
+    assert percentile([3.0], 1) == 3.0
+    assert percentile([], 50) != percentile([], 50)  # NaN
+
+
+def test_process_sample():
+    sample = process_sample(os.getpid())
+
+    if sample is None:
+        # not Linux
+        return
+
+    assert sample.rss > 0
+    assert sample.cpu > 0
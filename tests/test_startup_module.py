@@ -0,0 +1,43 @@
+import json
+import os
+import pathlib
+import subprocess
+import sys
+
+# Maximum time in seconds for importing the server in a fresh interpreter. The
+# default is generous for a development machine; set this lower when running
+# on the Raspberry Pi itself.
+COLD_START_BUDGET = float(os.environ.get("SKYWRANGLER_COLD_START_BUDGET", "5.0"))
+
+# Modules that must not be imported until they are needed.
+LAZY_MODULES = ["pyproj", "dbus_next", "numpy"]
+
+SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import src.skywrangler_web_server.server
+elapsed = time.perf_counter() - start
+print(json.dumps({"elapsed": elapsed, "modules": sorted(sys.modules)}))
+"""
+
+
+def cold_start():
+    result = subprocess.run(
+        [sys.executable, "-c", SCRIPT],
+        cwd=pathlib.Path(__file__).parent.parent,
+        capture_output=True,
+        check=True,
+        text=True,
+    )
+    return json.loads(result.stdout)
+
+
+def test_cold_start_budget():
+    assert cold_start()["elapsed"] < COLD_START_BUDGET
+
+
+def test_heavy_modules_are_lazy():
+    modules = cold_start()["modules"]
+
+    for name in LAZY_MODULES:
+        assert name not in modules
@@ -0,0 +1,116 @@
+import asyncio
+import os
+
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+
+from src.skywrangler_web_server.static import (
+    CACHE_IMMUTABLE,
+    CACHE_REVALIDATE,
+    StaticFiles,
+    build_index,
+    select_encoding,
+)
+
+SCRIPT = b"console.log('hello world');\n" * 100
+
+
+def make_client_dir(path):
+    (path / "assets").mkdir()
+    (path / "index.html").write_bytes(b"<html></html>")
+    (path / "assets" / "index-4f3c2a1b.js").write_bytes(SCRIPT)
+    (path / "assets" / "settings.js").write_bytes(SCRIPT)
+
+
+def test_build_index(tmp_path):
+    make_client_dir(tmp_path)
+    index = build_index(tmp_path)
+
+    assert set(index) == {
+        "index.html",
+        "assets/index-4f3c2a1b.js",
+        "assets/settings.js",
+    }
+    assert index["index.html"].cache_control == CACHE_REVALIDATE
+    # too small to compress
+    assert set(index["index.html"].bodies) == {"identity"}
+
+    script = index["assets/index-4f3c2a1b.js"]
+    assert script.cache_control == CACHE_IMMUTABLE
+    assert len(script.bodies["gzip"]) < len(SCRIPT)
+    assert index["assets/settings.js"].cache_control == CACHE_REVALIDATE
+
+
+def test_select_encoding():
+    available = {"identity": b"", "gzip": b""}
+
+    assert select_encoding("gzip, deflate, br", available) == "gzip"
+    assert select_encoding("br;q=1.0, gzip;q=0", available) == "identity"
+    assert select_encoding("*", available) == "gzip"
+    assert select_encoding("", available) == "identity"
+    assert select_encoding("br", {**available, "br": b""}) == "br"
+
+
+def test_handle(tmp_path):
+    make_client_dir(tmp_path)
+    static_files = StaticFiles(tmp_path)
+
+    app = web.Application()
+    app.router.add_get("/{path:.*}", static_files.handle)
+
+    async def run():
+        async with TestClient(TestServer(app)) as client:
+            await static_files.refresh()
+
+            response = await client.get(
+                "/assets/index-4f3c2a1b.js", headers={"Accept-Encoding": "gzip"}
+            )
+            assert response.status == 200
+            assert response.headers["Content-Encoding"] == "gzip"
+            assert response.headers["Cache-Control"] == CACHE_IMMUTABLE
+            assert await response.read() == SCRIPT
+            etag = response.headers["ETag"]
+
+            response = await client.get(
+                "/assets/index-4f3c2a1b.js",
+                headers={"Accept-Encoding": "gzip", "If-None-Match": etag},
+            )
+            assert response.status == 304
+
+            response = await client.get("/missing.js")
+            assert response.status == 404
+
+            # index is rebuilt when files change
+            (tmp_path / "index.html").write_bytes(b"<html>new</html>")
+            os.utime(tmp_path / "index.html", ns=(0, 0))
+            assert await static_files.refresh()
+
+            response = await client.get("/")
+            assert await response.read() == b"<html>new</html>"
+
+    asyncio.run(run())
+
+
+def test_handle_not_ready(tmp_path):
+    make_client_dir(tmp_path)
+    # a dangling symlink can't be indexed
+    (tmp_path / "broken.js").symlink_to(tmp_path / "missing.js")
+    static_files = StaticFiles(tmp_path, poll_interval=0.01, ready_timeout=0.1)
+
+    app = web.Application()
+    app.on_startup.append(static_files.on_startup)
+    app.on_cleanup.append(static_files.on_cleanup)
+    app.router.add_get("/{path:.*}", static_files.handle)
+
+    async def run():
+        async with TestClient(TestServer(app)) as client:
+            # the index can't be built, so requests fail instead of waiting
+            response = await client.get("/")
+            assert response.status == 503
+            assert "Retry-After" in response.headers
+
+            (tmp_path / "broken.js").unlink()
+            response = await client.get("/")
+            assert response.status == 200
+
+    asyncio.run(run())
@@ -0,0 +1,163 @@
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+from mavsdk.telemetry import Position
+
+from src.skywrangler_web_server.drone import (
+    check_terrain_clearance,
+    compute_mission_items,
+)
+from src.skywrangler_web_server.mission import parse_mission_request
+from src.skywrangler_web_server.terrain import HGT_VOID, TerrainModel, hgt_name
+from sw_mission import create_mission
+from sw_mission.points import Coordinate2D, Parameters, Point, Transect
+
+SIZE = 11
+
+
+def elevation(lat, lon):
+    # a plane, so bilinear interpolation is exact
+    return 300 + 10000 * (lat - 35) + 1000 * (lon + 98)
+
+
+def make_hgt(path, void=False):
+    rows = np.arange(SIZE)[:, None]
+    cols = np.arange(SIZE)[None, :]
+    # first row is the north edge
+    data = elevation(36 - rows / (SIZE - 1), -98 + cols / (SIZE - 1))
+    data = np.round(data).astype(">i2")
+
+    if void:
+        data[5, 5] = HGT_VOID
+
+    data.tofile(path / hgt_name(35, -98))
+
+
+def test_hgt_name():
+    assert hgt_name(35, -98) == "N35W098.hgt"
+    assert hgt_name(-1, 5) == "S01E005.hgt"
+
+
+def test_elevation(tmp_path):
+    make_hgt(tmp_path)
+    terrain = TerrainModel(tmp_path)
+
+    assert terrain.elevation(35.93, -97.26) == pytest.approx(elevation(35.93, -97.26))
+    assert terrain.elevation([35.0, 35.95], [-98.0, -97.05]) == pytest.approx(
+        [elevation(35.0, -98.0), elevation(35.95, -97.05)]
+    )
+
+    with pytest.raises(FileNotFoundError):
+        terrain.elevation(36.5, -97.26)
+
+
+def test_elevation_void(tmp_path):
+    make_hgt(tmp_path, void=True)
+    terrain = TerrainModel(tmp_path)
+
+    with pytest.raises(ValueError):
+        terrain.elevation(35.52, -97.48)
+
+    assert terrain.elevation(35.2, -97.8) == pytest.approx(elevation(35.2, -97.8))
+
+
+def test_elevation_threads(tmp_path):
+    make_hgt(tmp_path)
+    # same data one tile to the east, so the tiles are evicted all the time
+    shutil.copy(tmp_path / hgt_name(35, -98), tmp_path / hgt_name(35, -97))
+    terrain = TerrainModel(tmp_path, max_tiles=1)
+
+    def lookup(i):
+        longitude = -97.5 if i % 2 else -96.5
+        return terrain.elevation(35.5, longitude)
+
+    with ThreadPoolExecutor(8) as executor:
+        elevations = list(executor.map(lookup, range(1000)))
+
+    assert elevations[::2] == pytest.approx([elevation(35.5, -97.5)] * 500)
+    assert len(terrain._tiles) == 1
+
+
+def test_leg_clearance(tmp_path):
+    make_hgt(tmp_path)
+    terrain = TerrainModel(tmp_path)
+
+    # 50 m above the terrain at the start, 50 m below at the end
+    start = elevation(35.9, -97.3) + 50
+    end = elevation(35.91, -97.3) - 50
+
+    clearance = terrain.leg_clearance(
+        [35.9, 35.91, 35.9], [-97.3, -97.3, -97.3], [start, end, start]
+    )
+
+    assert clearance == pytest.approx([-50, -50])
+
+
+def test_create_mission_with_terrain(tmp_path):
+    make_hgt(tmp_path)
+    terrain = TerrainModel(tmp_path)
+
+    args = dict(
+        launch=Point(35.9301904295499, -97.26450295241108, 0),
+        origin=Point(35.932121645130756, -97.2631249266781, 0),
+        transect=Transect(azimuth=-85.0, length=100.0),
+        parameters=Parameters(speed=5, distance=30, angle=60),
+        return_point=Coordinate2D(35.934456813161006, -97.2646272318608),
+    )
+
+    plan = create_mission(**args, terrain=terrain)
+
+    assert plan.mission.planned_home_position.altitude == pytest.approx(
+        elevation(35.9301904295499, -97.26450295241108)
+    )
+
+    # transect is too close to rising terrain
+    with pytest.raises(ValueError, match="leg C-D"):
+        create_mission(
+            **{**args, "transect": Transect(azimuth=-85.0, length=10000.0)},
+            terrain=terrain,
+        )
+
+
+def test_check_terrain_clearance(tmp_path):
+    make_hgt(tmp_path)
+    terrain = TerrainModel(tmp_path)
+
+    home = Position(35.93, -97.265, elevation(35.93, -97.265), 0)
+    request = parse_mission_request(
+        {
+            "origin": {"latitude": 35.932, "longitude": -97.263},
+            "transect": {"azimuth": -85, "length": 10},
+            "parameters": {"speed": 5, "distance": 3, "angle": 30},
+            "returnPoint": {"latitude": 35.934, "longitude": -97.264},
+        }
+    )
+    origin = request.origin._replace(elevation=elevation(35.932, -97.263))
+    items = compute_mission_items(
+        request._replace(origin=origin), home.absolute_altitude_m
+    )
+
+    check_terrain_clearance(terrain, home, items)
+
+    # origin typed in 5 m too low puts the transect below the terrain
+    origin = origin._replace(elevation=origin.elevation - 5)
+    items = compute_mission_items(
+        request._replace(origin=origin), home.absolute_altitude_m
+    )
+
+    # the descent to the transect is the first leg to hit the terrain
+    with pytest.raises(RuntimeError, match="leg B-C"):
+        check_terrain_clearance(terrain, home, items)
+
+    # the transect is flown low on purpose, but the return to a point up the
+    # hill with 14 m clearance is within the error of the terrain model
+    request = request._replace(
+        origin=request.origin._replace(elevation=elevation(35.932, -97.263)),
+        return_point=request.return_point._replace(latitude=35.9385),
+    )
+    items = compute_mission_items(request, home.absolute_altitude_m)
+
+    with pytest.raises(RuntimeError, match="leg E-F has 14.0 m"):
+        check_terrain_clearance(terrain, home, items)
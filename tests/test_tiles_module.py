@@ -0,0 +1,94 @@
+import asyncio
+import sqlite3
+
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+
+from seed_tiles import SCHEMA, bounds, tile_xy, tiles_in_bounds
+from src.skywrangler_web_server.tiles import CACHE_CONTROL, TileStore
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\0" * 100
+
+
+def make_mbtiles(path):
+    db = sqlite3.connect(path)
+    db.executescript(SCHEMA)
+    db.execute("INSERT INTO metadata VALUES ('format', 'png')")
+    # XYZ tile 2/1/0 is TMS row 3
+    db.execute("INSERT INTO tiles VALUES (2, 1, 3, ?)", (PNG,))
+    db.commit()
+    db.close()
+
+
+def test_read_tile(tmp_path):
+    make_mbtiles(tmp_path / "tiles.mbtiles")
+    store = TileStore(tmp_path / "tiles.mbtiles")
+
+    assert store.content_type == "image/png"
+    assert store.read_tile(2, 1, 0).data == PNG
+    assert store.read_tile(2, 1, 3) is None
+
+    store.close()
+
+
+def test_get_tile_cache(tmp_path):
+    make_mbtiles(tmp_path / "tiles.mbtiles")
+    store = TileStore(tmp_path / "tiles.mbtiles", cache_size=2)
+
+    async def run():
+        tile = await store.get_tile(2, 1, 0)
+        assert tile.data == PNG
+        # cached tiles don't hit the database
+        store.close()
+        assert await store.get_tile(2, 1, 0) is tile
+        assert await store.get_tile(2, 0, 0) is None
+        assert await store.get_tile(2, 0, 1) is None
+        # least recently used tile was evicted
+        assert (2, 1, 0) not in store._cache
+
+    asyncio.run(run())
+    store.close()
+
+
+def test_handle(tmp_path):
+    make_mbtiles(tmp_path / "tiles.mbtiles")
+    store = TileStore(tmp_path / "tiles.mbtiles")
+
+    app = web.Application()
+    app.router.add_get(r"/tiles/{z:\d+}/{x:\d+}/{y:\d+}", store.handle)
+
+    async def run():
+        async with TestClient(TestServer(app)) as client:
+            response = await client.get("/tiles/2/1/0")
+            assert response.status == 200
+            assert response.headers["Content-Type"] == "image/png"
+            assert response.headers["Cache-Control"] == CACHE_CONTROL
+            assert await response.read() == PNG
+
+            response = await client.get(
+                "/tiles/2/1/0", headers={"If-None-Match": response.headers["ETag"]}
+            )
+            assert response.status == 304
+
+            response = await client.get("/tiles/2/0/0")
+            assert response.status == 404
+
+            response = await client.get("/tiles/2/4/0")
+            assert response.status == 404
+
+    asyncio.run(run())
+    store.close()
+
+
+def test_tiles_in_bounds():
+    assert tile_xy(0.0, 0.0, 1) == (1, 1)
+    assert tile_xy(85.0, -180.0, 2) == (0, 0)
+
+    bbox = bounds([(35.93, -97.26)], 1000.0)
+    tiles = list(tiles_in_bounds(bbox, 0, 14))
+
+    assert (0, 0, 0) in tiles
+    assert all(z in range(15) for z, _x, _y in tiles)
+    assert tile_xy(35.93, -97.26, 14) in [(x, y) for z, x, y in tiles if z == 14]
+    # 2 km square is only a few tiles at zoom 14 (~2.4 km/tile here)
+    assert len([t for t in tiles if t[0] == 14]) <= 4
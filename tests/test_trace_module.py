@@ -0,0 +1,48 @@
+import pytest
+
+from src.skywrangler_web_server.trace import Tracer
+
+
+def test_spans():
+    tracer = Tracer()
+    trace = tracer.start("fly_mission")
+
+    with trace.span("upload_mission"):
+        pass
+
+    with pytest.raises(RuntimeError):
+        with trace.span("arm"):
+            raise RuntimeError("not armable")
+
+    assert [s.name for s in trace.spans] == ["upload_mission", "arm"]
+    assert trace.spans[0].error is None
+    assert trace.spans[1].error == "RuntimeError"
+    assert trace.spans[1].start_ns >= trace.spans[0].start_ns
+    assert trace.duration_ns >= trace.spans[1].start_ns
+
+
+def test_chrome_trace():
+    tracer = Tracer()
+    trace = tracer.start("fly_mission")
+
+    with trace.span("wait_home"):
+        pass
+
+    events = trace.to_chrome_trace()["traceEvents"]
+
+    assert events[0]["ph"] == "M"
+    assert events[1]["name"] == "wait_home"
+    assert events[1]["ph"] == "X"
+    assert events[1]["tid"] == trace.id
+    assert events[1]["dur"] >= 0
+
+
+def test_tracer_keeps_most_recent():
+    tracer = Tracer(max_traces=2)
+    first = tracer.start("a")
+    tracer.start("b")
+    third = tracer.start("c")
+
+    assert tracer.get(first.id) is None
+    assert tracer.get(third.id) is third
+    assert [t.name for t in tracer] == ["b", "c"]
@@ -0,0 +1,150 @@
+import asyncio
+from types import SimpleNamespace
+
+from mavsdk.telemetry import Position
+
+from src.skywrangler_web_server.broadcast import Broadcast
+from src.skywrangler_web_server.drone import Drone, mission_path
+from src.skywrangler_web_server.fence import FenceCircle, FencePolygon
+from src.skywrangler_web_server.trace import Tracer
+from src.skywrangler_web_server.watchdog import (
+    BELOW_FLOOR,
+    IN_EXCLUSION_ZONE,
+    LEFT_CORRIDOR,
+    LEFT_FENCE,
+    MissionGeometry,
+    Watchdog,
+    Waypoint,
+)
+
+HOME = (35.93, -97.26)
+# ~111 m per 0.001 degree of latitude
+PATH = [
+    Waypoint(35.93, -97.26, 100),
+    Waypoint(35.931, -97.26, 100),
+    Waypoint(35.932, -97.26, 10),
+    Waypoint(35.933, -97.26, 10),
+    Waypoint(35.93, -97.26, 100),
+]
+
+
+def position(latitude, longitude, relative_altitude):
+    return Position(latitude, longitude, 0, relative_altitude)
+
+
+def test_check():
+    geometry = MissionGeometry(HOME, PATH)
+
+    assert geometry.check(35.9305, -97.26, 100) is None
+    assert geometry.check(35.9325, -97.26, 8) is None
+    # 10 m off the path is OK, 50 m is not
+    assert geometry.check(35.9325, -97.2601, 8) is None
+    assert geometry.check(35.9325, -97.2605, 8) == LEFT_CORRIDOR
+    assert geometry.check(35.9325, -97.26, 5) == BELOW_FLOOR
+    # near the descent to point C, the lower leg sets the floor
+    assert geometry.check(35.932, -97.26, 20) is None
+
+
+def test_check_fence():
+    enclosure = FencePolygon(
+        ((35.9324, -97.2601), (35.9326, -97.2601), (35.9326, -97.2599)), False
+    )
+    geometry = MissionGeometry(HOME, PATH, [enclosure])
+
+    assert geometry.check(35.9322, -97.26, 10) is None
+    assert geometry.check(35.93255, -97.26, 10) == IN_EXCLUSION_ZONE
+
+
+def test_check_fence_circles():
+    # stay within 300 m of home, but not within 20 m of point C
+    geometry = MissionGeometry(
+        HOME,
+        PATH,
+        [FenceCircle(HOME, 300), FenceCircle((35.932, -97.26), 20, False)],
+    )
+
+    assert geometry.check(35.931, -97.26, 100) is None
+    assert geometry.check(35.932, -97.26, 10) == IN_EXCLUSION_ZONE
+    # inside the corridor, but outside the inclusion circle
+    assert geometry.check(35.933, -97.26, 10) == LEFT_FENCE
+
+
+def test_watchdog_takeoff_and_violation():
+    violations = []
+    watchdog = Watchdog(MissionGeometry(HOME, PATH), violations.append)
+    position_broadcast = Broadcast()
+    watchdog.start(position_broadcast)
+
+    # taking off
+    for altitude in range(0, 101, 10):
+        position_broadcast.publish(position(35.93, -97.26, altitude))
+
+    assert violations == []
+
+    position_broadcast.publish(position(35.9325, -97.26, 2))
+    position_broadcast.publish(position(35.9325, -97.26, 1))
+
+    assert violations == [BELOW_FLOOR]
+    assert not watchdog.is_active
+    assert watchdog.status()["violation"] == BELOW_FLOOR
+
+
+def test_check_along_path():
+    watchdog = Watchdog(MissionGeometry(HOME, PATH), lambda _: None)
+    samples = 10000
+
+    for i in range(samples):
+        watchdog.on_position(position(35.93 + i * 3e-7, -97.26, 100))
+
+    assert watchdog.violation is None
+    assert watchdog.samples == samples
+    assert watchdog.max_check_ns > 0
+
+
+def test_reaction_latency():
+    calls = []
+    iteration = 0
+
+    async def return_to_launch():
+        calls.append(iteration)
+
+    # a drone without a connection to a vehicle
+    drone = Drone.__new__(Drone)
+    drone.system = SimpleNamespace(
+        action=SimpleNamespace(return_to_launch=return_to_launch)
+    )
+    drone.traces = Tracer()
+    drone.watchdog = None
+    drone._mission_task = None
+    drone.position = Broadcast()
+    drone._home = Position(HOME[0], HOME[1], 300, 0)
+
+    async def run():
+        drone.watchdog = Watchdog(
+            MissionGeometry(HOME, PATH), drone._on_watchdog_violation
+        )
+        drone.watchdog.start(drone.position)
+
+        nonlocal iteration
+        drone.position.publish(position(35.93, -97.26, 100))
+        drone.position.publish(position(35.93, -97.27, 100))
+
+        for iteration in range(1, 10):
+            await asyncio.sleep(0)
+
+    asyncio.run(run())
+
+    # the command is sent on the next iteration of the event loop
+    assert calls == [1]
+    assert [t.name for t in drone.traces] == ["watchdog"]
+
+
+def test_mission_path():
+    home = Position(35.93, -97.26, 300, 0)
+    items = [SimpleNamespace(latitude_deg=1, longitude_deg=2, relative_altitude_m=3)]
+
+    assert mission_path(home, items) == [
+        Waypoint(35.93, -97.26, 100),
+        Waypoint(1, 2, 3),
+        Waypoint(35.93, -97.26, 100),
+    ]